@@ -0,0 +1,78 @@
+"""Benchmark Layer 2 fitted per cohort against one model for every row.
+
+Builds synthetic complete rows whose height and weight depend on sex and
+age, plants outliers that are only unusual for their own cohort (women
+with typical male measurements, children with adult ones) and reports the
+fit + score seconds and the share of planted outliers each approach flags.
+
+Command line usage::
+
+    python -m benchmarks.bench_cohorts
+    python -m benchmarks.bench_cohorts --rows 100000 400000 --workers 4
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from src.model_store import (DEFAULT_AGE_BANDS, Layer2Engine, cohort_labels, cohort_partitions, fit_cohort_model,
+                             fit_model, score_model)
+
+def make_cohort_data(rows, outlier_rate=0.002, invalid_rate=0.05, seed=0):
+    """(complete rows, sex, Layer 1 invalid mask, planted outlier mask)."""
+    rng = np.random.default_rng(seed)
+    sex = rng.choice(np.array(['M', 'F'], dtype=object), rows)
+    age = rng.integers(2, 90, rows).astype(np.float64)
+    male = sex == 'M'
+    child = age < 18
+    # Children grow towards adult size; adults differ by sex
+    growth = np.where(child, 0.55 + 0.025 * age, 1.0)
+    height = np.where(male, rng.normal(178, 7, rows), rng.normal(165, 6, rows)) * growth
+    weight = np.where(male, rng.normal(84, 9, rows), rng.normal(66, 8, rows)) * growth ** 2.5
+    planted = rng.random(rows) < outlier_rate
+    adult = planted & ~child
+    height[adult] = np.where(male[adult], rng.normal(165, 2, adult.sum()), rng.normal(188, 2, adult.sum()))
+    weight[adult] = np.where(male[adult], rng.normal(62, 2, adult.sum()), rng.normal(98, 2, adult.sum()))
+    young = planted & child
+    height[young] = rng.normal(175, 3, young.sum())
+    weight[young] = rng.normal(80, 3, young.sum())
+    complete_data = pd.DataFrame({'age': age, 'weight': weight.round(1), 'height': height.round(1)})
+    complete_data['bmi'] = (complete_data['weight'] / (complete_data['height'] / 100) ** 2).round(1)
+    return complete_data, sex, rng.random(rows) < invalid_rate, planted
+
+def run_global(complete_data, invalid, engine):
+    """Seconds and predictions of one model fit on and scoring every row."""
+    started = time.perf_counter()
+    contamination = max(0.01, min(0.5, invalid.mean()))
+    model = fit_model(complete_data, contamination, engine)
+    predictions = score_model(model, complete_data, engine)['predictions']
+    return time.perf_counter() - started, predictions
+
+def run_cohorts(complete_data, sex, invalid, engine, min_rows):
+    """Seconds and predictions of one model per cohort, fit and scored on engine.cohort_workers processes."""
+    started = time.perf_counter()
+    labels = cohort_labels(complete_data['age'], sex, DEFAULT_AGE_BANDS)
+    partitions = cohort_partitions(labels, invalid, np.ones(len(complete_data), dtype=bool), min_rows)
+    _, results = fit_cohort_model(complete_data, labels, partitions, DEFAULT_AGE_BANDS, True, engine)
+    return time.perf_counter() - started, results['predictions']
+
+def main(argv=None):
+    """Compare fit + score time and planted-outlier recall of global and per-cohort Layer 2."""
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.bench_cohorts', description=main.__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[100_000])
+    parser.add_argument('--workers', type=int, default=1, help='processes fitting cohorts in parallel')
+    parser.add_argument('--min-rows', type=int, default=200)
+    args = parser.parse_args(argv)
+
+    engine = Layer2Engine(cohort_workers=args.workers)
+    print(f"{'rows':>10} {'global s':>10} {'cohort s':>10} {'speedup':>8} {'global recall':>14} {'cohort recall':>14}")
+    for rows in args.rows:
+        complete_data, sex, invalid, planted = make_cohort_data(rows)
+        global_seconds, global_predictions = run_global(complete_data, invalid, engine)
+        cohort_seconds, cohort_predictions = run_cohorts(complete_data, sex, invalid, engine, args.min_rows)
+        global_recall = np.mean(global_predictions[planted] == -1)
+        cohort_recall = np.mean(cohort_predictions[planted] == -1)
+        print(f"{rows:>10} {global_seconds:>10.2f} {cohort_seconds:>10.2f} {global_seconds / cohort_seconds:>7.2f}x "
+              f"{global_recall:>14.1%} {cohort_recall:>14.1%}")
+
+if __name__ == '__main__':
+    main()
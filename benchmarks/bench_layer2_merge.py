@@ -0,0 +1,75 @@
+"""Benchmark the Layer 1 / Layer 2 merge against the former per-row implementation.
+
+Times _estimate_contamination and _apply_isolation_results on synthetic
+Layer 1 statuses and Isolation Forest predictions, next to the label-based
+.loc loops they replaced, and checks both produce the same frame.
+
+Command line usage::
+
+    python -m benchmarks.bench_layer2_merge
+    python -m benchmarks.bench_layer2_merge --rows 10000 100000 1000000
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from src.web_gui import _apply_isolation_results, _estimate_contamination
+
+def make_inputs(rows, seed=0):
+    """Analysis frame after Layer 1, its complete rows and matching Layer 2 results."""
+    rng = np.random.default_rng(seed)
+    status = rng.choice(np.array(['Valid', 'Warning', 'Anomaly'], dtype=object), rows, p=[0.7, 0.2, 0.1])
+    analysis_df = pd.DataFrame({
+        'age': np.where(rng.random(rows) < 0.05, np.nan, rng.integers(18, 90, rows)),
+        'status': status,
+        'color': np.where(status == 'Valid', 'green', 'red').astype(object),
+        'isolation_score': np.nan,
+        'anomaly': np.nan
+    })
+    complete_data = analysis_df[['age']].dropna()
+    scores = rng.normal(0.05, 0.1, len(complete_data))
+    return analysis_df, complete_data, {'scores': scores, 'predictions': np.where(scores < 0, -1, 1)}
+
+def loop_estimate_contamination(analysis_df, complete_data):
+    layer1_labels = [
+        1 if analysis_df.loc[idx, 'status'] == 'Valid' else -1
+        for idx in complete_data.index
+    ]
+    invalid_ratio = sum(1 for label in layer1_labels if label == -1) / len(layer1_labels)
+    return max(0.01, min(0.5, invalid_ratio))
+
+def loop_apply_isolation_results(analysis_df, complete_data, isolation_results):
+    analysis_df.loc[complete_data.index, 'isolation_score'] = isolation_results['scores']
+    analysis_df.loc[complete_data.index, 'anomaly'] = isolation_results['predictions']
+    for idx in complete_data.index:
+        if analysis_df.loc[idx, 'status'] == 'Valid' and analysis_df.loc[idx, 'anomaly'] == -1:
+            analysis_df.loc[idx, 'status'] = 'Anomaly'
+            analysis_df.loc[idx, 'color'] = 'red'
+    return analysis_df
+
+def time_merge(estimate, apply, rows):
+    """Seconds for one contamination estimate plus merge, and the merged frame."""
+    analysis_df, complete_data, isolation_results = make_inputs(rows)
+    started = time.perf_counter()
+    contamination = estimate(analysis_df, complete_data)
+    merged = apply(analysis_df, complete_data, isolation_results)
+    return time.perf_counter() - started, contamination, merged
+
+def main(argv=None):
+    """Compare the vectorized merge with the per-row loops it replaced."""
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.bench_layer2_merge', description=main.__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000])
+    args = parser.parse_args(argv)
+
+    print(f"{'rows':>10} {'loop s':>10} {'vector s':>10} {'speedup':>9}")
+    for rows in args.rows:
+        loop_seconds, loop_contamination, loop_df = time_merge(
+            loop_estimate_contamination, loop_apply_isolation_results, rows)
+        vector_seconds, contamination, vector_df = time_merge(
+            _estimate_contamination, _apply_isolation_results, rows)
+        assert contamination == loop_contamination
+        pd.testing.assert_frame_equal(vector_df, loop_df)
+        print(f"{rows:>10} {loop_seconds:>10.3f} {vector_seconds:>10.4f} {loop_seconds / vector_seconds:>8.0f}x")
+
+if __name__ == '__main__':
+    main()
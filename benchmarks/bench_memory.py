@@ -0,0 +1,54 @@
+"""Memory footprint of the analysis frame kept for /results paging.
+
+Runs the in-memory /analyze stages (clean, Layer 1, duplicates, Layer 2)
+on synthetic data and reports the deep memory of the resulting frame per
+million rows, next to the same rows in the former layout: text statuses
+with a stored color column, float64 measurements and scores, int64 case
+ids and text flags.
+
+Command line usage::
+
+    python -m benchmarks.bench_memory
+    python -m benchmarks.bench_memory --rows 1000000
+"""
+import argparse
+import numpy as np
+from benchmarks.bench_pipeline import make_dataset
+from src.export import with_colors
+from src.ingestion import CATEGORY_FIELDS, FLOAT32_FIELDS
+
+def make_analysis(rows):
+    """Analysis frame of rows synthetic records, as /analyze stores it."""
+    from src import web_gui
+    from src.ingestion import compact_frame
+    cleaned = web_gui.apply_column_mapping_and_clean(make_dataset(rows), web_gui.DEFAULT_COLUMN_MAPPING)
+    analysis_df = web_gui._apply_layer1_validation(cleaned.copy(deep=False))
+    analysis_df = web_gui._apply_layer2_isolation_forest(web_gui._apply_duplicate_detection(analysis_df))
+    return web_gui._reorder_columns_for_display(compact_frame(analysis_df))
+
+def legacy_layout(df):
+    """The same rows with the dtypes analysis frames used before they were compacted."""
+    df = with_colors(df)
+    widened = {col: df[col].astype(np.float64) for col in FLOAT32_FIELDS if col in df.columns}
+    texts = {col: df[col].astype(object).astype(str).where(df[col].notna())
+             for col in [*CATEGORY_FIELDS, 'status', 'color'] if col in df.columns}
+    return df.assign(**widened, **texts, case_id=df['case_id'].astype(np.int64))
+
+def mb_per_million_rows(df):
+    """Deep memory of a frame in MB, scaled to one million rows."""
+    return df.memory_usage(deep=True, index=False).sum() / 2 ** 20 * 1_000_000 / len(df)
+
+def main(argv=None):
+    """Compare the analysis frame's memory with its former layout."""
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.bench_memory', description=main.__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[100_000])
+    args = parser.parse_args(argv)
+
+    print(f"{'rows':>10} {'before MB/1M':>13} {'after MB/1M':>12} {'reduction':>10}")
+    for rows in args.rows:
+        analysis_df = make_analysis(rows)
+        before, after = mb_per_million_rows(legacy_layout(analysis_df)), mb_per_million_rows(analysis_df)
+        print(f"{rows:>10} {before:>13.1f} {after:>12.1f} {before / after:>9.2f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+"""End-to-end benchmark of the validation pipeline on synthetic patient data.
+
+Builds datasets with the DEFAULT_COLUMN_MAPPING schema, runs the same
+stages as /analyze (clean, layer1, layer2, serialize) and records wall time
+and peak traced memory per stage. Results are compared with a stored
+baseline and the run fails when a stage is slower or larger than the
+baseline by more than the tolerance.
+
+Command line usage::
+
+    python -m benchmarks.bench_pipeline                          # 10k and 100k rows
+    python -m benchmarks.bench_pipeline --rows 1000000 10000000 --missing-rate 0.1
+    python -m benchmarks.bench_pipeline --save-baseline          # record this machine's baseline
+
+Baselines are hardware specific: regenerate benchmarks/baseline.json with
+--save-baseline on the machine that runs the comparison.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+STAGES = ('clean', 'layer1', 'layer2', 'serialize')
+DEFAULT_ROWS = [10_000, 100_000]
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+def make_dataset(rows, missing_rate=0.05, outlier_rate=0.02, seed=0):
+    """Synthetic raw export with the DEFAULT_COLUMN_MAPPING column names.
+
+    missing_rate blanks that share of each measurement independently;
+    outlier_rate replaces that share of rows with typical data-entry errors
+    (weight in grams, height in metres, impossible ages and BMIs).
+    """
+    rng = np.random.default_rng(seed)
+    height = rng.normal(170, 10, rows).round(1)
+    weight = rng.normal(75, 14, rows).round(1)
+    age = rng.integers(18, 95, rows).astype(float)
+    bmi = (weight / (height / 100) ** 2).round(2)
+
+    outliers = np.flatnonzero(rng.random(rows) < outlier_rate)
+    kinds = rng.integers(0, 4, len(outliers))
+    weight[outliers[kinds == 0]] *= 1000
+    height[outliers[kinds == 1]] /= 100
+    age[outliers[kinds == 2]] = rng.choice([0, 130, 150], np.count_nonzero(kinds == 2))
+    bmi[outliers[kinds == 3]] = rng.uniform(70, 150, np.count_nonzero(kinds == 3)).round(2)
+
+    for values in (age, weight, height, bmi):
+        values[rng.random(rows) < missing_rate] = np.nan
+
+    start = np.datetime64('2023-01-01T00:00:00')
+    dates = start + rng.integers(0, 2 * 365 * 24 * 3600, rows).astype('timedelta64[s]')
+    return pd.DataFrame({
+        'id_cases': np.arange(1, rows + 1),
+        'age_v': age,
+        'sex_v': rng.choice(np.array(['M', 'F'], dtype=object), rows),
+        'agreement': rng.choice(np.array(['da', 'nu'], dtype=object), rows, p=[0.95, 0.05]),
+        'greutate': weight,
+        'inaltime': height,
+        'IMC': bmi,
+        'data1': pd.Series(dates).dt.strftime('%Y-%m-%d %H:%M:%S'),
+        'finalizat': rng.choice(np.array(['da', 'nu'], dtype=object), rows, p=[0.9, 0.1]),
+        'testing': rng.choice(np.array(['0', '1'], dtype=object), rows, p=[0.98, 0.02]),
+        'imcINdex': np.where(np.isnan(bmi), None, np.where(bmi < 25, 'Normal', 'Overweight')).astype(object)
+    })
+
+def run_pipeline(raw_df, serialize_rows=None, trace_memory=False):
+    """Run every stage once; return {stage: {'seconds', 'peak_mb'}}.
+
+    serialize_rows caps the rows encoded as JSON records, since no response
+    ever carries millions of rows.
+    """
+    from src import web_gui
+    from src.model_store import ModelStore
+    from src.serialization import dumps
+
+    model_dir = tempfile.mkdtemp(prefix='doctor31-bench-')
+    saved_store = web_gui.model_store
+    # A fresh store per run so every Layer 2 stage fits instead of hitting the fit cache
+    web_gui.model_store = ModelStore(model_dir)
+    stage_fns = {
+        'clean': lambda df: web_gui.apply_column_mapping_and_clean(df, web_gui.DEFAULT_COLUMN_MAPPING),
+        'layer1': web_gui._apply_layer1_validation,
+        'layer2': web_gui._apply_layer2_isolation_forest,
+        'serialize': lambda df: dumps({'rows': df if serialize_rows is None else df.head(serialize_rows)})
+    }
+
+    measurements = {}
+    frame = raw_df.copy()
+    try:
+        for stage in STAGES:
+            if trace_memory:
+                tracemalloc.start()
+            started = time.perf_counter()
+            output = stage_fns[stage](frame)
+            seconds = time.perf_counter() - started
+            measurements[stage] = {'seconds': round(seconds, 4)}
+            if trace_memory:
+                measurements[stage]['peak_mb'] = round(tracemalloc.get_traced_memory()[1] / 1024 ** 2, 2)
+                tracemalloc.stop()
+            if stage != 'serialize':
+                frame = output
+    finally:
+        web_gui.model_store = saved_store
+        shutil.rmtree(model_dir, ignore_errors=True)
+    return measurements
+
+def measure(rows, repeat=3, serialize_rows=1_000_000, missing_rate=0.05, outlier_rate=0.02):
+    """Best-of-repeat stage times plus peak memory from a separate traced run."""
+    raw_df = make_dataset(rows, missing_rate, outlier_rate)
+    # tracemalloc slows allocation-heavy stages, so time and memory come from different runs
+    timed = [run_pipeline(raw_df, serialize_rows) for _ in range(repeat)]
+    traced = run_pipeline(raw_df, serialize_rows, trace_memory=True)
+    return {
+        stage: {
+            'seconds': min(run[stage]['seconds'] for run in timed),
+            'peak_mb': traced[stage]['peak_mb']
+        }
+        for stage in STAGES
+    }
+
+def compare_to_baseline(results, baseline, tolerance=0.25, min_seconds=0.05, min_mb=5.0):
+    """Return a message for every stage slower or larger than baseline by more than tolerance.
+
+    min_seconds and min_mb are absolute noise floors: differences below them never fail.
+    """
+    regressions = []
+    for rows, stages in results.items():
+        for stage, current in stages.items():
+            reference = baseline.get(rows, {}).get(stage)
+            if reference is None:
+                continue
+            for metric, floor, unit in (('seconds', min_seconds, 's'), ('peak_mb', min_mb, 'MB')):
+                limit = reference[metric] * (1 + tolerance)
+                if current[metric] > limit and current[metric] - reference[metric] > floor:
+                    regressions.append(f"{stage} at {rows} rows: {metric} {current[metric]}{unit} "
+                                       f"> baseline {reference[metric]}{unit} +{tolerance:.0%}")
+    return regressions
+
+def machine_info():
+    return {'python': platform.python_version(), 'machine': platform.machine(),
+            'processor': platform.processor(), 'cpu_count': os.cpu_count(),
+            'pandas': pd.__version__, 'numpy': np.__version__}
+
+def main(argv=None):
+    """Benchmark each pipeline stage and fail on regressions against the stored baseline."""
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.bench_pipeline', description=main.__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS)
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per size; the fastest is kept')
+    parser.add_argument('--missing-rate', type=float, default=0.05)
+    parser.add_argument('--outlier-rate', type=float, default=0.02)
+    parser.add_argument('--serialize-rows', type=int, default=1_000_000,
+                        help='rows encoded as JSON records (default 1,000,000)')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='merge these results into the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown, as a fraction')
+    parser.add_argument('--output', help='also write the results as JSON')
+    args = parser.parse_args(argv)
+
+    results = {}
+    print(f"{'rows':>10} {'stage':>8} {'seconds':>9} {'peak MB':>9}")
+    for rows in args.rows:
+        stages = measure(rows, args.repeat, args.serialize_rows, args.missing_rate, args.outlier_rate)
+        results[str(rows)] = stages
+        for stage, values in stages.items():
+            print(f"{rows:>10} {stage:>8} {values['seconds']:>9.3f} {values['peak_mb']:>9.1f}")
+
+    report = {'machine': machine_info(), 'missing_rate': args.missing_rate,
+              'outlier_rate': args.outlier_rate, 'results': results}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    if args.save_baseline:
+        baseline.update(machine=report['machine'], results={**baseline.get('results', {}), **results})
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not baseline:
+        print(f"No baseline at {args.baseline}; run with --save-baseline first", file=sys.stderr)
+        return 0
+    if baseline.get('machine', {}).get('cpu_count') != os.cpu_count():
+        print('warning: baseline was recorded on different hardware', file=sys.stderr)
+
+    regressions = compare_to_baseline(results, baseline['results'], args.tolerance)
+    for message in regressions:
+        print(f"  regression: {message}", file=sys.stderr)
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
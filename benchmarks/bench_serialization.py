@@ -0,0 +1,72 @@
+"""Benchmark result serialization against the former to_dict('records') path.
+
+Runs the pipeline on synthetic data, then times encoding the analysed rows
+the way responses used to be built (replace NaN, to_dict('records'),
+json.dumps) next to serialization.dumps in the records and columns layouts.
+The records output is checked to decode to the same rows as before.
+
+Command line usage::
+
+    python -m benchmarks.bench_serialization
+    python -m benchmarks.bench_serialization --rows 10000 100000 1000000
+"""
+import argparse
+import json
+import time
+import numpy as np
+from benchmarks.bench_pipeline import make_dataset
+from src.export import format_dates, with_colors
+from src.serialization import dumps, orjson
+from src.validation import round_bmi
+
+def make_frame(rows):
+    """Analysed rows as /results pages them, after cleaning, Layer 1 and Layer 2."""
+    from src import web_gui
+    cleaned = web_gui.apply_column_mapping_and_clean(make_dataset(rows), web_gui.DEFAULT_COLUMN_MAPPING)
+    return web_gui._apply_layer2_isolation_forest(web_gui._apply_layer1_validation(cleaned))
+
+def legacy_dumps(payload):
+    """The former path: records built by pandas, then the standard json module."""
+    records = {}
+    for key, df in payload.items():
+        # Former analysis frames stored the color column that is now derived when rendering
+        df = with_colors(df)
+        if 'bmi_calculated' in df.columns:
+            df = df.assign(bmi_calculated=round_bmi(df['bmi_calculated']))
+        float32_cols = df.select_dtypes('float32').columns
+        if len(float32_cols):
+            df = df.assign(**{col: df[col].to_numpy().astype(str).astype(np.float64)
+                              for col in float32_cols})
+        records[key] = format_dates(df).replace({np.nan: None}).to_dict('records')
+    return json.dumps(records).encode()
+
+def time_encode(encode, payload, repeat=3):
+    """Best-of-repeat seconds for one encode, and its output."""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = encode(payload)
+        seconds = time.perf_counter() - started
+        best = seconds if best is None else min(best, seconds)
+    return best, body
+
+def main(argv=None):
+    """Compare column-wise JSON encoding with the to_dict('records') path it replaced."""
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.bench_serialization', description=main.__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    print(f"encoder: {'orjson' if orjson is not None else 'json'}")
+    print(f"{'rows':>10} {'legacy s':>10} {'records s':>10} {'columns s':>10} {'columns MB':>11} {'speedup':>9}")
+    for rows in args.rows:
+        payload = {'rows': make_frame(rows)}
+        legacy_seconds, legacy_body = time_encode(legacy_dumps, payload, args.repeat)
+        records_seconds, records_body = time_encode(lambda p: dumps(p, 'records'), payload, args.repeat)
+        columns_seconds, columns_body = time_encode(lambda p: dumps(p, 'columns'), payload, args.repeat)
+        assert json.loads(records_body) == json.loads(legacy_body)
+        print(f"{rows:>10} {legacy_seconds:>10.3f} {records_seconds:>10.3f} {columns_seconds:>10.3f} "
+              f"{len(columns_body) / 1024 ** 2:>11.1f} {legacy_seconds / columns_seconds:>8.1f}x")
+
+if __name__ == '__main__':
+    main()
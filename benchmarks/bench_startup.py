@@ -0,0 +1,108 @@
+"""Startup latency report: import times, time to a listening socket and pre-warm cost.
+
+Each measurement runs in a fresh interpreter, so nothing is already
+imported. The import report parses ``python -X importtime`` and lists the
+slowest top-level imports; heavy dependencies that are deferred until
+first use are shown as not loaded at startup.
+
+Command line usage::
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --module src.batch --top 20 --repeat 5
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loaded by the Layer 2 pre-warm, not by importing the app
+DEFERRED_MODULES = ('sklearn', 'scipy', 'joblib')
+
+LISTEN_SCRIPT = """
+from src.web_gui import app
+from werkzeug.serving import make_server
+server = make_server('127.0.0.1', 0, app)
+print(server.server_port, flush=True)
+"""
+
+PREWARM_SCRIPT = """
+import sys, time
+from src import web_gui
+started = time.perf_counter()
+web_gui.prewarm().join()
+print(time.perf_counter() - started)
+print(' '.join(name for name in %r if name in sys.modules))
+"""
+
+def _python(*args):
+    return subprocess.run([sys.executable, *args], cwd=ROOT_DIR, capture_output=True, text=True, check=True)
+
+def import_times(module='src.web_gui'):
+    """[(module, self seconds, cumulative seconds, depth)] from python -X importtime, in import order."""
+    stderr = _python('-X', 'importtime', '-c', f'import {module}').stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), int(own) / 1e6, int(cumulative) / 1e6, depth))
+    return rows
+
+def direct_imports(rows, module):
+    """The rows imported directly by module; importtime lists children before their parent."""
+    end = next(i for i, row in enumerate(rows) if row[0] == module and row[3] == 0)
+    children = []
+    for row in reversed(rows[:end]):
+        if row[3] == 0:
+            break
+        if row[3] == 1:
+            children.append(row)
+    return children
+
+def seconds_to_listen():
+    """Wall time from launching the interpreter until the app's socket is bound and listening."""
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, '-c', LISTEN_SCRIPT], cwd=ROOT_DIR,
+                               stdout=subprocess.PIPE, text=True)
+    try:
+        process.stdout.readline()
+        return time.perf_counter() - started
+    finally:
+        process.kill()
+        process.wait()
+
+def prewarm_cost():
+    """Seconds the background pre-warm takes, and the deferred modules it loaded."""
+    seconds, loaded = _python('-c', PREWARM_SCRIPT % (DEFERRED_MODULES,)).stdout.splitlines()
+    return float(seconds), loaded.split()
+
+def main(argv=None):
+    """Report where startup time goes and how long the server takes to listen."""
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.bench_startup', description=main.__doc__)
+    parser.add_argument('--module', default='src.web_gui', help='module whose imports are reported')
+    parser.add_argument('--top', type=int, default=10, help='slowest imports to list')
+    parser.add_argument('--repeat', type=int, default=3, help='launches per timing; the fastest is kept')
+    args = parser.parse_args(argv)
+
+    rows = import_times(args.module)
+    total = next(cumulative for name, _, cumulative, depth in rows if name == args.module and depth == 0)
+    loaded = {name for name, _, _, _ in rows}
+    print(f"import {args.module}: {total:.3f}s")
+    print(f"{'cumulative s':>13} {'self s':>8}  module")
+    for name, own, cumulative, _ in sorted(direct_imports(rows, args.module), key=lambda row: -row[2])[:args.top]:
+        print(f"{cumulative:>13.3f} {own:>8.3f}  {name}")
+    print('deferred: ' + ', '.join(f"{name} ({'loaded' if name in loaded else 'not loaded'})"
+                                   for name in DEFERRED_MODULES))
+
+    listen = min(seconds_to_listen() for _ in range(args.repeat))
+    print(f"interpreter start to listening socket: {listen:.3f}s")
+    if args.module == 'src.web_gui':
+        seconds, prewarmed = prewarm_cost()
+        print(f"background pre-warm: {seconds:.3f}s ({', '.join(prewarmed) or 'nothing'} loaded)")
+
+if __name__ == '__main__':
+    main()
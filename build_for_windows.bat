@@ -2,7 +2,7 @@
 echo Building Doctor31 Medical Validator for Windows...
 echo.
 
-pip install --upgrade pyinstaller && pyinstaller --clean --onefile main.py --name Doctor31_Medical_Validator --add-data "src/templates:src/templates" --add-data "src/static:src/static" --add-data "src/validation.py:src" --add-data "src/web_gui.py:src" --add-data "src/log_config.py:src" --add-data "src/__init__.py:src" --hidden-import flask --hidden-import pandas --hidden-import numpy --hidden-import sklearn --hidden-import sklearn.ensemble --hidden-import sklearn.preprocessing --hidden-import openpyxl --hidden-import werkzeug --hidden-import jinja2 --hidden-import click --hidden-import itsdangerous --hidden-import markupsafe --hidden-import joblib --hidden-import scipy --hidden-import threadpoolctl --console --noconfirm
+pip install --upgrade pyinstaller && pyinstaller --clean --onefile main.py --name Doctor31_Medical_Validator --add-data "src/templates:src/templates" --add-data "src/static:src/static" --add-data "src/rules:src/rules" --add-data "src/validation.py:src" --add-data "src/web_gui.py:src" --add-data "src/log_config.py:src" --add-data "src/ingestion.py:src" --add-data "src/dataset_store.py:src" --add-data "src/model_store.py:src" --add-data "src/results.py:src" --add-data "src/export.py:src" --add-data "src/batch.py:src" --add-data "src/jobs.py:src" --add-data "src/metrics.py:src" --add-data "src/serialization.py:src" --add-data "src/result_cache.py:src" --add-data "src/duplicates.py:src" --add-data "src/summary_stats.py:src" --add-data "src/__init__.py:src" --hidden-import flask --hidden-import pandas --hidden-import numpy --hidden-import sklearn --hidden-import sklearn.ensemble --hidden-import sklearn.preprocessing --hidden-import openpyxl --hidden-import pyarrow --hidden-import orjson --hidden-import yaml --hidden-import werkzeug --hidden-import jinja2 --hidden-import click --hidden-import itsdangerous --hidden-import markupsafe --hidden-import joblib --hidden-import scipy --hidden-import threadpoolctl --console --noconfirm
 
 echo.
 echo Build completed! Check the 'dist' folder for the executable.
@@ -3,11 +3,9 @@ Doctor31 Medical Validator - Main Entry Point
 This is the main entry point for PyInstaller to create the Windows EXE
 """
 
+import multiprocessing
 import os
 import sys
-import time
-import webbrowser
-import threading
 
 # Add the src directory to Python path
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -21,7 +19,7 @@ def main():
         os.chdir(current_dir)
         
         # Import the web GUI components
-        from src.web_gui import app, find_free_port
+        from src.web_gui import find_free_port, serve
         
         # Find an available port
         port = find_free_port()
@@ -33,17 +31,8 @@ def main():
         print("💡 Press Ctrl+C to stop the server")
         print("=" * 50)
         
-        # Open browser after a short delay
-        def open_browser():
-            time.sleep(2)
-            webbrowser.open(f'http://127.0.0.1:{port}')
-        
-        browser_thread = threading.Thread(target=open_browser)
-        browser_thread.daemon = True
-        browser_thread.start()
-        
-        # Start the Flask application
-        app.run(host='127.0.0.1', port=port, debug=False)
+        # Start the Flask application; the browser opens once the port is bound
+        serve(port)
         
     except KeyboardInterrupt:
         print("\n👋 Server stopped by user")
@@ -53,4 +42,6 @@ def main():
         input()
 
 if __name__ == "__main__":
+    # Layer 2 process-pool scoring re-launches the frozen EXE for each worker
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
@@ -0,0 +1,155 @@
+"""Headless batch validation of CSV, Parquet, Feather/Arrow and xlsx files without the Flask server.
+
+Runs the same two-layer pipeline as /analyze on each input file in a
+process pool, writes an annotated copy of every file and a summary JSON
+with per-file statistics and their merge across all files.
+
+Command line usage::
+
+    python -m src.batch --mapping mapping.json --output-dir validated/ exports/*.csv
+    python -m src.batch --workers 8 --format parquet "exports/2024-*.csv"
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+from src.summary_stats import StreamingSummary, iter_chunks, summarize
+
+def expand_inputs(patterns):
+    """Expand paths and glob patterns into a sorted, de-duplicated list of files."""
+    paths = set()
+    for pattern in patterns:
+        matches = glob.glob(pattern, recursive=True)
+        paths.update(matches if matches else [pattern])
+    return sorted(paths)
+
+def output_path_for(input_path, output_dir, extension):
+    """Annotated output path for an input file."""
+    stem = os.path.splitext(os.path.basename(input_path))[0]
+    return os.path.join(output_dir, f"{stem}_validated.{extension}")
+
+def validate_file(input_path, mappings, output_dir, output_format='csv', model_dir=None, layer2_jobs=None,
+                  rules=None):
+    """Run cleaning, Layer 1, duplicate checks and Layer 2 on one file and write the annotated result."""
+    from src import web_gui
+    from src.web_gui import (apply_column_mapping_and_clean, _apply_layer1_validation, _apply_duplicate_detection,
+                             _apply_layer2_isolation_forest, _reorder_columns_for_display,
+                             _analysis_summary)
+    from src.export import EXPORT_FORMATS
+    from src.ingestion import read_mapped_columns, upload_format
+    from src.result_cache import file_digest
+    from src.model_store import ModelStore
+
+    if model_dir and web_gui.model_store.root_dir != model_dir:
+        web_gui.model_store = ModelStore(model_dir)
+    if layer2_jobs is not None:
+        web_gui.layer2_engine.n_jobs = layer2_jobs
+    if rules is not None:
+        web_gui.app.config['RULES'] = rules
+
+    started = time.perf_counter()
+    try:
+        fmt = upload_format(input_path)
+        if fmt in (None, 'csv'):
+            raw_df = pd.read_csv(input_path)
+        else:
+            raw_df = read_mapped_columns(input_path, fmt, mappings)
+        analysis_df = apply_column_mapping_and_clean(raw_df, mappings)
+        required_cols = ['age', 'weight', 'height', 'bmi']
+        if not any(col in analysis_df.columns for col in required_cols):
+            raise ValueError(f'None of the required columns ({required_cols}) are available after mapping')
+
+        analysis_df = _apply_layer1_validation(analysis_df)
+        analysis_df = _apply_duplicate_detection(analysis_df, file_digest(input_path))
+        analysis_df = _apply_layer2_isolation_forest(analysis_df)
+        analysis_df = _reorder_columns_for_display(analysis_df)
+
+        generate, _, extension = EXPORT_FORMATS[output_format]
+        output_path = output_path_for(input_path, output_dir, extension)
+        with _open_output(output_path, binary=output_format == 'parquet') as f:
+            for part in generate(analysis_df):
+                f.write(part)
+
+        result = _analysis_summary(analysis_df)
+        # Returned as mergeable state; main() combines the files and serialises it
+        result['statistics'] = summarize(iter_chunks(analysis_df))
+        result.update(input=input_path, output=output_path)
+    except Exception as e:
+        result = {'input': input_path, 'error': str(e)}
+    result['seconds'] = round(time.perf_counter() - started, 3)
+    return result
+
+def _open_output(path, binary):
+    if binary:
+        return open(path, 'wb')
+    return open(path, 'w', encoding='utf-8', newline='')
+
+def run_batch(inputs, mappings, output_dir, workers=None, output_format='csv', model_dir=None, rules=None):
+    """Validate files in parallel and return the per-file results in input order."""
+    os.makedirs(output_dir, exist_ok=True)
+    if workers == 1 or len(inputs) <= 1:
+        return [validate_file(path, mappings, output_dir, output_format, model_dir, rules=rules) for path in inputs]
+
+    # One file per process already uses every core, so each forest gets a single thread
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(validate_file, path, mappings, output_dir, output_format, model_dir, 1, rules): path
+                   for path in inputs}
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+    return [results[path] for path in inputs]
+
+def main(argv=None):
+    """Validate data files in parallel and write annotated outputs plus a summary JSON."""
+    parser = argparse.ArgumentParser(prog='python -m src.batch', description=main.__doc__)
+    parser.add_argument('inputs', nargs='+', help='CSV, Parquet, Feather/Arrow or xlsx files, or glob patterns')
+    parser.add_argument('--mapping', help='JSON file mapping fields to CSV columns (default mapping if omitted)')
+    parser.add_argument('--output-dir', default='validated')
+    parser.add_argument('--format', choices=['csv', 'ndjson', 'parquet'], default='csv')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: CPU count)')
+    parser.add_argument('--summary', help='summary JSON path (default: <output-dir>/summary.json)')
+    parser.add_argument('--model-dir', help='Layer 2 model directory (see python -m src.model_store)')
+    parser.add_argument('--rules', help='Layer 1 rule set: adult, pediatric or a JSON/YAML rule file (default: DOCTOR31_RULES)')
+    args = parser.parse_args(argv)
+
+    if args.mapping:
+        with open(args.mapping, encoding='utf-8') as f:
+            mappings = json.load(f)
+    else:
+        from src.web_gui import DEFAULT_COLUMN_MAPPING
+        mappings = DEFAULT_COLUMN_MAPPING
+
+    inputs = expand_inputs(args.inputs)
+    started = time.perf_counter()
+    results = run_batch(inputs, mappings, args.output_dir, args.workers, args.format, args.model_dir, args.rules)
+
+    failed = [result for result in results if 'error' in result]
+    statistics = StreamingSummary()
+    for result in results:
+        if 'statistics' in result:
+            statistics.merge(result['statistics'])
+            result['statistics'] = result['statistics'].to_dict()
+    summary = {
+        'files': results,
+        'total_files': len(results),
+        'failed_files': len(failed),
+        'total_rows': sum(result.get('total_rows', 0) for result in results),
+        'statistics': statistics.to_dict(),
+        'seconds': round(time.perf_counter() - started, 3)
+    }
+    summary_path = args.summary or os.path.join(args.output_dir, 'summary.json')
+    with open(summary_path, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2)
+
+    print(f"Validated {len(results) - len(failed)}/{len(results)} files, "
+          f"{summary['total_rows']} rows in {summary['seconds']}s -> {summary_path}")
+    for result in failed:
+        print(f"  failed: {result['input']}: {result['error']}", file=sys.stderr)
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,266 @@
+import json
+import os
+import re
+import shutil
+import threading
+import uuid
+import weakref
+from collections import OrderedDict
+import pandas as pd
+
+# DataFrame attributes of a SessionDataset that count towards memory and are spilled to disk
+FRAME_FIELDS = ('data', 'processed_data', 'analysis_data')
+SPILL_FORMATS = ('parquet', 'feather', 'pickle')
+
+_SESSION_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+class SessionDataset:
+    """Upload state of a single analyst session."""
+
+    def __init__(self):
+        self.data = None
+        self.data_source = None
+        self.column_mappings = None
+        self.processed_data = None
+        self.analysis_data = None
+        # (source column, parser) -> (cleaned column of data, parse failures); rebuilt on demand, never spilled
+        self.clean_cache = {}
+        # {'model_id': ...} or {'fingerprint': ...} of the Layer 2 model behind analysis_data
+        self.layer2_model = None
+        # Content digest of the uploaded bytes (and appended batches); keys the result cache
+        self.upload_digest = None
+        self.version = 0
+        # Frame name -> (weak reference to the frame last spilled, its meta.json entry); unchanged frames
+        # are not written again
+        self._spilled = {}
+        # Frame name or clean_cache key -> (weak reference to the object last measured, its size)
+        self._measured = {}
+
+    def nbytes(self):
+        """Approximate in-memory size of the session's frames and cleaned-column cache.
+
+        Frames and columns are replaced rather than changed in place, so each is measured once.
+        """
+        parts = {**self._frames(), **{key: column for key, (column, _) in self.clean_cache.items()}}
+        measured = {}
+        for key, part in parts.items():
+            ref, size = self._measured.get(key, (None, 0))
+            if ref is None or ref() is not part:
+                usage = part.memory_usage(deep=True)
+                size = int(usage.sum() if isinstance(part, pd.DataFrame) else usage)
+            measured[key] = (weakref.ref(part), size)
+        self._measured = measured
+        return sum(size for _, size in measured.values())
+
+    def _frames(self):
+        frames = {name: getattr(self, name) for name in FRAME_FIELDS}
+        return {name: frame for name, frame in frames.items() if frame is not None}
+
+class DatasetStore:
+    """Session-keyed LRU of SessionDataset objects with optional on-disk spill.
+
+    Memory is bounded by max_bytes: least recently used sessions are evicted
+    first. When spill_dir is set every save is written through to disk, so an
+    evicted session (or one saved by another worker process sharing the
+    directory) is reloaded transparently on the next get().
+    """
+
+    def __init__(self, max_bytes, spill_dir=None, spill_format='parquet'):
+        if spill_format not in SPILL_FORMATS:
+            raise ValueError(f"spill_format must be one of {SPILL_FORMATS}, got {spill_format!r}")
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.spill_format = spill_format
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.RLock()
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    def get(self, session_id):
+        """Return the session's dataset, loading it from disk or creating it if needed."""
+        _check_session_id(session_id)
+        with self._lock:
+            entry = self._entries.get(session_id)
+            disk_version = self._disk_version(session_id)
+
+            if entry is not None and (disk_version is None or disk_version <= entry.version):
+                self._entries.move_to_end(session_id)
+                return entry
+
+            entry = self._load(session_id) if disk_version is not None else SessionDataset()
+            self._remember(session_id, entry)
+            return entry
+
+    def save(self, session_id, dataset):
+        """Record changes to a session's dataset and enforce the memory bound."""
+        _check_session_id(session_id)
+        with self._lock:
+            dataset.version += 1
+            if self.spill_dir:
+                self._spill(session_id, dataset)
+            self._remember(session_id, dataset)
+
+    def update(self, session_id, dataset, version, **fields):
+        """Set fields on the dataset and save it, unless it was saved since version.
+
+        Returns the new version, or None (leaving the dataset untouched) when
+        another request or worker changed the session in the meantime.
+        """
+        _check_session_id(session_id)
+        with self._lock:
+            disk_version = self._disk_version(session_id)
+            if dataset.version != version or (disk_version is not None and disk_version > version):
+                return None
+            for name, value in fields.items():
+                setattr(dataset, name, value)
+            self.save(session_id, dataset)
+            return dataset.version
+
+    def discard(self, session_id):
+        """Forget a session both in memory and on disk."""
+        _check_session_id(session_id)
+        with self._lock:
+            self._entries.pop(session_id, None)
+            self._sizes.pop(session_id, None)
+            if self.spill_dir:
+                shutil.rmtree(self._session_dir(session_id), ignore_errors=True)
+
+    def total_bytes(self):
+        """Total size of the datasets currently held in memory."""
+        with self._lock:
+            return sum(self._sizes.values())
+
+    def __contains__(self, session_id):
+        with self._lock:
+            return session_id in self._entries
+
+    def _remember(self, session_id, dataset):
+        self._entries[session_id] = dataset
+        self._entries.move_to_end(session_id)
+        self._sizes[session_id] = dataset.nbytes()
+        self._evict()
+
+    def _evict(self):
+        # Always keep the most recent session, even if it alone exceeds the budget
+        while len(self._entries) > 1 and sum(self._sizes.values()) > self.max_bytes:
+            session_id, dataset = self._entries.popitem(last=False)
+            self._sizes.pop(session_id, None)
+            # Without a spill copy the evicted session is gone, so drop its spooled upload too
+            if not self.spill_dir and dataset.data_source and os.path.exists(dataset.data_source):
+                os.remove(dataset.data_source)
+
+    def _session_dir(self, session_id):
+        return os.path.join(self.spill_dir, session_id)
+
+    def _disk_version(self, session_id):
+        if not self.spill_dir:
+            return None
+        try:
+            with open(os.path.join(self._session_dir(session_id), 'meta.json'), encoding='utf-8') as f:
+                return json.load(f)['version']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _spill(self, session_id, dataset):
+        session_dir = self._session_dir(session_id)
+        os.makedirs(session_dir, exist_ok=True)
+
+        frame_files = {}
+        for name, frame in dataset._frames().items():
+            ref, entry = dataset._spilled.get(name, (None, None))
+            if ref is None or ref() is not frame or not os.path.exists(_entry_path(session_dir, entry)):
+                # Each write gets a new file name, so the files the current meta.json points to stay intact
+                file_name = f"{name}-{dataset.version}-{uuid.uuid4().hex[:8]}"
+                entry = {'file': file_name,
+                         'format': write_frame(frame, os.path.join(session_dir, file_name), self.spill_format)}
+            frame_files[name] = entry
+        dataset._spilled = {name: (weakref.ref(getattr(dataset, name)), entry) for name, entry in frame_files.items()}
+
+        meta = {
+            'version': dataset.version,
+            'data_source': dataset.data_source,
+            'column_mappings': dataset.column_mappings,
+            'layer2_model': dataset.layer2_model,
+            'upload_digest': dataset.upload_digest,
+            'frames': frame_files
+        }
+        # Write metadata last and atomically so readers never see a half-written session
+        tmp_path = os.path.join(session_dir, f'meta.json.{uuid.uuid4().hex[:8]}.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(session_dir, 'meta.json'))
+        _remove_unreferenced_frames(session_dir, frame_files.values())
+
+    def _load(self, session_id, attempts=3):
+        # A save by another worker can remove the files of the meta.json read here, so read it again
+        for attempt in range(attempts):
+            try:
+                return self._read_session(self._session_dir(session_id))
+            except FileNotFoundError:
+                if attempt == attempts - 1:
+                    raise
+
+    def _read_session(self, session_dir):
+        with open(os.path.join(session_dir, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+
+        dataset = SessionDataset()
+        dataset.version = meta['version']
+        dataset.data_source = meta.get('data_source')
+        dataset.column_mappings = meta.get('column_mappings')
+        dataset.layer2_model = meta.get('layer2_model')
+        dataset.upload_digest = meta.get('upload_digest')
+        for name, entry in meta.get('frames', {}).items():
+            frame = read_frame(os.path.join(session_dir, entry['file']), entry['format'])
+            setattr(dataset, name, frame)
+            dataset._spilled[name] = (weakref.ref(frame), entry)
+        return dataset
+
+def _entry_path(session_dir, entry):
+    return os.path.join(session_dir, f"{entry['file']}.{entry['format']}") if entry else ''
+
+def _remove_unreferenced_frames(session_dir, entries):
+    # Frame files superseded by this save; readers of the previous meta.json retry in _load
+    referenced = {os.path.basename(_entry_path(session_dir, entry)) for entry in entries}
+    for file_name in os.listdir(session_dir):
+        if os.path.splitext(file_name)[1][1:] in SPILL_FORMATS and file_name not in referenced:
+            try:
+                os.remove(os.path.join(session_dir, file_name))
+            except OSError:
+                pass
+
+def _check_session_id(session_id):
+    if not isinstance(session_id, str) or not _SESSION_ID_PATTERN.match(session_id):
+        raise ValueError(f"Invalid session id: {session_id!r}")
+
+def write_frame(frame, base_path, fmt):
+    """Write a frame in the requested format, falling back to pickle for unsupported data."""
+    remove_frame_files(base_path)
+    if fmt == 'parquet':
+        try:
+            frame.to_parquet(base_path + '.parquet')
+            return 'parquet'
+        except (ImportError, NotImplementedError, ValueError, TypeError):
+            pass
+    elif fmt == 'feather':
+        try:
+            # The index and attrs go into the pandas metadata; pandas < 3 refuses other than a default index
+            frame.to_feather(base_path + '.feather')
+            return 'feather'
+        except (ImportError, NotImplementedError, ValueError, TypeError):
+            pass
+    frame.to_pickle(base_path + '.pickle')
+    return 'pickle'
+
+def read_frame(base_path, fmt):
+    if fmt == 'parquet':
+        return pd.read_parquet(base_path + '.parquet')
+    if fmt == 'feather':
+        return pd.read_feather(base_path + '.feather')
+    return pd.read_pickle(base_path + '.pickle')
+
+def remove_frame_files(base_path):
+    for fmt in SPILL_FORMATS:
+        if os.path.exists(f"{base_path}.{fmt}"):
+            os.remove(f"{base_path}.{fmt}")
@@ -0,0 +1,218 @@
+"""Duplicate and resubmission detection within an upload and across uploads.
+
+Every row with a case_id gets two 64-bit keys:
+
+- exact: case_id, the measurements to 0.1 and the date as recorded
+- near: case_id, the measurements to whole units and the day of the date,
+  so a resubmission with slightly edited values still matches
+
+Repeats within a file are found by hashing the keys of the file itself.
+Rows of earlier uploads are looked up in a DuplicateIndex, an open-addressing
+hash table in a memory-mapped file that stores each key with a tag of the
+upload it was first seen in. Lookups and inserts are vectorized and cost
+O(1) per row, and only the pages a lookup touches are read from disk, so
+the index holds tens of millions of historical rows without loading them.
+"""
+import contextlib
+import os
+import threading
+import numpy as np
+import pandas as pd
+
+# Checked in this order; a row is flagged with the first kind that applies
+DUPLICATE_KINDS = ('exact', 'exact_previous', 'near', 'near_previous')
+
+# Within-file repeats are left out of the Layer 2 fit so they do not skew it
+REPEAT_KINDS = ('exact', 'near')
+
+MEASUREMENT_FIELDS = ('age', 'weight', 'height', 'bmi')
+
+_EXACT, _NEAR = 1, 2
+
+try:
+    import fcntl
+except ImportError:  # Windows: the index is shared by the threads of one process only
+    fcntl = None
+
+def row_keys(df):
+    """(exact keys, near keys, has case_id) for every row, or None without a case_id column."""
+    if 'case_id' not in df.columns:
+        return None
+    case_id = _normalized_case_id(df['case_id'])
+    measurements = {field: df[field].to_numpy(dtype=np.float64, na_value=np.nan)
+                    for field in MEASUREMENT_FIELDS if field in df.columns}
+    exact = {'kind': _EXACT, 'case_id': case_id,
+             **{field: np.round(values, 1) for field, values in measurements.items()}}
+    near = {'kind': _NEAR, 'case_id': case_id,
+            **{field: np.round(values) for field, values in measurements.items()}}
+    if 'date' in df.columns and df['date'].dtype.kind == 'M':
+        exact['date'] = df['date'].to_numpy()
+        near['date'] = df['date'].dt.floor('D').to_numpy()
+    return _hash_columns(exact), _hash_columns(near), case_id.notna().to_numpy()
+
+def _normalized_case_id(column):
+    """case_id as float64 when every id is numeric, else as strings, so 7, 7.0 and '7' match."""
+    column = column.reset_index(drop=True)
+    numeric = pd.to_numeric(column, errors='coerce')
+    if numeric.notna().sum() == column.notna().sum():
+        return numeric.astype(np.float64)
+    return column.astype('string')
+
+def _hash_columns(columns):
+    keys = pd.util.hash_pandas_object(pd.DataFrame(columns), index=False).to_numpy(copy=True)
+    # 0 marks an empty slot in the index
+    keys[keys == 0] = 1
+    return keys
+
+def upload_tag(digest):
+    """Index tag of an upload, from its SHA-256 hex digest."""
+    return np.uint64(int(digest[:16], 16) or 1)
+
+def flag_duplicates(df, index=None, tag=None):
+    """Categorical of DUPLICATE_KINDS per row, NaN for first occurrences.
+
+    With an index and the upload's tag, rows seen in other uploads are
+    flagged too, and this upload's keys are added to the index.
+    """
+    codes = np.full(len(df), -1, dtype=np.int8)
+    keys = row_keys(df)
+    if keys is not None and len(df):
+        exact, near, has_id = keys
+        rows = np.flatnonzero(has_id)
+        exact, near = exact[rows], near[rows]
+        exact_repeat = pd.Series(exact).duplicated().to_numpy()
+        near_repeat = pd.Series(near).duplicated().to_numpy()
+        exact_previous = np.zeros(len(rows), dtype=bool)
+        near_previous = np.zeros(len(rows), dtype=bool)
+        if index is not None and tag is not None:
+            # Repeats are flagged as such whatever the index says, so only first occurrences are looked up
+            first_exact, first_near = np.flatnonzero(~exact_repeat), np.flatnonzero(~near_repeat)
+            first_seen = index.check_and_add(np.concatenate([exact[first_exact], near[first_near]]), tag)
+            exact_previous[first_exact] = first_seen[:len(first_exact)] != tag
+            near_previous[first_near] = first_seen[len(first_exact):] != tag
+        conditions = [exact_repeat, exact_previous, near_repeat, near_previous]
+        codes[rows] = np.select(conditions, np.arange(len(DUPLICATE_KINDS), dtype=np.int8), default=-1)
+    return pd.Categorical.from_codes(codes, categories=DUPLICATE_KINDS)
+
+class DuplicateIndex:
+    """Persistent set of row keys, each with the tag of the upload it was first seen in.
+
+    The table is a file of (key, tag) uint64 pairs with linear probing,
+    kept at most half full and doubled when needed. A lock file serializes
+    access between threads and, where fcntl exists, worker processes; the
+    table is mapped afresh for every call so each process sees the others'
+    inserts and growth.
+    """
+
+    def __init__(self, root_dir, initial_slots=1 << 20, max_load=0.5):
+        self.root_dir = root_dir
+        self.path = os.path.join(root_dir, 'index.bin')
+        self.initial_slots = initial_slots
+        self.max_load = max_load
+        self._lock = threading.Lock()
+        os.makedirs(root_dir, exist_ok=True)
+
+    def __len__(self):
+        with self._locked():
+            return self._count()
+
+    def check_and_add(self, keys, tag):
+        """Tag of the upload each of the distinct keys was first seen in; new keys are added with tag."""
+        keys = np.asarray(keys, dtype=np.uint64)
+        with self._locked():
+            self._reserve(self._count() + len(keys))
+            table = np.memmap(self.path, dtype=np.uint64, mode='r+').reshape(-1, 2)
+            try:
+                first_seen, inserted = _probe(table[1:], keys, np.uint64(tag))
+                table[0, 0] += inserted
+                table.flush()
+            finally:
+                del table
+        return first_seen
+
+    def _count(self):
+        if not os.path.exists(self.path):
+            return 0
+        return int(np.fromfile(self.path, dtype=np.uint64, count=1)[0])
+
+    def _reserve(self, needed):
+        """Create or grow the table so needed keys keep it under max_load."""
+        slots = self.initial_slots
+        if os.path.exists(self.path):
+            slots = os.path.getsize(self.path) // 16 - 1
+            if needed <= slots * self.max_load:
+                return
+        while needed > slots * self.max_load:
+            slots *= 2
+        tmp_path = self.path + '.tmp'
+        grown = np.memmap(tmp_path, dtype=np.uint64, mode='w+', shape=(slots + 1, 2))
+        try:
+            if os.path.exists(self.path):
+                self._rehash_into(grown)
+            grown.flush()
+        finally:
+            del grown
+        os.replace(tmp_path, self.path)
+
+    def _rehash_into(self, grown, block_slots=1 << 20):
+        """Copy every entry into a larger table, a block at a time so memory stays bounded."""
+        old = np.memmap(self.path, dtype=np.uint64, mode='r').reshape(-1, 2)
+        try:
+            grown[0] = old[0]
+            for start in range(1, len(old), block_slots):
+                block = np.array(old[start:start + block_slots])
+                block = block[block[:, 0] != 0]
+                for tag in np.unique(block[:, 1]):
+                    _probe(grown[1:], block[block[:, 1] == tag, 0], tag)
+        finally:
+            del old
+
+    @contextlib.contextmanager
+    def _locked(self):
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(os.path.join(self.root_dir, 'index.lock'), 'ab') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _probe(table, keys, tag):
+    """Look up distinct keys in a (slots, 2) table by linear probing, one vectorized step per probe.
+
+    Keys not in the table are stored with tag. Returns (tag stored with
+    each key, number of keys inserted).
+    """
+    mask = np.uint64(len(table) - 1)
+    # Visiting slots in ascending order touches each page of the mapping once per step
+    order = np.argsort(keys & mask)
+    keys = keys[order]
+    slots = keys & mask
+    found = np.zeros(len(keys), dtype=np.uint64)
+    pending = np.arange(len(keys))
+    inserted = 0
+    while pending.size:
+        at = slots[pending]
+        stored = table[at, 0]
+        hit = stored == keys[pending]
+        found[pending[hit]] = table[at[hit], 1]
+        empty = stored == 0
+        done = hit.copy()
+        if empty.any():
+            # Keys reaching the same empty slot all write it and one survives; the rest look at it again
+            candidates = np.flatnonzero(empty)
+            table[at[candidates], 0] = keys[pending[candidates]]
+            table[at[candidates], 1] = tag
+            winners = candidates[table[at[candidates], 0] == keys[pending[candidates]]]
+            found[pending[winners]] = tag
+            inserted += len(winners)
+            done[winners] = True
+        advance = ~done & ~empty
+        slots[pending[advance]] = (at[advance] + np.uint64(1)) & mask
+        pending = pending[~done]
+    first_seen = np.empty_like(found)
+    first_seen[order] = found
+    return first_seen, inserted
@@ -0,0 +1,113 @@
+"""Chunked serializers used to stream full analysis results to the client.
+
+Each generator walks the frame in slices of chunk_rows and yields the
+encoded slice, so the response starts immediately and never holds more
+than one encoded chunk in memory.
+"""
+import io
+import pandas as pd
+from src.validation import status_colors
+
+DEFAULT_EXPORT_CHUNK_ROWS = 50_000
+
+# Text rendering of datetime64 columns in CSV, NDJSON and JSON responses
+DATE_OUTPUT_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+def format_dates(df):
+    """Render datetime64 columns as DATE_OUTPUT_FORMAT strings, NaT as NaN."""
+    date_cols = df.select_dtypes(['datetime', 'datetimetz']).columns
+    if not len(date_cols):
+        return df
+    return df.assign(**{col: df[col].dt.strftime(DATE_OUTPUT_FORMAT) for col in date_cols})
+
+def with_colors(df):
+    """Insert the color of each row's status after the status column, unless the frame has one."""
+    if 'status' not in df.columns or 'color' in df.columns:
+        return df
+    df = df.copy(deep=False)
+    df.insert(df.columns.get_loc('status') + 1, 'color', status_colors(df['status']))
+    return df
+
+def _iter_slices(df, positions, chunk_rows):
+    # Colors are derived per slice, so the full result never holds a color column
+    if positions is None:
+        for start in range(0, len(df), chunk_rows):
+            yield with_colors(df.iloc[start:start + chunk_rows])
+    else:
+        for start in range(0, len(positions), chunk_rows):
+            yield with_colors(df.iloc[positions[start:start + chunk_rows]])
+
+def iter_csv(df, positions=None, chunk_rows=DEFAULT_EXPORT_CHUNK_ROWS):
+    """Yield the frame as CSV text, header first."""
+    yield with_colors(df.iloc[:0]).to_csv(index=False)
+    for chunk in _iter_slices(df, positions, chunk_rows):
+        yield chunk.to_csv(index=False, header=False, date_format=DATE_OUTPUT_FORMAT)
+
+def iter_ndjson(df, positions=None, chunk_rows=DEFAULT_EXPORT_CHUNK_ROWS):
+    """Yield the frame as newline-delimited JSON records with NaN written as null."""
+    for chunk in _iter_slices(df, positions, chunk_rows):
+        if len(chunk):
+            text = format_dates(chunk).to_json(orient='records', lines=True)
+            yield text if text.endswith('\n') else text + '\n'
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that hands written bytes back to the generator."""
+
+    def __init__(self):
+        super().__init__()
+        self._parts = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._parts.append(bytes(b))
+        return len(b)
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+def arrow_schema(df):
+    """Infer an Arrow schema from the first non-null value of each column."""
+    import pyarrow as pa
+
+    sample = {}
+    for col in df.columns:
+        first_valid = df[col].first_valid_index()
+        position = 0 if first_valid is None else df.index.get_loc(first_valid)
+        sample[col] = df[col].iloc[position:position + 1].reset_index(drop=True)
+    return pa.Schema.from_pandas(pd.DataFrame(sample), preserve_index=False)
+
+def iter_parquet(df, positions=None, chunk_rows=DEFAULT_EXPORT_CHUNK_ROWS):
+    """Yield a Parquet file written one row group per chunk."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = arrow_schema(df)
+    if 'status' in df.columns and 'color' not in df.columns:
+        # Add the field _iter_slices will insert, without building a color column for the whole result
+        schema = schema.insert(schema.get_field_index('status') + 1, pa.field('color', pa.string()))
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for chunk in _iter_slices(df, positions, chunk_rows):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            data = sink.drain()
+            if data:
+                yield data
+    yield sink.drain()
+
+def parquet_available():
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+# format -> (generator, mimetype, file extension)
+EXPORT_FORMATS = {
+    'csv': (iter_csv, 'text/csv', 'csv'),
+    'ndjson': (iter_ndjson, 'application/x-ndjson', 'ndjson'),
+    'parquet': (iter_parquet, 'application/vnd.apache.parquet', 'parquet')
+}
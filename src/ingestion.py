@@ -0,0 +1,126 @@
+import os
+import pandas as pd
+from pandas.api.types import union_categoricals
+from src.validation import STATUS_DTYPE
+
+# Compact dtypes used for the cleaned and analysed frames kept in memory
+FLOAT32_FIELDS = ['age', 'weight', 'height', 'bmi', 'bmi_calculated', 'isolation_score', 'anomaly']
+CATEGORY_FIELDS = ['sex', 'consent', 'completed', 'test_flag', 'bmi_index']
+
+DEFAULT_CHUNK_ROWS = 100_000
+
+# Upload file extension -> format; every format but csv is read column by column
+UPLOAD_FORMATS = {
+    '.csv': 'csv',
+    '.parquet': 'parquet',
+    '.feather': 'feather',
+    '.arrow': 'feather',
+    '.ipc': 'feather',
+    '.xlsx': 'xlsx'
+}
+
+def read_csv_columns(source):
+    """Read only the header row of a CSV file."""
+    return pd.read_csv(source, nrows=0).columns.tolist()
+
+def iter_csv_chunks(source, mappings, chunksize=DEFAULT_CHUNK_ROWS, nrows=None):
+    """Yield raw CSV chunks restricted to the mapped source columns."""
+    wanted = set(mappings.values())
+    dtypes = {mappings[field]: 'category' for field in CATEGORY_FIELDS if field in mappings}
+
+    yield from pd.read_csv(
+        source,
+        usecols=lambda col: col in wanted,
+        dtype=dtypes,
+        chunksize=chunksize,
+        nrows=nrows
+    )
+
+def compact_frame(df):
+    """Downcast a cleaned or analysed frame to float32 measurements and scores, categorical flags
+    and statuses, and the smallest integer type that holds its case ids."""
+    for col in FLOAT32_FIELDS:
+        if col in df.columns:
+            df[col] = df[col].astype('float32')
+    for col in CATEGORY_FIELDS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype('category')
+    if 'status' in df.columns and df['status'].dtype != STATUS_DTYPE:
+        df['status'] = df['status'].astype(STATUS_DTYPE)
+    if 'case_id' in df.columns and df['case_id'].dtype.kind in 'iu':
+        df['case_id'] = pd.to_numeric(df['case_id'], downcast='integer')
+    return df
+
+def concat_chunks(chunks):
+    """Concatenate compact chunks, keeping categorical columns categorical."""
+    if not chunks:
+        return pd.DataFrame()
+
+    # Align categories first so pd.concat does not fall back to object dtype
+    for col in CATEGORY_FIELDS:
+        if all(col in chunk.columns for chunk in chunks):
+            categories = union_categoricals([chunk[col] for chunk in chunks],
+                                            ignore_order=True).categories
+            for chunk in chunks:
+                chunk[col] = chunk[col].cat.set_categories(categories)
+
+    return pd.concat(chunks, ignore_index=True)
+
+def upload_format(filename):
+    """Format of an uploaded file from its extension, or None if unsupported."""
+    return UPLOAD_FORMATS.get(os.path.splitext(filename or '')[1].lower())
+
+def read_columns(source, fmt):
+    """Column names of a file, read from its header or schema only."""
+    if fmt == 'csv':
+        return read_csv_columns(source)
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        return pq.read_schema(source).names
+    if fmt == 'feather':
+        import pyarrow as pa
+        with pa.memory_map(source) as f:
+            return pa.ipc.open_file(f).schema.names
+    if fmt == 'xlsx':
+        from openpyxl import load_workbook
+        workbook = load_workbook(source, read_only=True)
+        try:
+            header = next(workbook.active.iter_rows(max_row=1, values_only=True), ())
+            return [str(value) for value in header if value is not None]
+        finally:
+            workbook.close()
+    raise ValueError(f"Unsupported format: {fmt}")
+
+def read_mapped_columns(source, fmt, mappings, nrows=None):
+    """Read only the mapped source columns of a Parquet, Feather/Arrow IPC or xlsx file.
+
+    Parquet and Arrow files are projected before decoding, and Arrow files are
+    memory-mapped so unused columns are never paged in.
+    """
+    wanted = set(mappings.values())
+    if fmt == 'xlsx':
+        # openpyxl still parses every cell, but only mapped columns are converted
+        return pd.read_excel(source, usecols=lambda col: col in wanted, nrows=nrows, engine='openpyxl')
+
+    columns = [col for col in read_columns(source, fmt) if col in wanted]
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        if nrows is not None:
+            parquet_file = pq.ParquetFile(source, memory_map=True)
+            batch = next(parquet_file.iter_batches(batch_size=nrows, columns=columns), None)
+            return _arrow_to_pandas(batch) if batch is not None else \
+                parquet_file.schema_arrow.empty_table().select(columns).to_pandas()
+        table = pq.read_table(source, columns=columns, memory_map=True)
+    elif fmt == 'feather':
+        import pyarrow.feather as feather
+        table = feather.read_table(source, columns=columns, memory_map=True)
+        if nrows is not None:
+            table = table.slice(0, nrows)
+    else:
+        raise ValueError(f"Unsupported format: {fmt}")
+    return _arrow_to_pandas(table)
+
+def _arrow_to_pandas(table):
+    # split_blocks avoids consolidating columns into one 2-D block, so numeric
+    # columns without nulls can be wrapped instead of copied
+    return table.to_pandas(split_blocks=True)
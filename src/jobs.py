@@ -0,0 +1,106 @@
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+ANALYSIS_STAGES = ('clean', 'layer1', 'layer2', 'summarize')
+
+logger = logging.getLogger(__name__)
+
+class Job:
+    """State of one background analysis, updated by the worker thread."""
+
+    def __init__(self, owner, stages):
+        self.job_id = uuid.uuid4().hex
+        self.owner = owner
+        self.state = 'queued'
+        self.stages = OrderedDict((stage, {'state': 'pending', 'seconds': None}) for stage in stages)
+        self.current_stage = None
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._stage_started = None
+        self._lock = threading.Lock()
+
+    def start_stage(self, stage):
+        """Mark stage as running, closing the previous one."""
+        with self._lock:
+            self._finish_current_stage()
+            self.state = 'running'
+            self.current_stage = stage
+            self.stages[stage]['state'] = 'running'
+            self._stage_started = time.perf_counter()
+
+    def _finish_current_stage(self):
+        if self.current_stage is not None and self.stages[self.current_stage]['state'] == 'running':
+            self.stages[self.current_stage]['state'] = 'done'
+            self.stages[self.current_stage]['seconds'] = round(time.perf_counter() - self._stage_started, 3)
+
+    def _complete(self, result=None, error=None):
+        with self._lock:
+            if error is None:
+                self._finish_current_stage()
+            elif self.current_stage is not None:
+                self.stages[self.current_stage]['state'] = 'failed'
+            self.state = 'failed' if error is not None else 'done'
+            self.current_stage = None
+            self.result = result
+            self.error = error
+            self.finished_at = time.time()
+
+    def to_dict(self):
+        """JSON-friendly status without the result payload."""
+        with self._lock:
+            done = sum(1 for stage in self.stages.values() if stage['state'] == 'done')
+            return {
+                'job_id': self.job_id,
+                'state': self.state,
+                'stage': self.current_stage,
+                'progress': round(done / len(self.stages), 2) if self.stages else 1.0,
+                'stages': {name: dict(stage) for name, stage in self.stages.items()},
+                'error': self.error
+            }
+
+class JobManager:
+    """Runs jobs on a thread pool and keeps recent ones for polling."""
+
+    def __init__(self, max_workers=2, max_jobs=100, ttl_seconds=3600):
+        self.max_jobs = max_jobs
+        self.ttl_seconds = ttl_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='analysis')
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, owner, fn, *args, stages=ANALYSIS_STAGES):
+        """Queue fn(job, *args); its return value becomes the job result."""
+        job = Job(owner, stages)
+        with self._lock:
+            self._prune()
+            self._jobs[job.job_id] = job
+        self._executor.submit(self._run, job, fn, args)
+        return job
+
+    def get(self, job_id, owner):
+        """Return the job, or None if it is unknown or belongs to someone else."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None or job.owner != owner:
+            return None
+        return job
+
+    def _run(self, job, fn, args):
+        try:
+            job._complete(result=fn(job, *args))
+        except Exception as e:
+            logger.exception('analysis job %s failed', job.job_id)
+            job._complete(error=str(e))
+
+    def _prune(self):
+        now = time.time()
+        for job_id, job in list(self._jobs.items()):
+            expired = job.finished_at is not None and now - job.finished_at > self.ttl_seconds
+            if expired or (len(self._jobs) >= self.max_jobs and job.finished_at is not None):
+                del self._jobs[job_id]
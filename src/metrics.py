@@ -0,0 +1,152 @@
+"""Per-stage timing, throughput and memory metrics in Prometheus text format.
+
+Hot paths wrap their work in StageMetrics.stage(); /metrics renders the
+collected histograms with render(). With a logger, every observation is
+also written as one JSON log line.
+"""
+import functools
+import json
+import math
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Content type of the Prometheus text exposition format
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+def peak_rss_bytes():
+    """Highest resident set size of this process so far, or None where it cannot be read."""
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return getattr(psutil.Process().memory_info(), 'peak_wset', None)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+class StageTimer:
+    """Handed out by StageMetrics.stage(); set rows once the row count is known."""
+
+    def __init__(self, rows=None):
+        self.rows = rows
+        self.seconds = None
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.rows = 0
+        self.rows_per_second = None
+        self.peak_rss = None
+
+class StageMetrics:
+    """Thread-safe duration histograms, row counters and peak RSS per pipeline stage."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, logger=None):
+        self.buckets = tuple(buckets)
+        self.logger = logger
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        """Time the enclosed block and record it under name unless it raises."""
+        timer = StageTimer(rows)
+        started = time.perf_counter()
+        yield timer
+        timer.seconds = time.perf_counter() - started
+        self.observe(name, timer.seconds, timer.rows)
+
+    def timed(self, name):
+        """Decorator recording each call under name, counting len() of the first argument as rows."""
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(df, *args, **kwargs):
+                with self.stage(name, len(df)):
+                    return fn(df, *args, **kwargs)
+            return wrapper
+        return decorator
+
+    def observe(self, name, seconds, rows=None):
+        """Record one run of a stage that took seconds and processed rows."""
+        peak_rss = peak_rss_bytes()
+        rows_per_second = rows / seconds if rows is not None and seconds > 0 else None
+        with self._lock:
+            histogram = self._stages.get(name)
+            if histogram is None:
+                histogram = self._stages[name] = _Histogram(self.buckets)
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram.bucket_counts[i] += 1
+            histogram.count += 1
+            histogram.sum += seconds
+            if rows is not None:
+                histogram.rows += rows
+            if rows_per_second is not None:
+                histogram.rows_per_second = rows_per_second
+            histogram.peak_rss = peak_rss
+
+        if self.logger is not None:
+            self.logger.info(json.dumps({
+                'event': 'stage',
+                'stage': name,
+                'seconds': round(seconds, 6),
+                'rows': rows,
+                'rows_per_second': None if rows_per_second is None else round(rows_per_second, 1),
+                'peak_rss_bytes': peak_rss
+            }))
+
+    def snapshot(self):
+        """Per-stage count, total seconds and rows, for tests and debugging."""
+        with self._lock:
+            return {name: {'count': h.count, 'seconds': h.sum, 'rows': h.rows}
+                    for name, h in self._stages.items()}
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = [
+            '# HELP doctor31_stage_duration_seconds Time spent in each pipeline stage.',
+            '# TYPE doctor31_stage_duration_seconds histogram'
+        ]
+        with self._lock:
+            stages = sorted(self._stages.items())
+            for name, h in stages:
+                for bound, count in zip(self.buckets, h.bucket_counts):
+                    lines.append(f'doctor31_stage_duration_seconds_bucket{{stage="{name}",le="{_format(bound)}"}} {count}')
+                lines.append(f'doctor31_stage_duration_seconds_bucket{{stage="{name}",le="+Inf"}} {h.count}')
+                lines.append(f'doctor31_stage_duration_seconds_sum{{stage="{name}"}} {_format(h.sum)}')
+                lines.append(f'doctor31_stage_duration_seconds_count{{stage="{name}"}} {h.count}')
+
+            lines += ['# HELP doctor31_stage_rows_total Rows processed by each pipeline stage.',
+                      '# TYPE doctor31_stage_rows_total counter']
+            lines += [f'doctor31_stage_rows_total{{stage="{name}"}} {h.rows}' for name, h in stages]
+
+            lines += ['# HELP doctor31_stage_rows_per_second Throughput of the most recent run of each stage.',
+                      '# TYPE doctor31_stage_rows_per_second gauge']
+            lines += [f'doctor31_stage_rows_per_second{{stage="{name}"}} {_format(h.rows_per_second)}'
+                      for name, h in stages if h.rows_per_second is not None]
+
+            lines += ['# HELP doctor31_stage_peak_rss_bytes Process peak RSS observed when each stage last finished.',
+                      '# TYPE doctor31_stage_peak_rss_bytes gauge']
+            lines += [f'doctor31_stage_peak_rss_bytes{{stage="{name}"}} {h.peak_rss}'
+                      for name, h in stages if h.peak_rss is not None]
+
+        peak_rss = peak_rss_bytes()
+        if peak_rss is not None:
+            lines += ['# HELP doctor31_process_peak_rss_bytes Peak resident set size of this process.',
+                      '# TYPE doctor31_process_peak_rss_bytes gauge',
+                      f'doctor31_process_peak_rss_bytes {peak_rss}']
+        return '\n'.join(lines) + '\n'
+
+def _format(value):
+    if math.isinf(value):
+        return '+Inf'
+    return repr(float(value))
@@ -0,0 +1,528 @@
+"""Versioned IsolationForest artifacts for Layer 2.
+
+A model bundles the fitted StandardScaler, the IsolationForest, its
+contamination and the feature columns it was trained on. A cohort model
+bundles one such model per cohort (sex x age band), each fitted with the
+contamination of its own rows. Named models are
+trained once on a reference dataset and selected for scoring later batches;
+unnamed fits are cached by data fingerprint so an unchanged dataset is never
+refit.
+
+Command line usage::
+
+    python -m src.model_store train reference.csv --mapping mapping.json --name adults
+    python -m src.model_store list
+    python -m src.model_store select adults-v1
+    python -m src.model_store select --clear
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+
+ARTIFACT_FORMAT_VERSION = 1
+DEFAULT_N_ESTIMATORS = 200
+DEFAULT_RANDOM_STATE = 123
+# Per-user, outside the package, which may be read-only or, in the onefile build, unpacked to a folder removed on exit
+DEFAULT_DATA_DIR = os.path.join(os.path.expanduser('~'), '.doctor31')
+DEFAULT_MODEL_DIR = os.path.join(DEFAULT_DATA_DIR, 'models')
+
+# Cohort models: age band edges in years, and cohorts with fewer complete rows share one 'other' model
+DEFAULT_AGE_BANDS = (18, 65)
+DEFAULT_COHORT_MIN_ROWS = 200
+POOLED_COHORT = 'other'
+
+_MODEL_NAME_PATTERN = re.compile(r'^[A-Za-z0-9_.-]+$')
+
+class Layer2Engine:
+    """How the IsolationForest is fit and scored on the available hardware.
+
+    n_jobs           trees built and rows scored on this many threads (-1: all cores)
+    fit_sample_rows  datasets larger than fit_sample_threshold are fit on a random
+                     sample of this many rows; every row is still scored
+    score_workers    score in chunks of score_chunk_rows on this many processes
+                     once there are at least score_process_threshold rows (1: in-process)
+    cohort_workers   fit and score cohort models on this many processes (1: in-process)
+    """
+
+    def __init__(self, n_jobs=-1, fit_sample_threshold=500_000, fit_sample_rows=200_000,
+                 score_workers=1, score_chunk_rows=250_000, score_process_threshold=1_000_000,
+                 cohort_workers=1):
+        self.n_jobs = n_jobs
+        self.fit_sample_threshold = fit_sample_threshold
+        self.fit_sample_rows = fit_sample_rows
+        self.score_workers = score_workers
+        self.score_chunk_rows = score_chunk_rows
+        self.score_process_threshold = score_process_threshold
+        self.cohort_workers = cohort_workers
+
+    def fit_params(self):
+        """Settings that change the fitted model, used in data fingerprints."""
+        return {
+            'fit_sample_threshold': self.fit_sample_threshold,
+            'fit_sample_rows': self.fit_sample_rows
+        }
+
+DEFAULT_ENGINE = Layer2Engine()
+
+def data_fingerprint(complete_data, contamination, engine=DEFAULT_ENGINE):
+    """Hash the feature values, column names and fit parameters of a dataset."""
+    digest = hashlib.sha256()
+    digest.update(json.dumps({
+        'features': list(complete_data.columns),
+        'contamination': round(float(contamination), 6),
+        'n_estimators': DEFAULT_N_ESTIMATORS,
+        'random_state': DEFAULT_RANDOM_STATE,
+        **engine.fit_params()
+    }, sort_keys=True).encode())
+    digest.update(pd.util.hash_pandas_object(complete_data, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+def preload():
+    """Import scikit-learn and joblib now rather than on the first fit or model load."""
+    import joblib
+    import sklearn.ensemble
+    import sklearn.preprocessing
+
+def fit_model(complete_data, contamination, engine=DEFAULT_ENGINE, return_scores=False):
+    """Fit the scaler and IsolationForest on complete rows and return an artifact dict.
+
+    With return_scores, return (artifact, decision_function of every row), reusing
+    the scores that place the threshold; the scores are None when a sample was fit.
+    """
+    # scikit-learn and joblib take most of the startup time, so they load on first use
+    import sklearn
+    from joblib import parallel_backend
+    from sklearn.ensemble import IsolationForest
+    from sklearn.preprocessing import StandardScaler
+
+    timings = {}
+    started = time.perf_counter()
+    fit_data = complete_data
+    if len(complete_data) > engine.fit_sample_threshold:
+        rng = np.random.default_rng(DEFAULT_RANDOM_STATE)
+        sample = np.sort(rng.choice(len(complete_data), size=engine.fit_sample_rows, replace=False))
+        fit_data = complete_data.iloc[sample]
+    timings['sample'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    scaler = StandardScaler()
+    x_scaled = scaler.fit_transform(fit_data)
+    timings['scale'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    isolation_forest = IsolationForest(
+        contamination='auto',
+        random_state=DEFAULT_RANDOM_STATE,
+        n_estimators=DEFAULT_N_ESTIMATORS,
+        n_jobs=engine.n_jobs
+    )
+    with parallel_backend('threading', n_jobs=engine.n_jobs):
+        isolation_forest.fit(x_scaled)
+        # Place offset_ as fit() does for a numeric contamination, keeping the training scores
+        train_scores = isolation_forest.score_samples(x_scaled)
+    isolation_forest.set_params(contamination=contamination)
+    isolation_forest.offset_ = np.percentile(train_scores, 100.0 * contamination)
+    timings['fit'] = time.perf_counter() - started
+
+    model = {
+        'format_version': ARTIFACT_FORMAT_VERSION,
+        'features': list(complete_data.columns),
+        'contamination': contamination,
+        'n_samples': int(len(complete_data)),
+        'fit_rows': int(len(fit_data)),
+        'sklearn_version': sklearn.__version__,
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'fit_timings': {stage: round(seconds, 4) for stage, seconds in timings.items()},
+        'scaler': scaler,
+        'forest': isolation_forest
+    }
+    if not return_scores:
+        return model
+    return model, (train_scores - isolation_forest.offset_ if fit_data is complete_data else None)
+
+def score_model(model, complete_data, engine=DEFAULT_ENGINE):
+    """Score complete rows with a fitted artifact without refitting it."""
+    from joblib import parallel_backend
+
+    missing = [col for col in model['features'] if col not in complete_data.columns]
+    if missing:
+        raise ValueError(f"Model was trained on {model['features']} but the data is missing {missing}")
+
+    started = time.perf_counter()
+    x_scaled = model['scaler'].transform(complete_data[model['features']])
+    transform_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    if engine.score_workers > 1 and len(x_scaled) >= engine.score_process_threshold:
+        scores = _score_in_processes(model['forest'], x_scaled, engine)
+    else:
+        with parallel_backend('threading', n_jobs=engine.n_jobs):
+            scores = model['forest'].decision_function(x_scaled)
+    score_seconds = time.perf_counter() - started
+
+    # Same rule as IsolationForest.predict, without a second pass over the forest
+    predictions = np.where(scores < 0, -1, 1)
+    return {
+        'predictions': predictions,
+        'scores': scores,
+        'contamination': model['contamination'],
+        'timings': {'transform': round(transform_seconds, 4), 'score': round(score_seconds, 4)}
+    }
+
+_worker_forest = None
+
+def _init_score_worker(forest):
+    global _worker_forest
+    _worker_forest = forest
+    # Each process already owns a core; avoid nested thread pools
+    _worker_forest.set_params(n_jobs=1)
+
+def _score_chunk(x_chunk):
+    return _worker_forest.decision_function(x_chunk)
+
+def _score_in_processes(forest, x_scaled, engine):
+    """decision_function over row chunks on a process pool; the forest is sent once per worker."""
+    chunks = [x_scaled[start:start + engine.score_chunk_rows]
+              for start in range(0, len(x_scaled), engine.score_chunk_rows)]
+    # spawn, because the web server forks from a multi-threaded process
+    with ProcessPoolExecutor(max_workers=engine.score_workers,
+                             mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_score_worker, initargs=(forest,)) as pool:
+        return np.concatenate(list(pool.map(_score_chunk, chunks)))
+
+def layer1_contamination(invalid):
+    """Expected anomaly ratio from the rows Layer 1 did not mark Valid, kept within [0.01, 0.5]."""
+    invalid_ratio = np.count_nonzero(invalid) / len(invalid)
+    return max(0.01, min(0.5, invalid_ratio))
+
+def cohort_labels(age, sex=None, age_bands=DEFAULT_AGE_BANDS):
+    """Cohort of each row, e.g. 'F 18-64', or only the age band without sex."""
+    age = np.asarray(age, dtype=np.float64)
+    band = np.searchsorted(np.asarray(age_bands, dtype=np.float64), age, side='right')
+    names = np.asarray(_band_names(age_bands) + ['?'], dtype=object)
+    # NaN sorts past every edge, so give missing ages their own band
+    band[np.isnan(age)] = len(names) - 1
+    labels = pd.Series(names[band])
+    if sex is None:
+        return labels.to_numpy()
+    sex = pd.Series(np.asarray(sex, dtype=object)).astype('string').str.strip().str.upper().fillna('?')
+    return (sex + ' ' + labels).to_numpy(dtype=object)
+
+def _band_names(age_bands):
+    edges = [f'{edge:g}' for edge in age_bands]
+    if not edges:
+        return ['all']
+    return ([f'<{edges[0]}'] + [f'{low}-{float(high) - 1:g}' for low, high in zip(edges, age_bands[1:])]
+            + [f'{edges[-1]}+'])
+
+def cohort_partitions(labels, invalid, fit_rows, min_rows=DEFAULT_COHORT_MIN_ROWS):
+    """Cohort name -> (positions fitted on, contamination) for rows labelled with a cohort.
+
+    Only fit_rows are fitted on, and each cohort's contamination comes from its
+    own Layer 1 results. Cohorts with fewer than min_rows fitted rows are pooled
+    into one model named POOLED_COHORT.
+    """
+    fit_positions = np.flatnonzero(fit_rows)
+    groups = pd.Series(fit_positions).groupby(labels[fit_positions], sort=True).indices
+    partitions, pooled = {}, []
+    for name, members in groups.items():
+        positions = fit_positions[members]
+        if len(positions) < min_rows:
+            pooled.append(positions)
+        else:
+            partitions[name] = positions
+    if pooled:
+        partitions[POOLED_COHORT] = np.sort(np.concatenate(pooled))
+    return {name: (positions, layer1_contamination(invalid[positions]))
+            for name, positions in partitions.items() if len(positions) >= 2}
+
+def cohort_fingerprint(complete_data, partitions, age_bands, by_sex, engine=DEFAULT_ENGINE):
+    """Hash of every cohort's data and fit settings, to cache a cohort model by."""
+    digest = hashlib.sha256(json.dumps({'age_bands': list(age_bands), 'by_sex': by_sex}).encode())
+    for name, (positions, contamination) in partitions.items():
+        digest.update(name.encode())
+        digest.update(data_fingerprint(complete_data.iloc[positions], contamination, engine).encode())
+    return digest.hexdigest()
+
+def fit_cohort_model(complete_data, labels, partitions, age_bands, by_sex, engine=DEFAULT_ENGINE):
+    """Fit one model per cohort and score its rows, on engine.cohort_workers processes.
+
+    Returns the cohort model and the results of scoring every row, as score_model does.
+    """
+    import sklearn
+
+    started = time.perf_counter()
+    assignment = _cohort_assignment(labels, partitions)
+    rest = {}
+    for name, (positions, _) in partitions.items():
+        # Rows fit on are scored during the fit; only the cohort's other rows need a second pass
+        others = assignment == name
+        others[positions] = False
+        rest[name] = others
+    tasks = [(complete_data.iloc[positions], complete_data[rest[name]], contamination)
+             for name, (positions, contamination) in partitions.items()]
+    if engine.cohort_workers > 1 and len(tasks) > 1:
+        # spawn, because the web server forks from a multi-threaded process
+        with ProcessPoolExecutor(max_workers=min(engine.cohort_workers, len(tasks)),
+                                 mp_context=multiprocessing.get_context('spawn')) as pool:
+            fitted = list(pool.map(_fit_and_score_cohort, tasks, [_single_process(engine)] * len(tasks)))
+    else:
+        fitted = [_fit_and_score_cohort(task, engine) for task in tasks]
+
+    scores = np.full(len(complete_data), np.nan)
+    cohorts = {}
+    for name, (model, fit_scores, rest_scores) in zip(partitions, fitted):
+        scores[partitions[name][0]] = fit_scores
+        scores[rest[name]] = rest_scores
+        cohorts[name] = model
+    seconds = time.perf_counter() - started
+    bundle = {
+        'format_version': ARTIFACT_FORMAT_VERSION,
+        'features': list(complete_data.columns),
+        'contamination': {name: model['contamination'] for name, model in cohorts.items()},
+        'n_samples': int(sum(model['n_samples'] for model in cohorts.values())),
+        'fit_rows': int(sum(model['fit_rows'] for model in cohorts.values())),
+        'sklearn_version': sklearn.__version__,
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'fit_timings': {'cohorts': round(seconds, 4)},
+        'age_bands': list(age_bands),
+        'by_sex': by_sex,
+        'cohorts': cohorts
+    }
+    return bundle, _cohort_results(scores, assignment, cohorts, {'cohorts': round(seconds, 4)})
+
+def _fit_and_score_cohort(task, engine):
+    fit_data, rest_data, contamination = task
+    model, fit_scores = fit_model(fit_data, contamination, engine, return_scores=True)
+    if fit_scores is None:
+        fit_scores = score_model(model, fit_data, engine)['scores']
+    rest_scores = score_model(model, rest_data, engine)['scores'] if len(rest_data) else np.empty(0)
+    return model, fit_scores, rest_scores
+
+def _single_process(engine):
+    """A copy of engine for a pool worker, which already owns a core."""
+    return Layer2Engine(n_jobs=1, fit_sample_threshold=engine.fit_sample_threshold,
+                        fit_sample_rows=engine.fit_sample_rows)
+
+def _cohort_assignment(labels, cohorts):
+    """The model name scoring each row: its cohort, else the pooled model, else None."""
+    assignment = np.asarray(labels, dtype=object).copy()
+    unknown = ~pd.Series(assignment).isin(list(cohorts)).to_numpy()
+    assignment[unknown] = POOLED_COHORT if POOLED_COHORT in cohorts else None
+    return assignment
+
+def score_cohort_model(bundle, complete_data, labels, engine=DEFAULT_ENGINE):
+    """Score rows with the model of their cohort; rows of cohorts it has no model for stay NaN."""
+    started = time.perf_counter()
+    assignment = _cohort_assignment(labels, bundle['cohorts'])
+    scores = np.full(len(complete_data), np.nan)
+    for name, model in bundle['cohorts'].items():
+        rows = assignment == name
+        if rows.any():
+            scores[rows] = score_model(model, complete_data[rows], engine)['scores']
+    return _cohort_results(scores, assignment, bundle['cohorts'], {'score': round(time.perf_counter() - started, 4)})
+
+def _cohort_results(scores, assignment, cohorts, timings):
+    return {
+        'predictions': np.where(np.isnan(scores), np.nan, np.where(scores < 0, -1, 1)),
+        'scores': scores,
+        'timings': timings,
+        'cohorts': {name: {'rows': int(np.count_nonzero(assignment == name)),
+                           'contamination': model['contamination']}
+                    for name, model in cohorts.items()}
+    }
+
+def model_metadata(model):
+    """The JSON-serialisable part of an artifact."""
+    metadata = {key: value for key, value in model.items() if key not in ('scaler', 'forest', 'cohorts')}
+    if 'cohorts' in model:
+        metadata['cohorts'] = {name: model_metadata(cohort) for name, cohort in model['cohorts'].items()}
+    return metadata
+
+class ModelStore:
+    """On-disk registry of named models plus a fingerprint-keyed fit cache."""
+
+    def __init__(self, root_dir, max_cached_fits=32, max_loaded=8):
+        self.root_dir = root_dir
+        self.max_cached_fits = max_cached_fits
+        self.max_loaded = max_loaded
+        self._loaded = OrderedDict()
+        self._lock = threading.RLock()
+
+    @property
+    def _models_dir(self):
+        return os.path.join(self.root_dir, 'models')
+
+    @property
+    def _cache_dir(self):
+        return os.path.join(self.root_dir, 'cache')
+
+    def save_model(self, name, model, fingerprint=None):
+        """Persist a trained artifact under the next version of name and return its id."""
+        import joblib
+
+        if not _MODEL_NAME_PATTERN.match(name):
+            raise ValueError(f"Invalid model name: {name!r}")
+        os.makedirs(self._models_dir, exist_ok=True)
+
+        with self._lock:
+            versions = [meta['version'] for meta in self.list_models() if meta['name'] == name]
+            version = max(versions, default=0) + 1
+            model = dict(model, name=name, version=version, model_id=f"{name}-v{version}",
+                         fingerprint=fingerprint)
+            base_path = os.path.join(self._models_dir, model['model_id'])
+            joblib.dump(model, base_path + '.joblib')
+            with open(base_path + '.json', 'w', encoding='utf-8') as f:
+                json.dump(model_metadata(model), f, indent=2)
+            return model['model_id']
+
+    def list_models(self):
+        """Metadata of every named model, oldest first."""
+        if not os.path.isdir(self._models_dir):
+            return []
+        models = []
+        for filename in sorted(os.listdir(self._models_dir)):
+            if filename.endswith('.json'):
+                with open(os.path.join(self._models_dir, filename), encoding='utf-8') as f:
+                    models.append(json.load(f))
+        return sorted(models, key=lambda meta: (meta['name'], meta['version']))
+
+    def load_model(self, model_id):
+        """Load a named model, keeping recently used ones in memory."""
+        if not _MODEL_NAME_PATTERN.match(model_id or ''):
+            raise ValueError(f"Invalid model id: {model_id!r}")
+        path = os.path.join(self._models_dir, model_id + '.joblib')
+        if not os.path.exists(path):
+            raise KeyError(f"Unknown model: {model_id}")
+        return self._load(('model', model_id), path)
+
+    def select_model(self, model_id):
+        """Make model_id the model used to score new batches (None to fit per dataset)."""
+        if model_id is not None:
+            self.load_model(model_id)
+        os.makedirs(self.root_dir, exist_ok=True)
+        with open(os.path.join(self.root_dir, 'active.json'), 'w', encoding='utf-8') as f:
+            json.dump({'model_id': model_id}, f)
+
+    def active_model_id(self):
+        """The selected model id, or None when every dataset gets its own fit."""
+        try:
+            with open(os.path.join(self.root_dir, 'active.json'), encoding='utf-8') as f:
+                return json.load(f).get('model_id')
+        except (OSError, ValueError):
+            return None
+
+    def active_model(self):
+        """The selected model artifact, or None."""
+        model_id = self.active_model_id()
+        return self.load_model(model_id) if model_id else None
+
+    def cached_fit(self, fingerprint):
+        """Return a previous fit of identical data, or None."""
+        path = os.path.join(self._cache_dir, fingerprint + '.joblib')
+        if not os.path.exists(path):
+            return None
+        os.utime(path)
+        return self._load(('cache', fingerprint), path)
+
+    def cache_fit(self, fingerprint, model):
+        """Remember a fit by data fingerprint, pruning the oldest cached fits."""
+        import joblib
+
+        os.makedirs(self._cache_dir, exist_ok=True)
+        with self._lock:
+            joblib.dump(dict(model, fingerprint=fingerprint),
+                        os.path.join(self._cache_dir, fingerprint + '.joblib'))
+            self._remember(('cache', fingerprint), model)
+            self._prune_cache()
+
+    def _load(self, key, path):
+        import joblib
+
+        with self._lock:
+            if key in self._loaded:
+                self._loaded.move_to_end(key)
+                return self._loaded[key]
+            model = joblib.load(path)
+            if model.get('format_version') != ARTIFACT_FORMAT_VERSION:
+                raise ValueError(f"Unsupported model artifact version in {path}")
+            self._remember(key, model)
+            return model
+
+    def _remember(self, key, model):
+        self._loaded[key] = model
+        self._loaded.move_to_end(key)
+        while len(self._loaded) > self.max_loaded:
+            self._loaded.popitem(last=False)
+
+    def _prune_cache(self):
+        paths = [os.path.join(self._cache_dir, name) for name in os.listdir(self._cache_dir)
+                 if name.endswith('.joblib')]
+        paths.sort(key=os.path.getmtime, reverse=True)
+        for path in paths[self.max_cached_fits:]:
+            os.remove(path)
+
+def main(argv=None):
+    """Command line interface to train, list and select Layer 2 models."""
+    parser = argparse.ArgumentParser(prog='python -m src.model_store', description=main.__doc__)
+    parser.add_argument('--model-dir', default=os.environ.get('DOCTOR31_MODEL_DIR', DEFAULT_MODEL_DIR))
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    train = commands.add_parser('train', help='train a model on a reference CSV file')
+    train.add_argument('csv_path')
+    train.add_argument('--name', required=True)
+    train.add_argument('--mapping', help='JSON file mapping fields to CSV columns')
+    train.add_argument('--select', action='store_true', help='use the new model for scoring')
+
+    commands.add_parser('list', help='list trained models')
+
+    select = commands.add_parser('select', help='select the model used to score new batches')
+    select.add_argument('model_id', nargs='?')
+    select.add_argument('--clear', action='store_true', help='fit each dataset separately again')
+
+    args = parser.parse_args(argv)
+    store = ModelStore(args.model_dir)
+
+    if args.command == 'train':
+        # Imported here because web_gui itself depends on this module
+        from src.web_gui import DEFAULT_COLUMN_MAPPING, train_reference_model
+        mappings = DEFAULT_COLUMN_MAPPING
+        if args.mapping:
+            with open(args.mapping, encoding='utf-8') as f:
+                mappings = json.load(f)
+        model = train_reference_model(pd.read_csv(args.csv_path), mappings)
+        model_id = store.save_model(args.name, model)
+        if args.select:
+            store.select_model(model_id)
+        print(model_id)
+    elif args.command == 'list':
+        active = store.active_model_id()
+        for meta in store.list_models():
+            marker = '*' if meta['model_id'] == active else ' '
+            contamination = meta['contamination']
+            if isinstance(contamination, dict):
+                contamination = ','.join(f'{name}:{value:.4f}' for name, value in contamination.items())
+            else:
+                contamination = f'{contamination:.4f}'
+            print(f"{marker} {meta['model_id']}  rows={meta['n_samples']}  "
+                  f"contamination={contamination}  features={','.join(meta['features'])}  "
+                  f"created={meta['created_at']}")
+    elif args.command == 'select':
+        if args.clear == (args.model_id is not None):
+            parser.error('give either a model id or --clear')
+        store.select_model(None if args.clear else args.model_id)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""Content-addressed on-disk cache of parsed uploads and finished analyses.
+
+Entries are keyed by SHA-256 digests built from the uploaded bytes plus
+whatever else shapes the result (column mapping, validation and model
+settings), so a repeat of the same file and mapping is served from disk
+instead of being parsed, cleaned and fitted again. Each entry is a
+directory of frames and a meta.json; once the cache outgrows max_bytes the
+least recently used entries are removed.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from src.dataset_store import read_frame, write_frame
+
+_HASH_CHUNK_BYTES = 1024 * 1024
+
+def cache_key(*parts):
+    """SHA-256 of JSON-serialisable parts, used as an entry name."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+def stream_digest(stream):
+    """SHA-256 of a seekable stream's contents; the stream is rewound afterwards."""
+    digest = hashlib.sha256()
+    for block in iter(lambda: stream.read(_HASH_CHUNK_BYTES), b''):
+        digest.update(block)
+    stream.seek(0)
+    return digest.hexdigest()
+
+def file_digest(path):
+    """SHA-256 of a file's contents."""
+    with open(path, 'rb') as f:
+        return stream_digest(f)
+
+def copy_with_digest(stream, path):
+    """Write a stream to path and return the SHA-256 of what was written, in one pass."""
+    digest = hashlib.sha256()
+    with open(path, 'wb') as f:
+        for block in iter(lambda: stream.read(_HASH_CHUNK_BYTES), b''):
+            digest.update(block)
+            f.write(block)
+    return digest.hexdigest()
+
+class ResultCache:
+    """Directory of cached frames with size-bounded LRU eviction.
+
+    Entries are written to a temporary directory and renamed into place, so
+    several threads or worker processes can share root_dir.
+    """
+
+    def __init__(self, root_dir, max_bytes, frame_format='parquet'):
+        self.root_dir = root_dir
+        self.max_bytes = max_bytes
+        self.frame_format = frame_format
+        self._lock = threading.Lock()
+        os.makedirs(root_dir, exist_ok=True)
+
+    def get(self, key):
+        """Return (frames, meta) stored under key, or None."""
+        entry_dir = os.path.join(self.root_dir, key)
+        try:
+            with open(os.path.join(entry_dir, 'meta.json'), encoding='utf-8') as f:
+                meta = json.load(f)
+            frames = {name: read_frame(os.path.join(entry_dir, name), fmt)
+                      for name, fmt in meta['frames'].items()}
+        except (OSError, ValueError, KeyError):
+            # Missing, or evicted by another process while being read
+            return None
+        # The meta.json mtime is the entry's last use for LRU eviction
+        os.utime(os.path.join(entry_dir, 'meta.json'))
+        return frames, meta['meta']
+
+    def put(self, key, frames, meta=None):
+        """Store frames (name -> DataFrame) and JSON-serialisable meta under key.
+
+        A write that fails on disk, e.g. when it is full, leaves the cache unchanged.
+        """
+        tmp_dir = tempfile.mkdtemp(prefix=f'.{key}-{uuid.uuid4().hex[:8]}-', dir=self.root_dir)
+        try:
+            formats = {name: write_frame(frame, os.path.join(tmp_dir, name), self.frame_format)
+                       for name, frame in frames.items()}
+            with open(os.path.join(tmp_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+                json.dump({'frames': formats, 'meta': meta or {}}, f)
+            try:
+                os.rename(tmp_dir, os.path.join(self.root_dir, key))
+            except OSError:
+                # Another request stored the same key first; its entry is identical
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        self._prune()
+
+    def __contains__(self, key):
+        return os.path.exists(os.path.join(self.root_dir, key, 'meta.json'))
+
+    def total_bytes(self):
+        """Disk space used by all entries."""
+        return sum(size for _, _, size in self._entries())
+
+    def _entries(self):
+        """(last used, path, bytes) of every complete entry."""
+        entries = []
+        for name in os.listdir(self.root_dir):
+            path = os.path.join(self.root_dir, name)
+            if name.startswith('.') or not os.path.isdir(path):
+                continue
+            try:
+                size = sum(os.path.getsize(os.path.join(path, filename)) for filename in os.listdir(path))
+                entries.append((os.path.getmtime(os.path.join(path, 'meta.json')), path, size))
+            except OSError:
+                continue
+        return entries
+
+    def _prune(self):
+        with self._lock:
+            entries = sorted(self._entries(), reverse=True)
+            total = sum(size for _, _, size in entries)
+            # Always keep the newest entry, even if it alone exceeds the budget
+            while len(entries) > 1 and total > self.max_bytes:
+                _, path, size = entries.pop()
+                shutil.rmtree(path, ignore_errors=True)
+                total -= size
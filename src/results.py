@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+
+STATUSES = ('Valid', 'Anomaly', 'Warning')
+
+def filter_positions(df, statuses=None):
+    """Row positions whose status is in statuses (all rows when statuses is empty)."""
+    if not statuses:
+        return np.arange(len(df))
+    return np.flatnonzero(df['status'].isin(statuses).to_numpy())
+
+def page_positions(df, positions, offset, limit, sort_by=None, descending=False):
+    """Row positions of one page, ordered by sort_by with missing values last.
+
+    Only the first offset + limit rows are ordered: argpartition selects
+    them in linear time, so early pages of a large result stay cheap.
+    """
+    if sort_by is None:
+        return positions[offset:offset + limit]
+
+    column = df[sort_by]
+    if column.dtype.kind == 'M':
+        # Sort dates by their timestamp, with NaT treated like any missing value
+        values = np.where(column.isna(), np.nan, column.to_numpy().view('int64').astype(np.float64))
+    else:
+        values = pd.to_numeric(column, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+    keys = values[positions]
+    if descending:
+        keys = -keys  # NaN stays NaN, so missing values still sort last
+
+    end = min(offset + limit, len(keys))
+    if end <= offset:
+        return positions[:0]
+    candidates = np.arange(len(keys))
+    if end < len(keys):
+        threshold = keys[np.argpartition(keys, end - 1)[end - 1]]
+        if not np.isnan(threshold):
+            # Keep every row tied with the cut-off so page boundaries do not depend on partition order
+            candidates = np.flatnonzero(keys <= threshold)
+    # Ties are broken by original row order so pages are stable across requests
+    ordered = candidates[np.lexsort((candidates, keys[candidates]))]
+    return positions[ordered[offset:end]]
+
+def select_page(df, offset=0, limit=100, statuses=None, sort_by=None, descending=False):
+    """Return (page frame, total matching rows) without touching rows outside the page."""
+    positions = filter_positions(df, statuses)
+    page = page_positions(df, positions, offset, limit, sort_by, descending)
+    return df.iloc[page], len(positions)
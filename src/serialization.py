@@ -0,0 +1,93 @@
+"""JSON encoding of result payloads straight from column arrays.
+
+Frames are encoded column by column instead of through to_dict('records'):
+numeric columns are handed to orjson as NumPy arrays (NaN becomes null) and
+only text columns are turned into Python lists. Rows are sent either as
+records, [{"col": value, ...}, ...], or in the compact columnar layout
+{"columns": [...], "data": [[...], ...]} with one array per column.
+Without orjson the standard json module is used.
+"""
+import json
+import numpy as np
+import pandas as pd
+from src.export import format_dates, with_colors
+from src.validation import round_bmi
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+PAYLOAD_LAYOUTS = ('records', 'columns')
+
+def prepare_frame(df):
+    """Apply the display rules shared by every layout: BMI rounding, date text and status colors."""
+    if 'bmi_calculated' in df.columns:
+        df = df.assign(bmi_calculated=round_bmi(df['bmi_calculated']))
+    return format_dates(with_colors(df))
+
+def column_values(column, as_array=False):
+    """JSON-ready values of one column, with None for missing values.
+
+    With as_array and orjson available, numeric columns stay NumPy arrays.
+    """
+    dtype = column.dtype
+    if isinstance(dtype, np.dtype) and dtype.kind in 'iubf':
+        values = column.to_numpy()
+        if as_array and orjson is not None:
+            # orjson writes NaN as null and float32 in its shortest form
+            return values
+        if dtype.kind != 'f':
+            return values.tolist()
+        if dtype == np.float32:
+            # Widen to the shortest decimal so 70.1 is not sent as 70.09999847
+            values = widen_float32(values)
+        missing = np.isnan(values)
+        if not missing.any():
+            return values.tolist()
+        values = values.astype(object)
+        values[missing] = None
+        return values.tolist()
+    return column.to_numpy(dtype=object, na_value=None).tolist()
+
+def widen_float32(values):
+    """float64 copy of a float32 array holding each value's shortest round-tripping decimal, as orjson writes it."""
+    wide = values.astype(np.float64)
+    pending = np.flatnonzero(np.isfinite(wide) & (wide != 0))
+    exponent = np.floor(np.log10(np.abs(wide[pending])))
+    # A float32 needs 6 to 9 significant digits to be read back unchanged
+    for digits in range(6, 10):
+        shift = digits - 1 - exponent
+        up, down = 10.0 ** np.maximum(shift, 0), 10.0 ** np.maximum(-shift, 0)
+        rounded = np.round(wide[pending] * up / down) * down / up
+        exact = rounded.astype(np.float32) == values[pending]
+        wide[pending[exact]] = rounded[exact]
+        pending, exponent = pending[~exact], exponent[~exact]
+        if not len(pending):
+            break
+    return wide
+
+def encode_frame(df, layout='records'):
+    """A frame as JSON-ready records or columnar data, ready for dumps()."""
+    df = prepare_frame(df)
+    columns = [str(col) for col in df.columns]
+    if layout == 'columns':
+        return {'columns': columns, 'data': [column_values(df.iloc[:, i], as_array=True)
+                                             for i in range(len(columns))]}
+    values = [column_values(df.iloc[:, i]) for i in range(len(columns))]
+    return [dict(zip(columns, row)) for row in zip(*values)]
+
+def dumps(payload, layout='records'):
+    """Serialize a payload to JSON bytes, encoding any DataFrame values with encode_frame."""
+    payload = {key: encode_frame(value, layout) if isinstance(value, pd.DataFrame) else value
+               for key, value in payload.items()}
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(payload, default=_json_default).encode()
+
+def _json_default(value):
+    if isinstance(value, np.ndarray):
+        return column_values(pd.Series(value))
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
@@ -0,0 +1,120 @@
+"""Production serving of the web app under gunicorn or waitress.
+
+main.py and ``python src/web_gui.py`` run Flask's development server for a
+single local user. This module serves the same app on a fixed host and port
+from config, with a pool of worker threads (and, under gunicorn, worker
+processes), keep-alive and request timeouts. gunicorn is used where it is
+available (Linux, macOS), waitress elsewhere, e.g. on Windows.
+
+Command line usage::
+
+    python -m src.server                               # DOCTOR31_HOST:DOCTOR31_PORT, default 0.0.0.0:4000
+    python -m src.server --workers 4 --threads 8       # gunicorn: 4 processes x 8 threads
+    python -m src.server --server waitress --threads 16
+"""
+import argparse
+import importlib.util
+import os
+import sys
+from src.web_gui import app, prewarm
+
+SERVERS = ('gunicorn', 'waitress')
+
+# waitress reads at most this much of a request body unless told otherwise
+_UNLIMITED_BODY_BYTES = 2 ** 63 - 1
+
+def choose_server(name='auto'):
+    """The server to run: name itself, or for 'auto' gunicorn where it works and waitress otherwise."""
+    if name != 'auto':
+        if name not in SERVERS:
+            raise ValueError(f"Unknown server {name!r}; use one of {['auto', *SERVERS]}")
+        return name
+    # gunicorn needs fork() and so does not run on Windows
+    if os.name != 'nt' and importlib.util.find_spec('gunicorn') is not None:
+        return 'gunicorn'
+    if importlib.util.find_spec('waitress') is not None:
+        return 'waitress'
+    raise RuntimeError('Install gunicorn or waitress to run the production server')
+
+def gunicorn_options(host, port, workers, threads, keepalive, timeout):
+    """gunicorn settings: gthread workers, each pre-warming Layer 2 once it has started."""
+    return {
+        'bind': f'{host}:{port}',
+        'workers': workers,
+        'worker_class': 'gthread',
+        'threads': threads,
+        'keepalive': keepalive,
+        'timeout': timeout,
+        'post_worker_init': _prewarm_worker
+    }
+
+def _prewarm_worker(worker):
+    if app.config['PREWARM']:
+        prewarm()
+
+def waitress_options(host, port, threads, timeout):
+    """waitress settings; its request body cap follows MAX_CONTENT_LENGTH."""
+    return {
+        'host': host,
+        'port': port,
+        'threads': threads,
+        # waitress closes connections idle for channel_timeout; it has no separate keep-alive setting
+        'channel_timeout': timeout,
+        'max_request_body_size': app.config['MAX_CONTENT_LENGTH'] or _UNLIMITED_BODY_BYTES,
+        'ident': 'doctor31'
+    }
+
+def run_gunicorn(options):
+    from gunicorn.app.base import BaseApplication
+
+    class Application(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return app
+
+    Application().run()
+
+def create_waitress_server(options):
+    from waitress import create_server
+    return create_server(app, **options)
+
+def main(argv=None):
+    """Serve the web app with a production WSGI server."""
+    parser = argparse.ArgumentParser(prog='python -m src.server', description=main.__doc__)
+    parser.add_argument('--server', default=app.config['SERVER'], choices=['auto', *SERVERS])
+    parser.add_argument('--host', default=app.config['SERVER_HOST'])
+    parser.add_argument('--port', type=int, default=app.config['SERVER_PORT'])
+    parser.add_argument('--workers', type=int, default=app.config['SERVER_WORKERS'],
+                        help='worker processes (gunicorn only)')
+    parser.add_argument('--threads', type=int, default=app.config['SERVER_THREADS'],
+                        help='request threads per worker')
+    parser.add_argument('--keepalive', type=int, default=app.config['SERVER_KEEPALIVE'],
+                        help='seconds an idle keep-alive connection is held open (gunicorn only)')
+    parser.add_argument('--timeout', type=int, default=app.config['SERVER_TIMEOUT'],
+                        help='seconds a request may take before its worker is restarted')
+    args = parser.parse_args(argv)
+
+    server = choose_server(args.server)
+    if args.workers > 1:
+        if server == 'waitress':
+            print('warning: waitress runs a single process; --workers is ignored', file=sys.stderr)
+        elif not app.config['DATASET_SPILL_DIR']:
+            print('warning: set DOCTOR31_SPILL_DIR so every worker can load every session', file=sys.stderr)
+    workers = args.workers if server == 'gunicorn' else 1
+    print(f"Serving Doctor31 on http://{args.host}:{args.port} with {server} "
+          f"({workers} x {args.threads} threads)")
+
+    if server == 'gunicorn':
+        run_gunicorn(gunicorn_options(args.host, args.port, args.workers, args.threads,
+                                      args.keepalive, args.timeout))
+    else:
+        if app.config['PREWARM']:
+            prewarm()
+        create_waitress_server(waitress_options(args.host, args.port, args.threads, args.timeout)).run()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
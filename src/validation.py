@@ -1,12 +1,58 @@
+import hashlib
+import json
+import operator
+import os
+import threading
+import numpy as np
 import pandas as pd
 
+STATUS_COLORS = {
+    "Anomaly": "red",
+    "Warning": "orange",
+    "Valid": "green"
+}
+
+# Statuses are stored as this categorical, one int8 code per row; colors are looked up at render time
+STATUS_DTYPE = pd.CategoricalDtype(['Valid', 'Anomaly', 'Warning'])
+
+# Built-in rule sets, selected by name; any other value of DOCTOR31_RULES is a file path
+RULES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rules')
+DEFAULT_RULE_SET = 'adult'
+
+# Measurements a rule can test, and the comparisons it can make against a threshold
+RULE_FIELDS = ('bmi', 'age', 'height', 'weight')
+RULE_COMPARISONS = {'lt': ('<', operator.lt), 'le': ('<=', operator.le),
+                    'gt': ('>', operator.gt), 'ge': ('>=', operator.ge)}
+
+# Rules of a more severe status are checked first
+RULE_STATUSES = ('Anomaly', 'Warning')
+
+# numexpr only pays for its thread start-up on columns at least this long
+NUMEXPR_MIN_ROWS = 100_000
+
 def bmi_calculated(weight, height):
     if (pd.isnull(weight) or pd.isnull(height) or
         height <= 0 or weight < 0):
         return None
     return weight / ((height / 100) ** 2)
 
+def bmi_calculated_array(weight, height, decimals=2):
+    """Columnar bmi_calculated: NaN where inputs are null, height <= 0 or weight < 0."""
+    weight, height = np.broadcast_arrays(_as_float_array(weight), _as_float_array(height))
+    valid = ~np.isnan(weight) & ~np.isnan(height) & (height > 0) & (weight >= 0)
+
+    bmi = np.full(weight.shape, np.nan)
+    np.divide(weight, (height / 100) ** 2, out=bmi, where=valid)
+    if decimals is not None:
+        bmi = round_bmi(bmi, decimals)
+    return bmi
+
+def round_bmi(values, decimals=2):
+    """Round a BMI column in one array operation, keeping NaN for missing values."""
+    return np.round(_as_float_array(values), decimals)
+
 def validate_row(bmi, age, height, weight):
+    # Scalar reference for the built-in adult rule set (src/rules/adult.json)
     # Anomaly conditions (critical safety boundaries)
     anomaly_conditions = [
         pd.isnull(bmi) or bmi < 12 or bmi > 60,
@@ -28,3 +74,204 @@ def validate_row(bmi, age, height, weight):
         return "Warning", "orange"
 
     return "Valid", "green"
+
+def _as_float_array(values):
+    """Convert a scalar, list or Series to a float64 array with NaN for nulls."""
+    values = np.atleast_1d(np.asarray(values))
+    if values.dtype.kind in 'biuf':
+        return values.astype(np.float64, copy=False)
+    return pd.to_numeric(pd.Series(values), errors='coerce').to_numpy(
+        dtype=np.float64, na_value=np.nan)
+
+def status_colors(status):
+    """STATUS_COLORS of a status column, looked up by category code; None where status is missing."""
+    codes = pd.Categorical(status, dtype=STATUS_DTYPE).codes
+    colors = np.array([STATUS_COLORS[name] for name in STATUS_DTYPE.categories] + [None], dtype=object)
+    return colors[codes]
+
+def validate_rows(bmi, age, height, weight, rule_set=None):
+    """Columnar validate_row: return (status, color) arrays for whole columns.
+
+    rule_set defaults to the built-in adult rules, which match validate_row.
+    """
+    status, color, _ = (rule_set or load_rules()).apply(bmi, age, height, weight)
+    return status, color
+
+class Rule:
+    """One validation rule: field is missing, or compares true against any threshold."""
+
+    def __init__(self, name, status, field, missing=False, thresholds=()):
+        self.name = name
+        self.status = status
+        self.field = field
+        self.missing = missing
+        self.thresholds = tuple(thresholds)
+
+    @property
+    def expression(self):
+        """The rule as a numexpr expression over its field; NaN != NaN marks a missing value."""
+        terms = [f'({self.field} != {self.field})'] if self.missing else []
+        terms += [f'({self.field} {RULE_COMPARISONS[op][0]} {value!r})' for op, value in self.thresholds]
+        return ' | '.join(terms)
+
+    def mask(self, columns):
+        """Boolean array of the rows this rule fires on; NaN compares False."""
+        values = columns[self.field]
+        fired = np.isnan(values) if self.missing else np.zeros(values.shape, dtype=bool)
+        for op, value in self.thresholds:
+            fired |= RULE_COMPARISONS[op][1](values, value)
+        return fired
+
+class RuleSet:
+    """Validation rules compiled for whole-column evaluation.
+
+    Rows get the status of the first rule that fires, with every Anomaly rule
+    checked before any Warning rule, and Valid when none does. Statuses,
+    colors and rule names are looked up by rule index, so no Python code
+    runs per row.
+    """
+
+    def __init__(self, name, rules, digest):
+        self.name = name
+        self.rules = sorted(rules, key=lambda rule: RULE_STATUSES.index(rule.status))
+        self.digest = digest
+        self.rule_names = [rule.name for rule in self.rules]
+        # Index -1, i.e. no rule fired, selects the last entry
+        self._statuses = np.array([rule.status for rule in self.rules] + ['Valid'], dtype=object)
+        self._colors = np.array([STATUS_COLORS[status] for status in self._statuses], dtype=object)
+        self._status_codes = np.array([STATUS_DTYPE.categories.get_loc(status) for status in self._statuses],
+                                      dtype=np.int8)
+
+    def masks(self, columns):
+        """One boolean array per rule, in priority order."""
+        numexpr = _numexpr() if len(next(iter(columns.values()))) >= NUMEXPR_MIN_ROWS else None
+        if numexpr is None:
+            return [rule.mask(columns) for rule in self.rules]
+        return [numexpr.evaluate(rule.expression, local_dict={rule.field: columns[rule.field]})
+                for rule in self.rules]
+
+    def rule_codes(self, bmi, age, height, weight):
+        """Index into rule_names of the rule that fired on each row, -1 where none did."""
+        columns = dict(zip(RULE_FIELDS, np.broadcast_arrays(
+            _as_float_array(bmi),
+            _as_float_array(age),
+            _as_float_array(height),
+            _as_float_array(weight)
+        )))
+        return np.select(self.masks(columns), np.arange(len(self.rules), dtype=np.int16),
+                         default=-1).astype(np.int16, copy=False)
+
+    def apply(self, bmi, age, height, weight):
+        """Return (status, color, rule) for whole columns; rule is a Categorical, NaN for Valid rows."""
+        codes = self.rule_codes(bmi, age, height, weight)
+        rule = pd.Categorical.from_codes(codes, categories=self.rule_names)
+        return self._statuses[codes], self._colors[codes], rule
+
+    def classify(self, bmi, age, height, weight):
+        """Return (status, rule) Categoricals for whole columns, the compact form of apply()."""
+        codes = self.rule_codes(bmi, age, height, weight)
+        status = pd.Categorical.from_codes(self._status_codes[codes], dtype=STATUS_DTYPE)
+        return status, pd.Categorical.from_codes(codes, categories=self.rule_names)
+
+    def to_dict(self):
+        """The rule set as configured, with rules in priority order."""
+        rules = []
+        for rule in self.rules:
+            spec = {'name': rule.name, 'status': rule.status, 'field': rule.field}
+            if rule.missing:
+                spec['missing'] = True
+            spec.update(rule.thresholds)
+            rules.append(spec)
+        return {'name': self.name, 'digest': self.digest, 'rules': rules}
+
+_compiled_rule_sets = {}
+_compiled_lock = threading.Lock()
+
+# Rule set file path -> ((mtime, size), RuleSet); a file is read again only after it changes
+_loaded_rule_sets = {}
+
+def compile_rules(config):
+    """Compile a rule set config dict, reusing the compiled set of an identical config."""
+    digest = hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()
+    with _compiled_lock:
+        rule_set = _compiled_rule_sets.get(digest)
+    if rule_set is None:
+        rule_set = RuleSet(config.get('name', 'custom'), _parse_rules(config), digest)
+        with _compiled_lock:
+            rule_set = _compiled_rule_sets.setdefault(digest, rule_set)
+    return rule_set
+
+def _parse_rules(config):
+    """Rules of a config dict, raising ValueError on anything malformed."""
+    specs = config.get('rules') if isinstance(config, dict) else None
+    if not specs or not isinstance(specs, list):
+        raise ValueError('A rule set needs a non-empty "rules" list')
+    rules, names = [], set()
+    for spec in specs:
+        name = spec.get('name') if isinstance(spec, dict) else None
+        if not name or name in names:
+            raise ValueError(f'Every rule needs a unique name, got {name!r}')
+        names.add(name)
+        unknown = set(spec) - {'name', 'status', 'field', 'missing', *RULE_COMPARISONS}
+        if unknown:
+            raise ValueError(f'Rule {name!r} has unknown keys {sorted(unknown)}')
+        if spec.get('status') not in RULE_STATUSES:
+            raise ValueError(f'Rule {name!r} status must be one of {list(RULE_STATUSES)}')
+        if spec.get('field') not in RULE_FIELDS:
+            raise ValueError(f'Rule {name!r} field must be one of {list(RULE_FIELDS)}')
+        thresholds = [(op, spec[op]) for op in RULE_COMPARISONS if op in spec]
+        if any(isinstance(value, bool) or not isinstance(value, (int, float)) for _, value in thresholds):
+            raise ValueError(f'Rule {name!r} thresholds must be numbers')
+        if not thresholds and not spec.get('missing'):
+            raise ValueError(f'Rule {name!r} needs "missing": true or a threshold ({", ".join(RULE_COMPARISONS)})')
+        rules.append(Rule(name, spec['status'], spec['field'], bool(spec.get('missing')),
+                          [(op, float(value)) for op, value in thresholds]))
+    return rules
+
+def rule_set_path(source):
+    """Path of a built-in rule set name, or source itself when it is a file path."""
+    for extension in ('.json', '.yaml', '.yml'):
+        path = os.path.join(RULES_DIR, source + extension)
+        if os.path.exists(path):
+            return path
+    return source
+
+def load_rules(source=DEFAULT_RULE_SET):
+    """Load and compile a rule set from a built-in name or a JSON or YAML file.
+
+    The compiled set is reused until the file's modification time or size changes.
+    """
+    path = rule_set_path(source)
+    stat = os.stat(path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    with _compiled_lock:
+        loaded = _loaded_rule_sets.get(path)
+    if loaded is not None and loaded[0] == signature:
+        return loaded[1]
+    rule_set = compile_rules(_read_rule_config(path))
+    with _compiled_lock:
+        _loaded_rule_sets[path] = (signature, rule_set)
+    return rule_set
+
+def _read_rule_config(path):
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    if path.endswith(('.yaml', '.yml')):
+        try:
+            import yaml
+        except ImportError:
+            raise ValueError(f'Reading {path} needs PyYAML; install it or use a JSON rule set') from None
+        try:
+            config = yaml.safe_load(text)
+        except yaml.YAMLError as e:
+            raise ValueError(f'Invalid YAML in {path}: {e}') from None
+    else:
+        config = json.loads(text)
+    return config
+
+def _numexpr():
+    try:
+        import numexpr
+    except ImportError:
+        return None
+    return numexpr
@@ -1,16 +1,34 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify, session, stream_with_context
 import pandas as pd
 import numpy as np
+from pandas.tseries.api import guess_datetime_format
+import importlib.metadata
 import os
 import socket
-from sklearn.ensemble import IsolationForest
-from sklearn.preprocessing import StandardScaler
 import sys
+import tempfile
 import webbrowser
 import threading
-import time
+import uuid
+from werkzeug.serving import make_server
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from src.validation import validate_row, bmi_calculated
+from src.validation import DEFAULT_RULE_SET, bmi_calculated_array, load_rules
+from src.ingestion import (DEFAULT_CHUNK_ROWS, UPLOAD_FORMATS, upload_format, read_columns,
+                           read_mapped_columns, iter_csv_chunks, compact_frame, concat_chunks)
+from src.dataset_store import DatasetStore
+from src.duplicates import REPEAT_KINDS, DuplicateIndex, flag_duplicates, upload_tag
+from src.results import STATUSES, select_page, filter_positions
+from src.summary_stats import DEFAULT_SUMMARY_CHUNK_ROWS, iter_chunks, summarize
+from src.export import DEFAULT_EXPORT_CHUNK_ROWS, EXPORT_FORMATS, parquet_available
+from src.serialization import PAYLOAD_LAYOUTS, dumps
+from src.result_cache import ResultCache, cache_key, copy_with_digest, file_digest, stream_digest
+from src.jobs import JobManager
+from src.log_config import setup_logger
+from src.metrics import PROMETHEUS_CONTENT_TYPE, StageMetrics
+from src.model_store import (DEFAULT_AGE_BANDS, DEFAULT_COHORT_MIN_ROWS, DEFAULT_DATA_DIR, DEFAULT_MODEL_DIR,
+                             Layer2Engine, ModelStore, cohort_fingerprint, cohort_labels, cohort_partitions,
+                             data_fingerprint, fit_cohort_model, fit_model, layer1_contamination, model_metadata,
+                             preload, score_cohort_model, score_model)
 
 # Setup directories
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -23,6 +41,80 @@ app = Flask(__name__,
             template_folder=template_dir,
             static_folder=static_dir)
 
+# Uploads at least this large are spooled to disk and ingested chunk by chunk
+app.config['INGEST_CHUNK_ROWS'] = int(os.environ.get('DOCTOR31_CHUNK_ROWS', DEFAULT_CHUNK_ROWS))
+app.config['CHUNKED_UPLOAD_BYTES'] = int(os.environ.get('DOCTOR31_CHUNKED_UPLOAD_BYTES', 100 * 1024 * 1024))
+app.config['UPLOAD_SPOOL_DIR'] = os.environ.get('DOCTOR31_SPOOL_DIR', tempfile.gettempdir())
+
+# Requests with a larger body are rejected with 413 before they are read (default 0: no limit)
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('DOCTOR31_MAX_UPLOAD_BYTES', 0)) or None
+
+# Per-session datasets; set DOCTOR31_SECRET_KEY and a shared DOCTOR31_SPILL_DIR when running several workers
+app.secret_key = os.environ.get('DOCTOR31_SECRET_KEY') or os.urandom(32)
+app.config['DATASET_STORE_BYTES'] = int(os.environ.get('DOCTOR31_STORE_BYTES', 2 * 1024 ** 3))
+app.config['DATASET_SPILL_DIR'] = os.environ.get('DOCTOR31_SPILL_DIR') or None
+app.config['DATASET_SPILL_FORMAT'] = os.environ.get('DOCTOR31_SPILL_FORMAT', 'parquet')
+
+# Parsed uploads and finished analyses, keyed by the uploaded bytes, mapping and settings (0 bytes: off)
+app.config['RESULT_CACHE_DIR'] = os.environ.get('DOCTOR31_RESULT_CACHE_DIR',
+                                                os.path.join(tempfile.gettempdir(), 'doctor31-results'))
+app.config['RESULT_CACHE_BYTES'] = int(os.environ.get('DOCTOR31_RESULT_CACHE_BYTES', 2 * 1024 ** 3))
+
+# Rows per chunk of the single-pass /summary statistics
+app.config['SUMMARY_CHUNK_ROWS'] = int(os.environ.get('DOCTOR31_SUMMARY_CHUNK_ROWS', DEFAULT_SUMMARY_CHUNK_ROWS))
+
+# Persistent index of rows already seen, for flagging resubmissions across uploads (empty: off)
+app.config['DUPLICATE_INDEX_DIR'] = os.environ.get('DOCTOR31_DUPLICATE_INDEX_DIR',
+                                                   os.path.join(DEFAULT_DATA_DIR, 'duplicates')) or None
+
+# Trained Layer 2 models and the fingerprint-keyed fit cache
+app.config['MODEL_DIR'] = os.environ.get('DOCTOR31_MODEL_DIR', DEFAULT_MODEL_DIR)
+
+# Layer 2 hardware use: threads per fit/score (-1: all cores), fit sampling and process-pool scoring
+app.config['LAYER2_N_JOBS'] = int(os.environ.get('DOCTOR31_LAYER2_JOBS', -1))
+app.config['LAYER2_FIT_SAMPLE_THRESHOLD'] = int(os.environ.get('DOCTOR31_LAYER2_FIT_SAMPLE_THRESHOLD', 500_000))
+app.config['LAYER2_FIT_SAMPLE_ROWS'] = int(os.environ.get('DOCTOR31_LAYER2_FIT_SAMPLE_ROWS', 200_000))
+app.config['LAYER2_SCORE_WORKERS'] = int(os.environ.get('DOCTOR31_LAYER2_SCORE_WORKERS', 1))
+app.config['LAYER2_SCORE_CHUNK_ROWS'] = int(os.environ.get('DOCTOR31_LAYER2_SCORE_CHUNK_ROWS', 250_000))
+
+# Layer 2 per cohort (sex x age band, edges in years) instead of one model for everyone; cohorts
+# with fewer rows share one model, and cohorts are fit and scored on this many processes
+app.config['LAYER2_COHORTS'] = os.environ.get('DOCTOR31_LAYER2_COHORTS', '') == '1'
+app.config['LAYER2_AGE_BANDS'] = tuple(
+    float(edge) for edge in os.environ.get('DOCTOR31_LAYER2_AGE_BANDS', ','.join(map(str, DEFAULT_AGE_BANDS))).split(',')
+    if edge.strip())
+app.config['LAYER2_COHORT_MIN_ROWS'] = int(os.environ.get('DOCTOR31_LAYER2_COHORT_MIN_ROWS', DEFAULT_COHORT_MIN_ROWS))
+app.config['LAYER2_COHORT_WORKERS'] = int(os.environ.get('DOCTOR31_LAYER2_COHORT_WORKERS', 1))
+
+# Largest page /results will serialize in one response
+app.config['RESULTS_MAX_LIMIT'] = 1000
+app.config['EXPORT_CHUNK_ROWS'] = DEFAULT_EXPORT_CHUNK_ROWS
+
+# strftime format of the mapped date column; inferred from the first value when unset
+app.config['DATE_FORMAT'] = os.environ.get('DOCTOR31_DATE_FORMAT') or None
+
+# Layer 1 rule set: a built-in name (adult, pediatric) or the path of a JSON or YAML rule file
+app.config['RULES'] = os.environ.get('DOCTOR31_RULES') or DEFAULT_RULE_SET
+
+# Background /analyze jobs run on this many threads
+app.config['ANALYSIS_WORKERS'] = int(os.environ.get('DOCTOR31_ANALYSIS_WORKERS', 2))
+
+# Also write every stage timing as a JSON line to the log file from setup_logger
+app.config['METRICS_LOG'] = os.environ.get('DOCTOR31_METRICS_LOG', '') == '1'
+
+# Import scikit-learn in the background once the server listens, instead of on the first analysis
+app.config['PREWARM'] = os.environ.get('DOCTOR31_PREWARM', '1') != '0'
+
+# Production server (python -m src.server): server (auto, gunicorn or waitress), bind address,
+# worker processes, threads per worker, idle keep-alive and request timeout in seconds
+app.config['SERVER'] = os.environ.get('DOCTOR31_SERVER', 'auto')
+app.config['SERVER_HOST'] = os.environ.get('DOCTOR31_HOST', '0.0.0.0')
+app.config['SERVER_PORT'] = int(os.environ.get('DOCTOR31_PORT', 4000))
+app.config['SERVER_WORKERS'] = int(os.environ.get('DOCTOR31_WORKERS', 1))
+app.config['SERVER_THREADS'] = int(os.environ.get('DOCTOR31_THREADS', 8))
+app.config['SERVER_KEEPALIVE'] = int(os.environ.get('DOCTOR31_KEEPALIVE', 5))
+app.config['SERVER_TIMEOUT'] = int(os.environ.get('DOCTOR31_TIMEOUT', 300))
+
 DEFAULT_COLUMN_MAPPING = {
     'case_id': 'id_cases',
     'age': 'age_v',
@@ -37,58 +129,138 @@ DEFAULT_COLUMN_MAPPING = {
     'bmi_index': 'imcINdex'
 }
 
-# Global variables
-data = None
-column_mappings = None
-processed_data = None
+dataset_store = DatasetStore(app.config['DATASET_STORE_BYTES'],
+                             spill_dir=app.config['DATASET_SPILL_DIR'],
+                             spill_format=app.config['DATASET_SPILL_FORMAT'])
+model_store = ModelStore(app.config['MODEL_DIR'])
+layer2_engine = Layer2Engine(n_jobs=app.config['LAYER2_N_JOBS'],
+                             fit_sample_threshold=app.config['LAYER2_FIT_SAMPLE_THRESHOLD'],
+                             fit_sample_rows=app.config['LAYER2_FIT_SAMPLE_ROWS'],
+                             score_workers=app.config['LAYER2_SCORE_WORKERS'],
+                             score_chunk_rows=app.config['LAYER2_SCORE_CHUNK_ROWS'],
+                             cohort_workers=app.config['LAYER2_COHORT_WORKERS'])
+job_manager = JobManager(max_workers=app.config['ANALYSIS_WORKERS'])
+duplicate_index = (DuplicateIndex(app.config['DUPLICATE_INDEX_DIR'])
+                   if app.config['DUPLICATE_INDEX_DIR'] else None)
+result_cache = (ResultCache(app.config['RESULT_CACHE_DIR'], app.config['RESULT_CACHE_BYTES'])
+                if app.config['RESULT_CACHE_BYTES'] else None)
 
-def _records_safe(df):
-    """Convert DataFrame to records with NaN handling and proper formatting."""
-    df_copy = df.replace({np.nan: None}).copy()
-    
-    # Ensure BMI calculated values are properly formatted to 2 decimal places
-    if 'bmi_calculated' in df_copy.columns:
-        df_copy['bmi_calculated'] = df_copy['bmi_calculated'].apply(
-            lambda x: round(float(x), 2) if x is not None and pd.notnull(x) else x
-        )
-    
-    return df_copy.to_dict('records')
+def _code_version(filename):
+    try:
+        return file_digest(os.path.join(current_dir, filename))
+    except OSError:
+        return None
+
+def _library_version(name):
+    try:
+        return importlib.metadata.version(name)
+    except importlib.metadata.PackageNotFoundError:
+        return None
+
+# Analyses depend on this code and these libraries; changing any of them starts a fresh result cache
+ANALYSIS_CODE_VERSION = cache_key(
+    [_code_version(filename) for filename in ('web_gui.py', 'validation.py', 'ingestion.py', 'model_store.py',
+                                                'summary_stats.py')],
+    [_library_version(name) for name in ('pandas', 'numpy', 'scikit-learn')]
+)
+stage_metrics = StageMetrics(logger=setup_logger('metrics') if app.config['METRICS_LOG'] else None)
 
-def apply_column_mapping_and_clean(df, mappings):
-    """Apply column mappings and clean data."""
+def _session_dataset():
+    """Return (session id, dataset) for the current browser session."""
+    if 'dataset_id' not in session:
+        session['dataset_id'] = uuid.uuid4().hex
+    session_id = session['dataset_id']
+    return session_id, dataset_store.get(session_id)
+
+def _clean_numeric(column):
+    """Parse a raw column as numbers; returns (values, unparseable count)."""
+    if column.dtype.kind in 'iuf':
+        return column, 0
+    # to_numeric skips surrounding whitespace and coerces blanks to NaN itself
+    values = pd.to_numeric(column, errors='coerce')
+    return values, _count_parse_failures(column, values)
+
+def _clean_date(column):
+    """Parse a raw column as datetime64 with one inferred or configured format."""
+    if column.dtype.kind == 'M':
+        return column, 0
+    date_format = app.config['DATE_FORMAT'] or _infer_date_format(column)
+    values = pd.to_datetime(column, format=date_format, errors='coerce')
+    return values, _count_parse_failures(column, values)
+
+def _infer_date_format(column):
+    """strftime format guessed from the first non-blank value, or None."""
+    first_valid = column.first_valid_index()
+    if first_valid is None:
+        return None
+    start = column.index.get_loc(first_valid)
+    window = column.iloc[start:start + 100].dropna().astype(str).str.strip()
+    window = window[window != '']
+    return guess_datetime_format(window.iloc[0]) if len(window) else None
+
+def _count_parse_failures(raw, parsed):
+    # Blank cells are missing values, not failures; only the failed subset is stringified
+    failed = raw[parsed.isna().to_numpy() & raw.notna().to_numpy()]
+    return int((failed.astype(str).str.strip() != '').sum())
+
+# parser name -> function cleaning one raw column
+COLUMN_CLEANERS = {'numeric': _clean_numeric, 'date': _clean_date}
+NUMERIC_FIELDS = ['age', 'weight', 'height', 'bmi']
+
+# Fields whose values feed Layer 1, duplicate detection or Layer 2; remapping any other field keeps the analysis
+ANALYSIS_FIELDS = {'age', 'weight', 'height', 'bmi', 'case_id', 'date'}
+
+@stage_metrics.timed('clean')
+def apply_column_mapping_and_clean(df, mappings, cache=None):
+    """Apply column mappings and clean data.
+
+    cache maps (source column, parser) to an already cleaned column of df, so
+    after a mapping change only columns not cleaned before are parsed again.
+    """
     reverse_mapping = {v: k for k, v in mappings.items() if v in df.columns}
     mapped_df = df.rename(columns=reverse_mapping)
     mapped_df.columns = mapped_df.columns.str.lower()
+    source_columns = {field.lower(): source for source, field in reverse_mapping.items()}
+    parse_failures = {}
     
     # Clean numeric columns
-    for col in ['age', 'weight', 'height', 'bmi']:
+    for col in NUMERIC_FIELDS:
         if col in mapped_df.columns:
-            mapped_df[col] = mapped_df[col].astype(str).replace(r'^\s*$', np.nan, regex=True)
-            mapped_df[col] = pd.to_numeric(mapped_df[col], errors='coerce')
+            mapped_df[col], parse_failures[col] = _cleaned_column(
+                mapped_df[col], source_columns.get(col), 'numeric', cache)
     
-    # Clean date column
+    # Clean date column, kept as datetime64 and formatted only when rows are sent
     if 'date' in mapped_df.columns:
-        mapped_df['date'] = pd.to_datetime(mapped_df['date'], errors='coerce')
-        mapped_df['date'] = mapped_df['date'].dt.strftime('%Y-%m-%d %H:%M:%S')
+        mapped_df['date'], parse_failures['date'] = _cleaned_column(
+            mapped_df['date'], source_columns.get('date'), 'date', cache)
     
     # Calculate BMI with safe rounding
     if 'weight' in mapped_df.columns and 'height' in mapped_df.columns:
-        def safe_bmi_calculation(row):
-            result = bmi_calculated(row['weight'], row['height'])
-            if result is not None:
-                try:
-                    bmi_value = float(result)
-                    return round(bmi_value, 2) if not np.isnan(bmi_value) else None
-                except (ValueError, TypeError):
-                    return None
-            return None
-        
-        mapped_df['bmi_calculated'] = mapped_df.apply(safe_bmi_calculation, axis=1)
+        mapped_df['bmi_calculated'] = bmi_calculated_array(mapped_df['weight'], mapped_df['height'])
     else:
-        mapped_df['bmi_calculated'] = None
+        mapped_df['bmi_calculated'] = np.nan
 
+    mapped_df.attrs['parse_failures'] = parse_failures
     return mapped_df
 
+def _cleaned_column(column, source, parser, cache):
+    """(cleaned column, parse failures), from the cache when this source was parsed before."""
+    if cache is None or source is None:
+        return COLUMN_CLEANERS[parser](column)
+    key = (source, parser)
+    if key not in cache:
+        cache[key] = COLUMN_CLEANERS[parser](column)
+    return cache[key]
+
+def _extend_clean_cache(cache, new_cache):
+    """Append the columns cleaned for new rows to the cache; columns not mapped now are parsed again when needed."""
+    for key, (column, failures) in list(cache.items()):
+        if key in new_cache:
+            new_column, new_failures = new_cache[key]
+            cache[key] = (pd.concat([column, new_column]), failures + new_failures)
+        else:
+            del cache[key]
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -102,13 +274,28 @@ def upload_file():
     if file.filename == '' or file.filename is None:
         return jsonify({'error': 'No file selected'}), 400
     
-    if file and file.filename.endswith('.csv'):
+    fmt = upload_format(file.filename)
+    if file and fmt is not None:
         try:
-            global data, column_mappings, processed_data
-            data = pd.read_csv(file.stream)
-            colnames = data.columns.tolist()
-            column_mappings = None
-            processed_data = None
+            session_id, dataset = _session_dataset()
+            _discard_spooled_upload(dataset)
+            dataset.data = None
+            with stage_metrics.stage('upload') as timer:
+                # Columnar files are spooled and later read one mapped column at a time
+                if fmt != 'csv' or _use_chunked_ingest():
+                    dataset.data_source, dataset.upload_digest = _spool_upload(file)
+                    colnames = read_columns(dataset.data_source, fmt)
+                else:
+                    dataset.upload_digest = stream_digest(file.stream)
+                    dataset.data = _read_csv_upload(file.stream, dataset.upload_digest)
+                    colnames = dataset.data.columns.tolist()
+                    timer.rows = len(dataset.data)
+            dataset.column_mappings = None
+            dataset.processed_data = None
+            dataset.analysis_data = None
+            dataset.clean_cache = {}
+            dataset.layer2_model = None
+            dataset_store.save(session_id, dataset)
             return jsonify({
                 'message': 'File uploaded successfully',
                 'columns': colnames
@@ -116,94 +303,592 @@ def upload_file():
         except Exception as e:
             return jsonify({'error': str(e)}), 400
     
-    return jsonify({'error': 'Invalid file type'}), 400
+    return jsonify({'error': f'Invalid file type; upload one of {sorted(UPLOAD_FORMATS)}'}), 400
+
+def _use_chunked_ingest():
+    """Decide whether the current upload should be ingested in chunks."""
+    if request.form.get('mode') == 'chunked':
+        return True
+    return (request.content_length or 0) >= app.config['CHUNKED_UPLOAD_BYTES']
+
+def _spool_upload(file):
+    """Stream an uploaded file to the spool directory; returns (path, content digest)."""
+    suffix = os.path.splitext(file.filename)[1].lower()
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=app.config['UPLOAD_SPOOL_DIR'])
+    os.close(fd)
+    return path, copy_with_digest(file.stream, path)
+
+def _read_csv_upload(stream, digest):
+    """Parse an in-memory CSV upload, reusing the parsed frame of a byte-identical earlier upload."""
+    if result_cache is None:
+        return pd.read_csv(stream)
+    key = cache_key('upload', digest)
+    cached = result_cache.get(key)
+    if cached is not None:
+        return cached[0]['data']
+    data = pd.read_csv(stream)
+    result_cache.put(key, {'data': data})
+    return data
+
+def _discard_spooled_upload(dataset):
+    """Remove the session's previously spooled upload, if any."""
+    if dataset.data_source is not None and os.path.exists(dataset.data_source):
+        os.remove(dataset.data_source)
+    dataset.data_source = None
+
+def _ingest_csv_chunked(source, mappings, nrows=None, validate=True):
+    """Clean and validate a spooled CSV chunk by chunk, keeping compact mapped columns only."""
+    chunks = []
+    for chunk in iter_csv_chunks(source, mappings, app.config['INGEST_CHUNK_ROWS'], nrows=nrows):
+        cleaned = apply_column_mapping_and_clean(chunk, mappings)
+        if validate:
+            # Validate before downcasting so float32 rounding never moves a boundary
+            cleaned = _apply_layer1_validation(cleaned)
+        chunks.append(compact_frame(cleaned))
+    combined = concat_chunks(chunks)
+    combined.attrs['parse_failures'] = _sum_parse_failures(chunks)
+    return combined
+
+def _sum_parse_failures(frames):
+    """Per-column parse failures of several cleaned frames added together."""
+    totals = {}
+    for frame in frames:
+        for col, count in frame.attrs.get('parse_failures', {}).items():
+            totals[col] = totals.get(col, 0) + count
+    return totals
+
+def _ingest_spooled(source, mappings, nrows=None, validate=True):
+    """Clean a spooled upload: CSV chunk by chunk, columnar formats by reading mapped columns only."""
+    fmt = upload_format(source)
+    if fmt == 'csv':
+        return _ingest_csv_chunked(source, mappings, nrows, validate)
+    return apply_column_mapping_and_clean(read_mapped_columns(source, fmt, mappings, nrows), mappings)
+
+def _load_processed_data(dataset):
+    """Build the cleaned frame from the in-memory upload or the spooled file."""
+    if dataset.data_source is not None:
+        return _ingest_spooled(dataset.data_source, dataset.column_mappings)
+    return apply_column_mapping_and_clean(dataset.data, dataset.column_mappings, dataset.clean_cache)
+
+def _has_upload(dataset):
+    return (dataset.data is not None or dataset.data_source is not None) and \
+        dataset.column_mappings is not None
 
 @app.route('/map-columns', methods=['POST'])
 def map_columns():
-    global column_mappings, processed_data
     user_map = request.json or {}
     
     if set(user_map.keys()) != set(DEFAULT_COLUMN_MAPPING.keys()):
         return jsonify({'error': 'You must map all fields.'}), 400
     
-    column_mappings = user_map
-    processed_data = None
-    return jsonify({'message': 'Column mappings saved'})
+    session_id, dataset = _session_dataset()
+    previous_map = dataset.column_mappings or {}
+    changed = {field for field in user_map if previous_map.get(field) != user_map[field]}
+    dataset.column_mappings = user_map
+    
+    if dataset.data is not None and dataset.processed_data is not None:
+        # Only remapped columns are parsed again; the rest come from the clean cache
+        dataset.processed_data = apply_column_mapping_and_clean(dataset.data, user_map, dataset.clean_cache)
+        if dataset.analysis_data is not None and not changed & _analysis_fields():
+            dataset.analysis_data = _carry_over_analysis(dataset.processed_data, dataset.analysis_data)
+        else:
+            dataset.analysis_data = None
+    else:
+        dataset.processed_data = None
+        dataset.analysis_data = None
+    if dataset.analysis_data is None:
+        dataset.layer2_model = None
+    dataset_store.save(session_id, dataset)
+    return jsonify({
+        'message': 'Column mappings saved',
+        'changed_fields': sorted(changed),
+        'analysis_kept': dataset.analysis_data is not None
+    })
+
+def _analysis_fields():
+    """Fields the current analysis depends on; cohort models are also partitioned by sex."""
+    if app.config['LAYER2_COHORTS']:
+        return ANALYSIS_FIELDS | {'sex'}
+    return ANALYSIS_FIELDS
+
+def _carry_over_analysis(processed_df, analysis_df):
+    """Rebuild the analysis result on remapped data whose analysed columns are unchanged."""
+    result_cols = ['status', 'rule', 'duplicate', 'isolation_score', 'anomaly']
+    carried = processed_df.assign(**{col: analysis_df[col] for col in result_cols if col in analysis_df.columns})
+    carried.attrs = {**analysis_df.attrs, 'parse_failures': processed_df.attrs.get('parse_failures', {})}
+    return _reorder_columns_for_display(compact_frame(carried))
+
+@app.route('/append', methods=['POST'])
+def append_rows():
+    """Append a CSV batch to the session's data, validating only the new rows."""
+    session_id, dataset = _session_dataset()
+    
+    if dataset.data is None or dataset.column_mappings is None:
+        return jsonify({'error': 'Appending needs an in-memory upload with column mappings'}), 400
+    file = request.files.get('file')
+    if file is None or not (file.filename or '').endswith('.csv'):
+        return jsonify({'error': 'Upload a CSV file with the new rows'}), 400
+    
+    try:
+        with stage_metrics.stage('upload') as timer:
+            new_digest = stream_digest(file.stream)
+            new_rows = pd.read_csv(file.stream)
+            timer.rows = len(new_rows)
+        missing = sorted(set(dataset.data.columns) - set(new_rows.columns))
+        if missing:
+            raise ValueError(f'New rows are missing columns: {missing}')
+        new_rows = new_rows[dataset.data.columns]
+        new_rows.index = pd.RangeIndex(len(dataset.data), len(dataset.data) + len(new_rows))
+        
+        new_clean_cache = {}
+        new_processed = apply_column_mapping_and_clean(new_rows, dataset.column_mappings, new_clean_cache)
+        new_analysis = None
+        if dataset.analysis_data is not None:
+            new_analysis = _analyze_appended_rows(dataset, new_processed, new_digest)
+        
+        dataset.data = pd.concat([dataset.data, new_rows])
+        if dataset.upload_digest is not None:
+            dataset.upload_digest = cache_key('append', dataset.upload_digest, new_digest)
+        _extend_clean_cache(dataset.clean_cache, new_clean_cache)
+        if dataset.processed_data is not None:
+            parse_failures = _sum_parse_failures([dataset.processed_data, new_processed])
+            dataset.processed_data = pd.concat([dataset.processed_data, new_processed])
+            dataset.processed_data.attrs['parse_failures'] = parse_failures
+        if new_analysis is not None:
+            attrs = dict(dataset.analysis_data.attrs)
+            attrs['parse_failures'] = _sum_parse_failures([dataset.analysis_data, new_analysis])
+            # concat_chunks keeps categorical columns categorical when the new rows bring new categories
+            dataset.analysis_data = _reorder_columns_for_display(
+                concat_chunks([dataset.analysis_data, new_analysis[dataset.analysis_data.columns]]))
+            dataset.analysis_data.attrs = attrs
+        dataset_store.save(session_id, dataset)
+        
+        response = {'message': 'Rows appended', 'appended_rows': len(new_rows), 'total_rows': len(dataset.data)}
+        if dataset.analysis_data is not None:
+            response.update(_analysis_summary(dataset.analysis_data))
+        return jsonify(response)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+def _analyze_appended_rows(dataset, new_processed, digest):
+    """Layer 1 and duplicate checks on new rows, then Layer 2 with the model behind the existing analysis."""
+    new_analysis = _apply_duplicate_detection(_apply_layer1_validation(new_processed.copy(deep=False)), digest)
+    model = _stored_layer2_model(dataset.layer2_model)
+    if model is None:
+        new_analysis['isolation_score'] = np.nan
+        new_analysis['anomaly'] = np.nan
+        return compact_frame(new_analysis)
+    return compact_frame(_apply_layer2_isolation_forest(new_analysis, model=model))
+
+def _stored_layer2_model(model_ref):
+    """Load the model an analysis was scored with, from its model id or fit fingerprint."""
+    if model_ref is None:
+        # Layer 2 was skipped (fewer than two complete rows), so skip it for new rows too
+        return None
+    if 'model_id' in model_ref:
+        return model_store.load_model(model_ref['model_id'])
+    model = model_store.cached_fit(model_ref['fingerprint'])
+    if model is None:
+        raise ValueError('The Layer 2 model of this analysis is no longer cached; run the analysis again')
+    return model
 
 @app.route('/preview', methods=['POST'])
 def preview_data_route():
-    global data, column_mappings, processed_data
+    session_id, dataset = _session_dataset()
     
-    if data is None or column_mappings is None:
+    if not _has_upload(dataset):
         return jsonify({'error': 'No data or column mappings available'}), 400
     
     try:
-        if processed_data is None:
-            processed_data = apply_column_mapping_and_clean(data, column_mappings)
+        if dataset.processed_data is not None:
+            preview_df = dataset.processed_data.head(200)
+        elif dataset.data_source is not None:
+            # Only the first rows are needed, so skip the full chunked pass
+            preview_df = _ingest_spooled(dataset.data_source, dataset.column_mappings,
+                                         nrows=200, validate=False)
+        else:
+            dataset.processed_data = _load_processed_data(dataset)
+            dataset_store.save(session_id, dataset)
+            preview_df = dataset.processed_data.head(200)
         
-        preview = _records_safe(processed_data.head(200))
-        return jsonify({'preview': preview})
+        return _json_response({
+            'preview': preview_df,
+            'parse_failures': preview_df.attrs.get('parse_failures', {})
+        })
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
 @app.route('/analyze', methods=['POST'])
 def analyze_data():
-    global data, column_mappings, processed_data
+    session_id, dataset = _session_dataset()
     
-    if data is None or column_mappings is None:
+    if not _has_upload(dataset):
         return jsonify({'error': 'No data or column mappings available'}), 400
 
     try:
-        if processed_data is None:
-            processed_data = apply_column_mapping_and_clean(data, column_mappings)
-        
-        analysis_df = processed_data.copy()
-        
-        # Validate required columns
-        validation_result = _validate_required_columns(analysis_df)
-        if validation_result:
-            return validation_result
-        
-        # Apply validation layers
+        return _json_response(_run_analysis(session_id, dataset))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/analyze/jobs', methods=['POST'])
+def submit_analysis_job():
+    """Start the analysis in the background and return a job id to poll."""
+    session_id, dataset = _session_dataset()
+    
+    if not _has_upload(dataset):
+        return jsonify({'error': 'No data or column mappings available'}), 400
+    
+    # The result is only stored if the session is still at this version when the job finishes
+    job = job_manager.submit(session_id, _run_analysis_job, session_id, dataset, dataset.version)
+    return jsonify({'job_id': job.job_id, **job.to_dict()}), 202
+
+@app.route('/analyze/jobs/<job_id>', methods=['GET'])
+def analysis_job_status(job_id):
+    """Report the state and per-stage progress of a background analysis."""
+    job = job_manager.get(job_id, session.get('dataset_id'))
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/analyze/jobs/<job_id>/result', methods=['GET'])
+def analysis_job_result(job_id):
+    """Return the analysis payload once the job has finished."""
+    job = job_manager.get(job_id, session.get('dataset_id'))
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    if job.state == 'failed':
+        return jsonify({'error': job.error}), 400
+    if job.state != 'done':
+        return jsonify({'error': 'Analysis still running', **job.to_dict()}), 409
+    return _json_response(job.result)
+
+def _run_analysis_job(job, session_id, dataset, version):
+    return _run_analysis(session_id, dataset, progress=job.start_stage, version=version)
+
+def _run_analysis(session_id, dataset, progress=None, version=None):
+    """Clean, run both validation layers, cache the result and build the response payload.
+
+    Results are stored on the dataset only if it is still at version (default:
+    its version now), so an upload or remapping made meanwhile is never paired
+    with a stale analysis.
+    """
+    progress = progress or (lambda stage: None)
+    version = dataset.version if version is None else version
+    
+    cache_entry = _analysis_cache_key(dataset)
+    cached = result_cache.get(cache_entry) if cache_entry else None
+    if cached is not None:
+        frames, meta = cached
+        _store_analysis(session_id, dataset, version, processed_data=frames['processed_data'],
+                        analysis_data=frames['analysis_data'], layer2_model=meta.get('layer2_model'))
+        return {**_analysis_payload(frames['analysis_data']), 'cached': True}
+    
+    progress('clean')
+    processed_df = dataset.processed_data
+    if processed_df is None:
+        processed_df = _load_processed_data(dataset)
+        version = _store_analysis(session_id, dataset, version, processed_data=processed_df)
+    
+    # Copy-on-write: columns added below never reach processed_data, and none of its data is copied
+    analysis_df = processed_df.copy(deep=False)
+    
+    # Validate required columns
+    _check_required_columns(analysis_df)
+    
+    # Apply validation layers (chunked ingestion already ran Layer 1)
+    progress('layer1')
+    if 'status' not in analysis_df.columns:
         analysis_df = _apply_layer1_validation(analysis_df)
-        analysis_df = _apply_layer2_isolation_forest(analysis_df)
-        
-        # Generate results
-        return _generate_analysis_results(analysis_df)
+    analysis_df = _apply_duplicate_detection(analysis_df, dataset.upload_digest)
+    progress('layer2')
+    analysis_df = _apply_layer2_isolation_forest(analysis_df)
+    
+    # Keep the full result server-side for /results paging, in float32 and categorical columns
+    progress('summarize')
+    layer2_model = analysis_df.attrs.get('layer2_model')
+    analysis_df = _reorder_columns_for_display(compact_frame(analysis_df))
+    _store_analysis(session_id, dataset, version, analysis_data=analysis_df, layer2_model=layer2_model)
+    if cache_entry:
+        result_cache.put(cache_entry, {'processed_data': processed_df, 'analysis_data': analysis_df},
+                         {'layer2_model': layer2_model})
+    
+    # Generate results
+    return {**_analysis_payload(analysis_df), 'cached': False}
+
+def _store_analysis(session_id, dataset, version, **fields):
+    """Save analysis fields on the session, failing if it changed since version; returns the new version."""
+    version = dataset_store.update(session_id, dataset, version, **fields)
+    if version is None:
+        raise ValueError('The upload or column mappings changed while the analysis ran; run it again')
+    return version
+
+def _analysis_cache_key(dataset):
+    """Result cache key of analysing this upload with its mapping and the current settings, or None."""
+    if result_cache is None or dataset.upload_digest is None:
+        return None
+    return cache_key('analysis', dataset.upload_digest, dataset.column_mappings, {
+        # Chunked ingestion stores compact float32 columns, so its results are kept apart
+        'chunked': dataset.data_source is not None,
+        'date_format': app.config['DATE_FORMAT'],
+        'layer2': layer2_engine.fit_params(),
+        'cohorts': _cohort_settings(),
+        'model_id': model_store.active_model_id(),
+        'rules': load_rules(app.config['RULES']).digest,
+        'duplicate_index': app.config['DUPLICATE_INDEX_DIR'],
+        'code': ANALYSIS_CODE_VERSION
+    })
+
+@app.route('/results', methods=['GET'])
+def results_page():
+    """Serve one page of the last analysis, optionally filtered by status and sorted."""
+    _, dataset = _session_dataset()
+    analysis_df = dataset.analysis_data
+    
+    if analysis_df is None:
+        return jsonify({'error': 'No analysis results available'}), 400
+    
+    try:
+        offset = max(0, int(request.args.get('offset', 0)))
+        limit = min(max(1, int(request.args.get('limit', 100))), app.config['RESULTS_MAX_LIMIT'])
+    except ValueError:
+        return jsonify({'error': 'offset and limit must be integers'}), 400
+    
+    statuses = [s for s in request.args.get('status', '').split(',') if s]
+    if any(status not in STATUSES for status in statuses):
+        return jsonify({'error': f'status must be one of {list(STATUSES)}'}), 400
+    
+    sort_by = request.args.get('sort') or None
+    if sort_by is not None and sort_by not in analysis_df.columns:
+        return jsonify({'error': f'Unknown sort column: {sort_by}'}), 400
+    descending = request.args.get('order', 'asc') == 'desc'
+    
+    page, total = select_page(analysis_df, offset, limit, statuses, sort_by, descending)
+    return _json_response({
+        'rows': page,
+        'total': total,
+        'offset': offset,
+        'limit': limit
+    })
+
+def _json_response(payload):
+    """Serialize a payload whose DataFrame values are sent in the requested ?layout=records|columns."""
+    layout = request.args.get('layout', 'records')
+    if layout not in PAYLOAD_LAYOUTS:
+        return jsonify({'error': f'layout must be one of {list(PAYLOAD_LAYOUTS)}'}), 400
+    rows = sum(len(value) for value in payload.values() if isinstance(value, pd.DataFrame))
+    with stage_metrics.stage('serialize', rows):
+        body = dumps(payload, layout)
+    return Response(body, mimetype='application/json')
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Per-stage durations, throughput and peak memory in Prometheus text format."""
+    return Response(stage_metrics.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+@app.route('/health', methods=['GET'])
+def health():
+    """Liveness: the process is up and serving requests."""
+    return jsonify({'status': 'ok'})
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Readiness: 503 until Layer 2 is loaded and the upload directories are writable."""
+    checks = {
+        # Without pre-warming, scikit-learn loads on the first analysis instead
+        'layer2': 'sklearn.ensemble' in sys.modules or not app.config['PREWARM'],
+        'spool_dir': os.access(app.config['UPLOAD_SPOOL_DIR'], os.W_OK)
+    }
+    try:
+        checks['rules'] = load_rules(app.config['RULES']) is not None
+    except (OSError, ValueError):
+        checks['rules'] = False
+    if app.config['DATASET_SPILL_DIR']:
+        checks['spill_dir'] = os.access(app.config['DATASET_SPILL_DIR'], os.W_OK)
+    if duplicate_index is not None:
+        checks['duplicate_index'] = os.access(duplicate_index.root_dir, os.W_OK)
+    if all(checks.values()):
+        return jsonify({'status': 'ready', 'checks': checks})
+    return jsonify({'status': 'not ready', 'checks': checks}), 503
+
+@app.route('/rules', methods=['GET'])
+def rules():
+    """The Layer 1 rule set in use, in the order rules are checked."""
+    try:
+        return jsonify(load_rules(app.config['RULES']).to_dict())
+    except (OSError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/summary', methods=['GET'])
+def summary_statistics():
+    """Status counts, column statistics, histograms and quantiles, computed in one pass over chunks.
+
+    After an analysis they describe its final statuses. Before one, the upload
+    is cleaned and Layer 1 validated a chunk at a time, so a spooled CSV of any
+    size is summarized in constant memory.
+    """
+    _, dataset = _session_dataset()
+    if dataset.analysis_data is None and not _has_upload(dataset):
+        return jsonify({'error': 'No data or column mappings available'}), 400
+    try:
+        return jsonify(_streaming_summary(dataset))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+def _streaming_summary(dataset):
+    """Summary of the analysis, or of the upload after Layer 1, which is cached by content."""
+    chunk_rows = app.config['SUMMARY_CHUNK_ROWS']
+    if dataset.analysis_data is not None:
+        with stage_metrics.stage('summary', len(dataset.analysis_data)):
+            return {'source': 'analysis', **summarize(iter_chunks(dataset.analysis_data, chunk_rows)).to_dict()}
+
+    entry = None
+    if result_cache is not None and dataset.upload_digest is not None:
+        entry = cache_key('summary', dataset.upload_digest, dataset.column_mappings, {
+            'chunked': dataset.data_source is not None,
+            'date_format': app.config['DATE_FORMAT'],
+            'rules': load_rules(app.config['RULES']).digest,
+            'code': ANALYSIS_CODE_VERSION
+        })
+        cached = result_cache.get(entry)
+        if cached is not None:
+            return cached[1]
+    with stage_metrics.stage('summary') as timer:
+        result = {'source': 'layer1', **summarize(_layer1_chunks(dataset, chunk_rows)).to_dict()}
+        timer.rows = result['rows']
+    if entry:
+        result_cache.put(entry, {}, result)
+    return result
+
+def _layer1_chunks(dataset, chunk_rows):
+    """Cleaned, Layer 1 validated chunks of an upload; a spooled CSV is read one chunk at a time."""
+    mappings = dataset.column_mappings
+    if dataset.processed_data is not None:
+        chunks = iter_chunks(dataset.processed_data, chunk_rows)
+    elif dataset.data_source is not None and upload_format(dataset.data_source) == 'csv':
+        chunks = (apply_column_mapping_and_clean(chunk, mappings)
+                  for chunk in iter_csv_chunks(dataset.data_source, mappings, chunk_rows))
+    elif dataset.data_source is not None:
+        # Columnar formats are already read projected to the mapped columns
+        chunks = iter_chunks(_ingest_spooled(dataset.data_source, mappings), chunk_rows)
+    else:
+        chunks = (apply_column_mapping_and_clean(chunk, mappings) for chunk in iter_chunks(dataset.data, chunk_rows))
+    for chunk in chunks:
+        yield chunk if 'status' in chunk.columns else _apply_layer1_validation(chunk)
+
+@app.errorhandler(413)
+def request_too_large(e):
+    return jsonify({'error': f"Request body exceeds the {app.config['MAX_CONTENT_LENGTH']} byte limit"}), 413
+
+@app.route('/export', methods=['GET'])
+def export_results():
+    """Stream the full analysis result as CSV, NDJSON or Parquet."""
+    _, dataset = _session_dataset()
+    analysis_df = dataset.analysis_data
+    
+    if analysis_df is None:
+        return jsonify({'error': 'No analysis results available'}), 400
+    
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f'format must be one of {sorted(EXPORT_FORMATS)}'}), 400
+    if export_format == 'parquet' and not parquet_available():
+        return jsonify({'error': 'Parquet export requires pyarrow'}), 400
+    
+    statuses = [s for s in request.args.get('status', '').split(',') if s]
+    if any(status not in STATUSES for status in statuses):
+        return jsonify({'error': f'status must be one of {list(STATUSES)}'}), 400
+    positions = filter_positions(analysis_df, statuses) if statuses else None
+    
+    generate, mimetype, extension = EXPORT_FORMATS[export_format]
+    return Response(
+        stream_with_context(generate(analysis_df, positions, app.config['EXPORT_CHUNK_ROWS'])),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=doctor31_results.{extension}'}
+    )
+
+@app.route('/models', methods=['GET'])
+def list_models():
+    return jsonify({
+        'models': model_store.list_models(),
+        'active_model': model_store.active_model_id()
+    })
+
+@app.route('/models/train', methods=['POST'])
+def train_model():
+    """Train a named model on the current session's dataset."""
+    payload = request.json or {}
+    session_id, dataset = _session_dataset()
+    
+    if not _has_upload(dataset):
+        return jsonify({'error': 'No data or column mappings available'}), 400
+    if not payload.get('name'):
+        return jsonify({'error': 'A model name is required'}), 400
+    
+    try:
+        if dataset.processed_data is None:
+            dataset.processed_data = _load_processed_data(dataset)
+            dataset_store.save(session_id, dataset)
         
+        model = _fit_reference_model(dataset.processed_data.copy(deep=False))
+        model_id = model_store.save_model(payload['name'], model)
+        if payload.get('select'):
+            model_store.select_model(model_id)
+        return jsonify({'message': 'Model trained', 'model': model_metadata(model_store.load_model(model_id))})
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
-def _validate_required_columns(analysis_df):
-    """Validate that required columns are available for analysis."""
+@app.route('/models/select', methods=['POST'])
+def select_model():
+    """Select the model used to score new batches; null restores per-dataset fitting."""
+    model_id = (request.json or {}).get('model_id')
+    try:
+        model_store.select_model(model_id)
+    except (KeyError, ValueError) as e:
+        return jsonify({'error': e.args[0]}), 400
+    return jsonify({'message': 'Model selected', 'active_model': model_id})
+
+def _check_required_columns(analysis_df):
+    """Raise ValueError if none of the required columns are available for analysis."""
     required_cols = ['age', 'weight', 'height', 'bmi']
     available_cols = [col for col in required_cols if col in analysis_df.columns]
     
     if not available_cols:
-        return jsonify({
-            'error': f'None of the required columns ({required_cols}) are available after mapping. Available columns: {analysis_df.columns.tolist()}'
-        }), 400
-    
-    return None
+        raise ValueError(
+            f'None of the required columns ({required_cols}) are available after mapping. Available columns: {analysis_df.columns.tolist()}'
+        )
 
+@stage_metrics.timed('layer1')
 def _apply_layer1_validation(analysis_df):
-    """Apply Layer 1 - classic validation rules."""
-    analysis_df['status'] = None
-    analysis_df['color'] = None
-    
-    for idx, row in analysis_df.iterrows():
-        bmi_c = row.get("bmi_calculated")
-        age = row.get("age")
-        height = row.get("height")
-        weight = row.get("weight")
-        status, color = validate_row(bmi_c, age, height, weight)
-        analysis_df.at[idx, "status"] = status
-        analysis_df.at[idx, "color"] = color
+    """Apply Layer 1 - the configured validation rule set, recording the rule that fired."""
+    status, rule = load_rules(app.config['RULES']).classify(
+        _column_or_nan(analysis_df, 'bmi_calculated'),
+        _column_or_nan(analysis_df, 'age'),
+        _column_or_nan(analysis_df, 'height'),
+        _column_or_nan(analysis_df, 'weight')
+    )
+    analysis_df['status'] = status
+    analysis_df['rule'] = rule
     
     return analysis_df
 
-def _apply_layer2_isolation_forest(analysis_df):
-    """Apply Layer 2 - Isolation Forest anomaly detection."""
+@stage_metrics.timed('duplicates')
+def _apply_duplicate_detection(analysis_df, digest=None):
+    """Flag repeated rows within the frame and, given its upload digest, rows of earlier uploads."""
+    tag = upload_tag(digest) if digest is not None else None
+    analysis_df['duplicate'] = flag_duplicates(analysis_df, duplicate_index, tag)
+    return analysis_df
+
+def _column_or_nan(df, col):
+    """Return a column as values, or an all-NaN array when it is not mapped."""
+    if col in df.columns:
+        return df[col].to_numpy()
+    return np.full(len(df), np.nan)
+
+def _apply_layer2_isolation_forest(analysis_df, model=None):
+    """Apply Layer 2 - Isolation Forest anomaly detection.
+
+    With model, rows are scored against it instead of the selected or a freshly fitted one.
+    """
     required_cols = ['age', 'weight', 'height', 'bmi']
     available_cols = [col for col in required_cols if col in analysis_df.columns]
     
@@ -212,62 +897,174 @@ def _apply_layer2_isolation_forest(analysis_df):
 
     complete_data = analysis_df.loc[:, available_cols].dropna()
 
-    if len(complete_data) < 2:
+    # A given model can score any number of rows; fitting one needs at least two
+    if len(complete_data) == 0 or (model is None and len(complete_data) < 2):
         return analysis_df
     
-    # Train and apply Isolation Forest
-    isolation_results = _train_isolation_forest(analysis_df, complete_data, available_cols)
+    # Score with the selected model, or train one for this dataset
+    isolation_results = _score_isolation_forest(analysis_df, complete_data, model)
     analysis_df = _apply_isolation_results(analysis_df, complete_data, isolation_results)
+    analysis_df.attrs['layer2_timings'] = isolation_results['timings']
+    analysis_df.attrs['layer2_model'] = isolation_results['model_ref']
+    analysis_df.attrs['layer2_cohorts'] = isolation_results.get('cohorts')
     
     return analysis_df
 
-def _train_isolation_forest(analysis_df, complete_data, available_cols):
-    """Train Isolation Forest model and return results."""
-    scaler = StandardScaler()
-    x_scaled = scaler.fit_transform(complete_data)
+def _score_isolation_forest(analysis_df, complete_data, model=None):
+    """Score rows with the selected reference model, falling back to a per-dataset fit."""
+    fit_timings = {}
+    model_ref = None
+    if model is None:
+        model_id = model_store.active_model_id()
+        if model_id is not None:
+            model, model_ref = model_store.load_model(model_id), {'model_id': model_id}
+        elif app.config['LAYER2_COHORTS']:
+            return _train_cohort_models(analysis_df, complete_data)
+        else:
+            model, model_ref, fit_timings = _train_isolation_forest(analysis_df, complete_data)
+    with stage_metrics.stage('layer2_score', len(complete_data)):
+        if 'cohorts' in model:
+            results = score_cohort_model(model, complete_data, _model_cohort_labels(analysis_df, complete_data, model),
+                                         layer2_engine)
+        else:
+            results = score_model(model, complete_data, layer2_engine)
+    results['timings'] = {**fit_timings, **results['timings']}
+    results['model_ref'] = model_ref
+    return results
+
+def _train_isolation_forest(analysis_df, complete_data):
+    """Train Isolation Forest model, reusing the cached fit of identical data.
+
+    Returns (model, {'fingerprint': ...}, fit timings); the timings are empty
+    when the cached fit was reused.
+    """
+    fit_data = _without_repeats(analysis_df, complete_data)
+    contamination = _estimate_contamination(analysis_df, fit_data)
+    fingerprint = data_fingerprint(fit_data, contamination, layer2_engine)
+    model_ref = {'fingerprint': fingerprint}
     
-    # Create target labels based on Layer 1 validation
-    layer1_labels = [
-        1 if analysis_df.loc[idx, 'status'] == 'Valid' else -1 
-        for idx in complete_data.index
-    ]
+    model = model_store.cached_fit(fingerprint)
+    if model is not None:
+        return model, model_ref, {}
     
-    # Calculate contamination based on Layer 1 results
-    invalid_ratio = sum(1 for label in layer1_labels if label == -1) / len(layer1_labels)
-    contamination = max(0.01, min(0.5, invalid_ratio))
+    with stage_metrics.stage('layer2_fit', len(fit_data)):
+        model = fit_model(fit_data, contamination, layer2_engine)
+    model_store.cache_fit(fingerprint, model)
+    return model, model_ref, model['fit_timings']
+
+def _train_cohort_models(analysis_df, complete_data):
+    """Fit and score one model per cohort, reusing the cached fit of identical data."""
+    model, fingerprint, results = _fit_cohort_models(analysis_df, complete_data)
+    if results is None:
+        with stage_metrics.stage('layer2_score', len(complete_data)):
+            results = score_cohort_model(model, complete_data, _model_cohort_labels(analysis_df, complete_data, model),
+                                         layer2_engine)
+    results['model_ref'] = {'fingerprint': fingerprint}
+    return results
+
+def _fit_cohort_models(analysis_df, complete_data):
+    """Return (cohort model, fingerprint, results of scoring complete_data, or None for a cached fit)."""
+    settings = _cohort_settings()
+    by_sex = 'sex' in analysis_df.columns
+    labels = _cohort_labels(analysis_df, complete_data, settings['age_bands'], by_sex)
+    invalid = (analysis_df['status'].reindex(complete_data.index) != 'Valid').to_numpy()
+    partitions = cohort_partitions(labels, invalid, ~_repeat_mask(analysis_df, complete_data), settings['min_rows'])
+    if not partitions:
+        raise ValueError('No cohort has the two complete rows a Layer 2 model needs')
+    fingerprint = cohort_fingerprint(complete_data, partitions, settings['age_bands'], by_sex, layer2_engine)
+
+    model = model_store.cached_fit(fingerprint)
+    if model is not None:
+        return model, fingerprint, None
+    with stage_metrics.stage('layer2_fit', len(complete_data)):
+        model, results = fit_cohort_model(complete_data, labels, partitions, settings['age_bands'], by_sex,
+                                          layer2_engine)
+    model_store.cache_fit(fingerprint, model)
+    return model, fingerprint, results
+
+def _cohort_labels(analysis_df, complete_data, age_bands, by_sex):
+    """Cohort of each complete row."""
+    age = complete_data['age'] if 'age' in complete_data.columns else np.full(len(complete_data), np.nan)
+    sex = analysis_df['sex'].reindex(complete_data.index) if by_sex and 'sex' in analysis_df.columns else None
+    return cohort_labels(age, sex, age_bands)
+
+def _model_cohort_labels(analysis_df, complete_data, model):
+    """Cohort of each complete row under the age bands and sex split a cohort model was fit with."""
+    return _cohort_labels(analysis_df, complete_data, model['age_bands'], model['by_sex'])
+
+def _cohort_settings():
+    """Cohort partitioning settings, or None when Layer 2 fits one model for all rows."""
+    if not app.config['LAYER2_COHORTS']:
+        return None
+    return {'age_bands': list(app.config['LAYER2_AGE_BANDS']), 'min_rows': app.config['LAYER2_COHORT_MIN_ROWS']}
+
+def _repeat_mask(analysis_df, complete_data):
+    """Complete rows that repeat an earlier row of the file, which would weigh double in a fit."""
+    if 'duplicate' not in analysis_df.columns:
+        return np.zeros(len(complete_data), dtype=bool)
+    repeat = analysis_df['duplicate'].reindex(complete_data.index).isin(REPEAT_KINDS).to_numpy()
+    if np.count_nonzero(~repeat) < 2:
+        return np.zeros(len(complete_data), dtype=bool)
+    return repeat
+
+def _without_repeats(analysis_df, complete_data):
+    """Complete rows other than repeats within the file."""
+    return complete_data[~_repeat_mask(analysis_df, complete_data)]
+
+def _estimate_contamination(analysis_df, complete_data):
+    """Derive the expected anomaly ratio from Layer 1 results."""
+    # Share of complete rows that Layer 1 did not mark Valid
+    return layer1_contamination((analysis_df['status'].reindex(complete_data.index) != 'Valid').to_numpy())
+
+def train_reference_model(df, mappings):
+    """Clean a reference dataset, run Layer 1 and fit a reusable Layer 2 model."""
+    analysis_df = apply_column_mapping_and_clean(df, mappings)
+    return _fit_reference_model(analysis_df)
+
+def _fit_reference_model(analysis_df):
+    required_cols = ['age', 'weight', 'height', 'bmi']
+    available_cols = [col for col in required_cols if col in analysis_df.columns]
+    if 'status' not in analysis_df.columns:
+        analysis_df = _apply_layer1_validation(analysis_df)
     
-    isolation_forest = IsolationForest(
-        contamination=contamination,
-        random_state=123,
-        n_estimators=200
-    )
+    if 'duplicate' not in analysis_df.columns:
+        analysis_df = _apply_duplicate_detection(analysis_df)
     
-    isolation_forest.fit(x_scaled)
+    complete_data = analysis_df.loc[:, available_cols].dropna()
+    if len(complete_data) < 2:
+        raise ValueError('At least two complete rows are needed to train a model')
     
-    return {
-        'predictions': isolation_forest.predict(x_scaled),
-        'scores': isolation_forest.decision_function(x_scaled),
-        'contamination': contamination
-    }
+    if app.config['LAYER2_COHORTS']:
+        return _fit_cohort_models(analysis_df, complete_data)[0]
+    fit_data = _without_repeats(analysis_df, complete_data)
+    return fit_model(fit_data, _estimate_contamination(analysis_df, fit_data), layer2_engine)
 
 def _apply_isolation_results(analysis_df, complete_data, isolation_results):
     """Apply Isolation Forest results to the dataframe."""
     analysis_df.loc[complete_data.index, 'isolation_score'] = isolation_results['scores']
     analysis_df.loc[complete_data.index, 'anomaly'] = isolation_results['predictions']
     
-    # Update status based on combined Layer 1 + Layer 2 results
-    for idx in complete_data.index:
-        layer1_status = analysis_df.loc[idx, 'status']
-        isolation_anomaly = analysis_df.loc[idx, 'anomaly']
-        
-        if layer1_status == 'Valid' and isolation_anomaly == -1:
-            analysis_df.loc[idx, 'status'] = 'Anomaly'
-            analysis_df.loc[idx, 'color'] = 'red'
+    # Update status based on combined Layer 1 + Layer 2 results; rows that were
+    # not scored have a NaN anomaly and never match
+    promote = (analysis_df['status'] == 'Valid').to_numpy() & (analysis_df['anomaly'].to_numpy() == -1)
+    analysis_df.loc[promote, 'status'] = 'Anomaly'
     
     return analysis_df
 
-def _generate_analysis_results(analysis_df):
-    """Generate final analysis results and summary."""
+def _analysis_payload(analysis_df):
+    """Response body of a finished analysis: 200-row preview plus summary."""
+    # Reorder columns for display
+    analysis_df = _reorder_columns_for_display(analysis_df)
+    
+    # The preview stays a frame until _json_response encodes it in the requested layout
+    return {
+        'message': 'Analysis complete',
+        'preview': analysis_df.head(200),
+        **_analysis_summary(analysis_df)
+    }
+
+def _analysis_summary(analysis_df):
+    """Status counts and headline metrics of an analyzed frame."""
     status_counts = analysis_df['status'].value_counts()
     status_colors = {
         'Valid': '#d1e7dd',
@@ -288,28 +1085,39 @@ def _generate_analysis_results(analysis_df):
     total_rows = len(analysis_df)
     anomaly_count = int(status_counts.get('Anomaly', 0))
     percent_anomaly = round(anomaly_count * 100 / total_rows, 2) if total_rows > 0 else 0
-
-    # Reorder columns for display
-    analysis_df = _reorder_columns_for_display(analysis_df)
-    preview = _records_safe(analysis_df.head(200))
     
     # Count final valid rows after both validation layers
-    final_valid_count = len(analysis_df[analysis_df['status'] == 'Valid'])
+    final_valid_count = int(status_counts.get('Valid', 0))
     
     required_cols = ['age', 'weight', 'height', 'bmi']
     available_cols = [col for col in required_cols if col in analysis_df.columns]
     missing_cols = [col for col in required_cols if col not in analysis_df.columns]
     
-    return jsonify({
-        'message': 'Analysis complete',
-        'preview': preview,
+    return {
         'summary': summary,
         'percent_anomaly': percent_anomaly,
         'total_analyzed': final_valid_count,
         'total_rows': total_rows,
         'available_columns': available_cols,
-        'missing_columns': missing_cols
-    })
+        'missing_columns': missing_cols,
+        'rule_counts': _rule_counts(analysis_df),
+        'duplicate_counts': _duplicate_counts(analysis_df),
+        'parse_failures': analysis_df.attrs.get('parse_failures', {}),
+        'layer2_timings': analysis_df.attrs.get('layer2_timings'),
+        'layer2_cohorts': analysis_df.attrs.get('layer2_cohorts')
+    }
+
+def _rule_counts(analysis_df):
+    """Rows each Layer 1 rule fired on; a row counts towards its first firing rule only."""
+    if 'rule' not in analysis_df.columns:
+        return {}
+    return {str(rule): int(count) for rule, count in analysis_df['rule'].value_counts(sort=False).items()}
+
+def _duplicate_counts(analysis_df):
+    """Rows flagged with each duplicate kind."""
+    if 'duplicate' not in analysis_df.columns:
+        return {}
+    return {str(kind): int(count) for kind, count in analysis_df['duplicate'].value_counts(sort=False).items()}
 
 def _reorder_columns_for_display(analysis_df):
     """Reorder columns to show most important ones first."""
@@ -336,21 +1144,36 @@ def create_app():
     """Create and configure the Flask application."""
     return app
 
+def prewarm():
+    """Load the Layer 2 dependencies on a background thread; returns the thread."""
+    def load():
+        with stage_metrics.stage('prewarm'):
+            preload()
+
+    thread = threading.Thread(target=load, name='doctor31-prewarm', daemon=True)
+    thread.start()
+    return thread
+
+def serve(port, open_browser=True):
+    """Serve the app on 127.0.0.1:port, opening the browser as soon as the socket listens."""
+    server = make_server('127.0.0.1', port, app, threaded=True)
+    # Connections queue on the bound socket until serve_forever() picks them up
+    if app.config['PREWARM']:
+        prewarm()
+    if open_browser:
+        threading.Thread(target=webbrowser.open, args=(f'http://127.0.0.1:{server.server_port}',),
+                         daemon=True).start()
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
 if __name__ == '__main__':
     try:
         port = find_free_port()
         print(f"🚀 Doctor31 Data Validation Tool starting on port {port}")
         print(f"🌐 Open your browser to: http://127.0.0.1:{port}")
-        
-        def open_browser():
-            time.sleep(1.5)
-            webbrowser.open(f'http://127.0.0.1:{port}')
-        
-        browser_thread = threading.Thread(target=open_browser)
-        browser_thread.daemon = True
-        browser_thread.start()
-        
-        app.run(host='127.0.0.1', port=port, debug=False)
+        serve(port)
     except KeyboardInterrupt:
         print("\n👋 Server stopped by user")
     except Exception as e:
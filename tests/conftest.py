@@ -0,0 +1,30 @@
+import pytest
+from src import web_gui
+from src.duplicates import DuplicateIndex
+from src.model_store import ModelStore
+from src.result_cache import ResultCache
+
+
+@pytest.fixture(autouse=True)
+def isolated_model_store(tmp_path, monkeypatch):
+    """Keep trained models and cached fits out of the source tree during tests."""
+    store = ModelStore(str(tmp_path / 'models'))
+    monkeypatch.setattr(web_gui, 'model_store', store)
+    return store
+
+
+@pytest.fixture(autouse=True)
+def isolated_result_cache(tmp_path, monkeypatch):
+    """Give every test an empty result cache so earlier tests never turn its analyses into cache hits."""
+    cache = ResultCache(str(tmp_path / 'results'), 1024 ** 3)
+    monkeypatch.setattr(web_gui, 'result_cache', cache)
+    return cache
+
+
+@pytest.fixture(autouse=True)
+def isolated_duplicate_index(tmp_path, monkeypatch):
+    """Give every test an empty duplicate index so rows of earlier tests are never resubmissions."""
+    index = DuplicateIndex(str(tmp_path / 'duplicates'))
+    monkeypatch.setattr(web_gui, 'duplicate_index', index)
+    return index
+
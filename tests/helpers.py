@@ -0,0 +1,41 @@
+"""Upload frames and request helpers shared by the endpoint tests."""
+import io
+import numpy as np
+import pandas as pd
+from src.web_gui import DEFAULT_COLUMN_MAPPING
+
+
+def reference_frame(rows=200, seed=0):
+    """Rows with only the measurement columns of the default mapping."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'age_v': rng.integers(18, 90, rows),
+        'greutate': rng.normal(75, 10, rows).round(1),
+        'inaltime': rng.normal(172, 8, rows).round(1),
+        'IMC': rng.normal(25, 3, rows).round(1),
+    })
+
+
+def upload_frame(rows=200, seed=0):
+    """A full upload: measurements, case ids, two date and completion columns and an alternative weight."""
+    frame = reference_frame(rows, seed)
+    frame['id_cases'] = np.arange(rows) + seed * 10_000
+    frame['data1'] = '2024-01-01 10:00:00'
+    frame['data2'] = '2024-02-01 10:00:00'
+    frame['greutate_kg'] = frame['greutate'] + 1
+    frame['finalizat'] = 'da'
+    frame['finalizat_v2'] = 'nu'
+    return frame
+
+
+def post_csv(client, url, frame, **form):
+    """Post a frame to url as the CSV file of a multipart form."""
+    return client.post(url, data={'file': (io.BytesIO(frame.to_csv(index=False).encode()), 'data.csv'), **form},
+                       content_type='multipart/form-data')
+
+
+def upload_and_analyze(client, frame, mappings=DEFAULT_COLUMN_MAPPING, **form):
+    """Upload a frame, map its columns and return the /analyze payload."""
+    post_csv(client, '/upload', frame, **form)
+    client.post('/map-columns', json=mappings)
+    return client.post('/analyze').get_json()
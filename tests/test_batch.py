@@ -0,0 +1,47 @@
+import json
+import numpy as np
+import pandas as pd
+from src.batch import expand_inputs, main
+from src.web_gui import DEFAULT_COLUMN_MAPPING
+
+
+def _write_export(path, rows=60, seed=0):
+    rng = np.random.default_rng(seed)
+    pd.DataFrame({
+        'age_v': rng.integers(10, 110, rows),
+        'greutate': rng.normal(75, 15, rows).round(1),
+        'inaltime': rng.normal(170, 12, rows).round(1),
+        'IMC': rng.normal(25, 4, rows).round(1),
+    }).to_csv(path, index=False)
+
+
+def test_expand_inputs_globs_and_dedupes(tmp_path):
+    """Globs expand to sorted unique paths"""
+    for name in ('b.csv', 'a.csv'):
+        (tmp_path / name).write_text('x\n')
+    pattern = str(tmp_path / '*.csv')
+    assert expand_inputs([pattern, str(tmp_path / 'a.csv')]) == [str(tmp_path / 'a.csv'), str(tmp_path / 'b.csv')]
+
+
+def test_batch_validates_files_in_parallel(tmp_path):
+    """Every input gets an annotated output and a summary entry"""
+    for seed in range(3):
+        _write_export(tmp_path / f'export_{seed}.csv', seed=seed)
+    (tmp_path / 'broken.csv').write_text('unrelated\n1\n')
+    mapping_path = tmp_path / 'mapping.json'
+    mapping_path.write_text(json.dumps(DEFAULT_COLUMN_MAPPING))
+    out_dir = tmp_path / 'out'
+
+    exit_code = main([str(tmp_path / '*.csv'), '--mapping', str(mapping_path), '--output-dir', str(out_dir),
+                      '--workers', '2', '--model-dir', str(tmp_path / 'models')])
+
+    summary = json.loads((out_dir / 'summary.json').read_text())
+    assert exit_code == 1
+    assert summary['total_files'] == 4 and summary['failed_files'] == 1
+    assert summary['total_rows'] == 180 and summary['statistics']['rows'] == 180
+
+    annotated = pd.read_csv(out_dir / 'export_0_validated.csv')
+    assert len(annotated) == 60
+    assert {'status', 'color', 'isolation_score', 'anomaly'} <= set(annotated.columns)
+    counts = {entry['status']: entry['count'] for entry in summary['files'][1]['summary']}
+    assert counts['Valid'] + counts['Anomaly'] + counts['Warning'] == 60
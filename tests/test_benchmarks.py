@@ -0,0 +1,59 @@
+import json
+from benchmarks.bench_pipeline import STAGES, compare_to_baseline, main, make_dataset, run_pipeline
+from src import web_gui
+from src.web_gui import DEFAULT_COLUMN_MAPPING
+
+
+# =============================================================================
+# SYNTHETIC DATA TESTS
+# =============================================================================
+def test_dataset_has_mapping_schema_and_rates():
+    """Synthetic data uses the default export columns and honours the missing rate"""
+    raw_df = make_dataset(20_000, missing_rate=0.1, outlier_rate=0.05)
+    assert set(raw_df.columns) == set(DEFAULT_COLUMN_MAPPING.values())
+    assert len(raw_df) == 20_000
+    assert abs(raw_df['greutate'].isna().mean() - 0.1) < 0.01
+    assert (raw_df['greutate'] > 1000).any() and (raw_df['inaltime'] < 3).any()
+
+
+def test_dataset_is_reproducible():
+    """The same seed gives the same dataset"""
+    assert make_dataset(500).equals(make_dataset(500))
+
+
+# =============================================================================
+# MEASUREMENT TESTS
+# =============================================================================
+def test_pipeline_measures_every_stage():
+    """Each stage is timed and traced, and the shared model store is restored"""
+    store = web_gui.model_store
+    measurements = run_pipeline(make_dataset(1000), trace_memory=True)
+    assert list(measurements) == list(STAGES)
+    assert all(values['seconds'] >= 0 and values['peak_mb'] > 0 for values in measurements.values())
+    assert web_gui.model_store is store
+
+
+def test_regressions_beyond_tolerance_fail():
+    """Only stages slower or larger than baseline by more than the tolerance are reported"""
+    baseline = {'1000': {'clean': {'seconds': 1.0, 'peak_mb': 100.0},
+                         'layer2': {'seconds': 2.0, 'peak_mb': 50.0}}}
+    results = {'1000': {'clean': {'seconds': 1.2, 'peak_mb': 100.0},
+                        'layer2': {'seconds': 3.0, 'peak_mb': 80.0}},
+               '5000': {'clean': {'seconds': 9.0, 'peak_mb': 900.0}}}
+
+    regressions = compare_to_baseline(results, baseline, tolerance=0.25)
+    assert len(regressions) == 2
+    assert all(message.startswith('layer2 at 1000 rows') for message in regressions)
+    assert compare_to_baseline(results, baseline, tolerance=1.0) == []
+
+
+def test_cli_fails_against_faster_baseline(tmp_path):
+    """The command line exits non-zero when the baseline is much faster"""
+    baseline_path = tmp_path / 'baseline.json'
+    assert main(['--rows', '2000', '--repeat', '1', '--baseline', str(baseline_path), '--save-baseline']) == 0
+
+    baseline = json.loads(baseline_path.read_text())
+    baseline['results']['2000']['layer2']['seconds'] = 0.0
+    baseline_path.write_text(json.dumps(baseline))
+
+    assert main(['--rows', '2000', '--repeat', '1', '--baseline', str(baseline_path)]) == 1
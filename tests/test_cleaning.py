@@ -0,0 +1,103 @@
+import io
+import numpy as np
+import pandas as pd
+from hypothesis import given, strategies as st
+from src import web_gui
+from src.web_gui import app, apply_column_mapping_and_clean, DEFAULT_COLUMN_MAPPING
+
+
+def _legacy_numeric(column):
+    """The former string round-trip, kept as the reference behaviour."""
+    column = column.astype(str).replace(r'^\s*$', np.nan, regex=True)
+    return pd.to_numeric(column, errors='coerce')
+
+
+# =============================================================================
+# NUMERIC CLEANING TESTS
+# =============================================================================
+class TestCleanNumeric:
+    def test_numeric_source_is_not_converted(self):
+        """Columns that are already numeric are used as they are"""
+        column = pd.Series([70.5, np.nan, 80.0])
+        values, failures = web_gui._clean_numeric(column)
+        assert values is column and failures == 0
+
+    def test_text_failures_exclude_blanks(self):
+        """Unparseable text counts as a failure; blank and missing cells do not"""
+        values, failures = web_gui._clean_numeric(pd.Series([' 42 ', '', '   ', 'abc', None, '3.5', '7kg']))
+        np.testing.assert_array_equal(values, [42.0, np.nan, np.nan, np.nan, np.nan, 3.5, np.nan])
+        assert failures == 2
+
+
+@given(st.lists(st.one_of(
+    st.floats(allow_nan=False, allow_infinity=False).map(str),
+    st.integers(-1000, 1000).map(lambda i: f' {i} '),
+    st.sampled_from(['', '  ', 'n/a', 'x1', '1,5']),
+    st.none()
+), min_size=1, max_size=30))
+def test_property_numeric_matches_string_round_trip(raw):
+    """Direct parsing gives the same numbers as the former astype(str) round-trip"""
+    column = pd.Series(raw, dtype=object)
+    values, _ = web_gui._clean_numeric(column)
+    np.testing.assert_array_equal(values.to_numpy(dtype=float), _legacy_numeric(column).to_numpy(dtype=float))
+
+
+# =============================================================================
+# DATE CLEANING TESTS
+# =============================================================================
+class TestCleanDate:
+    def test_dates_stay_datetime64(self):
+        """Dates are parsed once with the inferred format and kept as datetime64"""
+        values, failures = web_gui._clean_date(pd.Series(['2024-01-02 10:00:00', '', 'not a date', None]))
+        assert values.dtype.kind == 'M'
+        assert values[0] == pd.Timestamp('2024-01-02 10:00:00')
+        assert values[1:].isna().all()
+        assert failures == 1
+
+    def test_configured_format_wins(self, monkeypatch):
+        """DOCTOR31_DATE_FORMAT overrides inference, e.g. for day-first exports"""
+        monkeypatch.setitem(app.config, 'DATE_FORMAT', '%d/%m/%Y')
+        values, failures = web_gui._clean_date(pd.Series(['02/01/2024', '31/12/2023']))
+        assert list(values) == [pd.Timestamp('2024-01-02'), pd.Timestamp('2023-12-31')]
+        assert failures == 0
+
+    def test_datetime_source_is_not_parsed(self):
+        """Datetime columns from Parquet or Excel are used as they are"""
+        column = pd.Series(pd.to_datetime(['2024-01-02']))
+        values, failures = web_gui._clean_date(column)
+        assert values is column and failures == 0
+
+
+# =============================================================================
+# PIPELINE TESTS
+# =============================================================================
+def _raw_frame():
+    return pd.DataFrame({
+        'id_cases': [1, 2, 3, 4],
+        'age_v': ['30', 'abc', '', '45'],
+        'greutate': [70.0, 80.0, 90.0, 65.0],
+        'inaltime': [170.0, 180.0, 175.0, 160.0],
+        'IMC': [24.2, 24.7, 29.4, 25.4],
+        'data1': ['2024-01-02 10:00:00', 'soon', '2024-03-04 08:30:00', None]
+    })
+
+
+def test_parse_failures_are_reported():
+    """The cleaned frame records failures per parsed column"""
+    cleaned = apply_column_mapping_and_clean(_raw_frame(), DEFAULT_COLUMN_MAPPING)
+    assert cleaned.attrs['parse_failures'] == {'age': 1, 'weight': 0, 'height': 0, 'bmi': 0, 'date': 1}
+
+
+def test_dates_are_formatted_only_on_output():
+    """Responses and CSV exports show dates in the familiar text format"""
+    client = app.test_client()
+    client.post('/upload', data={'file': (io.BytesIO(_raw_frame().to_csv(index=False).encode()), 'data.csv')},
+                content_type='multipart/form-data')
+    client.post('/map-columns', json=DEFAULT_COLUMN_MAPPING)
+    result = client.post('/analyze').get_json()
+
+    assert result['parse_failures']['date'] == 1
+    assert [row['date'] for row in result['preview']] == ['2024-01-02 10:00:00', None, '2024-03-04 08:30:00', None]
+    rows = client.get('/results?sort=date&order=desc').get_json()['rows']
+    assert [row['case_id'] for row in rows][:2] == [3, 1]
+    assert '2024-03-04 08:30:00' in client.get('/export?format=csv').get_data(as_text=True)
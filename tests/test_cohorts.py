@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+from benchmarks.bench_cohorts import make_cohort_data
+from src import web_gui
+from src.model_store import (POOLED_COHORT, Layer2Engine, cohort_labels, cohort_partitions, fit_cohort_model,
+                             fit_model, score_cohort_model, score_model)
+from src.web_gui import app
+from tests.helpers import post_csv, upload_and_analyze, upload_frame
+
+
+def _cohort_fit(rows=4000, engine=Layer2Engine(), min_rows=200):
+    complete_data, sex, invalid, planted = make_cohort_data(rows, outlier_rate=0.01)
+    labels = cohort_labels(complete_data['age'], sex)
+    partitions = cohort_partitions(labels, invalid, np.ones(rows, dtype=bool), min_rows)
+    bundle, results = fit_cohort_model(complete_data, labels, partitions, (18, 65), True, engine)
+    return complete_data, labels, planted, bundle, results
+
+
+def _sexed_frame(rows=600, seed=0):
+    frame = upload_frame(rows, seed)
+    frame['sex_v'] = np.where(np.arange(rows) % 2, 'm', 'F')
+    return frame
+
+
+# =============================================================================
+# PARTITION TESTS
+# =============================================================================
+def test_labels_combine_sex_and_age_band():
+    """Bands are closed on the left; missing ages and sexes get '?'"""
+    labels = cohort_labels([5, 18, 64.5, 65, np.nan], [' f', 'M', None, 'F', 'M'], (18, 65))
+    assert list(labels) == ['F <18', 'M 18-64', '? 18-64', 'F 65+', 'M ?']
+    assert list(cohort_labels([30, 70], age_bands=())) == ['all', 'all']
+
+
+def test_small_cohorts_are_pooled_with_their_own_contamination():
+    """Each cohort's contamination is its Layer 1 ratio; cohorts under min_rows share one model"""
+    labels = np.array(['F 18-64'] * 300 + ['M 18-64'] * 300 + ['F 65+'] * 50 + ['M 65+'] * 40, dtype=object)
+    invalid = np.zeros(len(labels), dtype=bool)
+    invalid[:60] = True
+    fit_rows = np.ones(len(labels), dtype=bool)
+    fit_rows[300:310] = False
+
+    partitions = cohort_partitions(labels, invalid, fit_rows, min_rows=100)
+    assert list(partitions) == ['F 18-64', 'M 18-64', POOLED_COHORT]
+    assert partitions['F 18-64'][1] == 0.2 and partitions['M 18-64'][1] == 0.01
+    assert len(partitions['M 18-64'][0]) == 290 and len(partitions[POOLED_COHORT][0]) == 90
+
+
+# =============================================================================
+# MODEL TESTS
+# =============================================================================
+def test_training_scores_match_a_separate_scoring_pass():
+    """Scores kept from the fit equal scoring the same rows afterwards"""
+    complete_data = make_cohort_data(2000)[0]
+    model, scores = fit_model(complete_data, 0.05, return_scores=True)
+    np.testing.assert_array_equal(scores, score_model(model, complete_data)['scores'])
+    assert model['forest'].contamination == 0.05
+
+
+def test_process_pool_matches_sequential_fit():
+    """Fitting cohorts on worker processes gives the same models and scores"""
+    complete_data, labels, _, bundle, results = _cohort_fit()
+    _, _, _, pooled_bundle, pooled_results = _cohort_fit(engine=Layer2Engine(cohort_workers=2))
+    np.testing.assert_array_equal(pooled_results['scores'], results['scores'])
+    rescored = score_cohort_model(pooled_bundle, complete_data, labels)
+    np.testing.assert_allclose(rescored['scores'], results['scores'])
+    assert set(bundle['cohorts']) == {'F <18', 'F 18-64', 'F 65+', 'M <18', 'M 18-64', 'M 65+'}
+
+
+def test_cohort_models_catch_outliers_of_their_own_cohort():
+    """Women with typical male measurements are flagged per cohort but not by one global model"""
+    complete_data, _, planted, _, results = _cohort_fit()
+    global_model = fit_model(complete_data, 0.05)
+    global_predictions = score_model(global_model, complete_data)['predictions']
+    assert np.mean(results['predictions'][planted] == -1) > 0.8
+    assert np.mean(global_predictions[planted] == -1) < 0.5
+
+
+# =============================================================================
+# PIPELINE TESTS
+# =============================================================================
+def test_analysis_reports_cohorts_and_scores_appends(monkeypatch):
+    """With LAYER2_COHORTS every complete row is scored by its cohort's model, also after an append"""
+    monkeypatch.setitem(app.config, 'LAYER2_COHORTS', True)
+    monkeypatch.setitem(app.config, 'LAYER2_COHORT_MIN_ROWS', 100)
+    client = app.test_client()
+    result = upload_and_analyze(client, _sexed_frame())
+    cohorts = result['layer2_cohorts']
+    assert set(cohorts) >= {'F 18-64', 'M 18-64'}
+    assert sum(cohort['rows'] for cohort in cohorts.values()) == 600
+
+    monkeypatch.setattr(web_gui, 'fit_cohort_model', lambda *args: pytest.fail('cohorts were refit'))
+    post_csv(client, '/append', _sexed_frame(rows=40, seed=1))
+    rows = client.get('/results?limit=40&offset=600').get_json()['rows']
+    assert all(row['isolation_score'] is not None for row in rows)
+
+
+def test_cohort_setting_changes_the_cache_key(monkeypatch):
+    """Switching cohorts on analyses the same upload afresh"""
+    client = app.test_client()
+    assert upload_and_analyze(client, _sexed_frame())['layer2_cohorts'] is None
+    monkeypatch.setitem(app.config, 'LAYER2_COHORTS', True)
+    result = upload_and_analyze(client, _sexed_frame())
+    assert result['cached'] is False and result['layer2_cohorts']
@@ -0,0 +1,139 @@
+import io
+import os
+import uuid
+import pandas as pd
+import pytest
+from src import dataset_store
+from src.dataset_store import DatasetStore
+from src.web_gui import app, DEFAULT_COLUMN_MAPPING
+
+
+def _session_id():
+    return uuid.uuid4().hex
+
+
+def _frame(rows):
+    return pd.DataFrame({'weight': [70.0] * rows, 'height': [175.0] * rows})
+
+
+# =============================================================================
+# LRU AND SPILL TESTS
+# =============================================================================
+class TestDatasetStore:
+    def test_lru_eviction_by_size(self):
+        """Least recently used sessions are evicted once the byte budget is exceeded"""
+        store = DatasetStore(max_bytes=_frame(1000).memory_usage(deep=True).sum() * 2)
+        first, second, third = _session_id(), _session_id(), _session_id()
+
+        for session_id in (first, second):
+            dataset = store.get(session_id)
+            dataset.data = _frame(1000)
+            store.save(session_id, dataset)
+        store.get(first)  # touch first so second becomes least recently used
+
+        dataset = store.get(third)
+        dataset.data = _frame(1000)
+        store.save(third, dataset)
+
+        assert first in store and third in store
+        assert second not in store
+        assert store.total_bytes() <= store.max_bytes
+
+    def test_spilled_session_reloads_after_eviction(self, tmp_path):
+        """An evicted session comes back from the spill directory"""
+        store = DatasetStore(max_bytes=1, spill_dir=str(tmp_path))
+        first, second = _session_id(), _session_id()
+
+        dataset = store.get(first)
+        dataset.data = _frame(10)
+        dataset.column_mappings = {'weight': 'greutate'}
+        store.save(first, dataset)
+        store.save(second, store.get(second))
+
+        assert first not in store
+        reloaded = store.get(first)
+        assert reloaded.column_mappings == {'weight': 'greutate'}
+        pd.testing.assert_frame_equal(reloaded.data, _frame(10))
+
+    def test_stores_sharing_spill_dir_see_updates(self, tmp_path):
+        """A second worker's store picks up changes saved by the first"""
+        worker_a = DatasetStore(max_bytes=10 ** 9, spill_dir=str(tmp_path), spill_format='feather')
+        worker_b = DatasetStore(max_bytes=10 ** 9, spill_dir=str(tmp_path), spill_format='feather')
+        session_id = _session_id()
+
+        worker_b.get(session_id)
+        dataset = worker_a.get(session_id)
+        dataset.processed_data = _frame(3)
+        worker_a.save(session_id, dataset)
+
+        assert len(worker_b.get(session_id).processed_data) == 3
+
+    def test_only_changed_frames_are_rewritten(self, tmp_path, monkeypatch):
+        """Saving again writes only the frames replaced since the last save, under new file names"""
+        written = []
+        write_frame = dataset_store.write_frame
+        monkeypatch.setattr(dataset_store, 'write_frame', lambda frame, base_path, fmt: (
+            written.append(base_path) or write_frame(frame, base_path, fmt)))
+        store = DatasetStore(max_bytes=10 ** 9, spill_dir=str(tmp_path))
+        session_id = _session_id()
+        dataset = store.get(session_id)
+        dataset.data = _frame(5)
+        store.save(session_id, dataset)
+        dataset.processed_data = _frame(3)
+        store.save(session_id, dataset)
+        store.save(session_id, dataset)
+
+        assert [os.path.basename(path).split('-')[0] for path in written] == ['data', 'processed_data']
+        assert sorted(os.listdir(tmp_path / session_id)) == sorted(
+            [os.path.basename(path) + '.parquet' for path in written] + ['meta.json'])
+        reloaded = DatasetStore(max_bytes=10 ** 9, spill_dir=str(tmp_path)).get(session_id)
+        assert reloaded.version == 3 and len(reloaded.data) == 5 and len(reloaded.processed_data) == 3
+
+    @pytest.mark.parametrize('spill_format', dataset_store.SPILL_FORMATS)
+    def test_spill_keeps_index_and_attrs(self, tmp_path, spill_format):
+        """Appended rows' index and attrs such as parse failures survive a spill in every format"""
+        frame = _frame(3).set_axis(pd.RangeIndex(5, 8))
+        frame.attrs['parse_failures'] = {'weight': 2}
+        fmt = dataset_store.write_frame(frame, str(tmp_path / 'frame'), spill_format)
+        reloaded = dataset_store.read_frame(str(tmp_path / 'frame'), fmt)
+        pd.testing.assert_frame_equal(reloaded, frame)
+        assert reloaded.attrs == {'parse_failures': {'weight': 2}}
+
+    def test_frames_are_measured_once(self, monkeypatch):
+        """Saving again measures only frames replaced since the last save"""
+        measured = []
+        memory_usage = pd.DataFrame.memory_usage
+        monkeypatch.setattr(pd.DataFrame, 'memory_usage', lambda frame, *args, **kwargs: (
+            measured.append(len(frame)) or memory_usage(frame, *args, **kwargs)))
+        store = DatasetStore(max_bytes=10 ** 9)
+        session_id = _session_id()
+        dataset = store.get(session_id)
+        dataset.data = _frame(5)
+        store.save(session_id, dataset)
+        dataset.processed_data = _frame(3)
+        store.save(session_id, dataset)
+        store.save(session_id, dataset)
+
+        assert measured == [5, 3]
+        assert store.total_bytes() == sum(int(_frame(rows).memory_usage(deep=True).sum()) for rows in (5, 3))
+
+    def test_rejects_untrusted_session_ids(self):
+        """Session ids are validated before touching the spill directory"""
+        with pytest.raises(ValueError):
+            DatasetStore(max_bytes=1).get('../etc')
+
+
+# =============================================================================
+# SESSION ISOLATION TESTS
+# =============================================================================
+def test_sessions_do_not_share_uploads():
+    """Two browser sessions keep independent datasets"""
+    first, second = app.test_client(), app.test_client()
+    csv = pd.DataFrame({'greutate': [70], 'inaltime': [175], 'age_v': [30], 'IMC': [22.9]}).to_csv(index=False)
+
+    first.post('/upload', data={'file': (io.BytesIO(csv.encode()), 'a.csv')},
+               content_type='multipart/form-data')
+    first.post('/map-columns', json=DEFAULT_COLUMN_MAPPING)
+
+    assert first.post('/preview').status_code == 200
+    assert second.post('/preview').status_code == 400
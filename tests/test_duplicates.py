@@ -0,0 +1,114 @@
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from src import web_gui
+from src.duplicates import DUPLICATE_KINDS, DuplicateIndex, flag_duplicates, upload_tag
+from src.web_gui import app
+from tests.helpers import upload_and_analyze, upload_frame
+
+
+def _visits(**overrides):
+    frame = pd.DataFrame({
+        'case_id': [1, 2, 3, 4],
+        'age': [30.0, 40.0, 50.0, 60.0],
+        'weight': [70.2, 80.0, 90.0, 65.0],
+        'height': [170.0, 180.0, 175.0, 160.0],
+        'date': pd.to_datetime(['2024-03-01 09:00', '2024-03-01 10:00', '2024-03-02 11:00', '2024-03-03 12:00'])
+    })
+    return frame.assign(**overrides)
+
+
+# =============================================================================
+# INDEX TESTS
+# =============================================================================
+def test_index_remembers_first_upload_and_persists(tmp_path):
+    """Keys report the tag of the upload that added them, also after reopening the index"""
+    index = DuplicateIndex(str(tmp_path / 'index'))
+    keys = np.arange(1, 1001, dtype=np.uint64)
+    assert (index.check_and_add(keys[:600], 5) == 5).all()
+
+    reopened = DuplicateIndex(str(tmp_path / 'index'))
+    first_seen = reopened.check_and_add(keys, 7)
+    assert (first_seen[:600] == 5).all() and (first_seen[600:] == 7).all()
+    assert len(reopened) == 1000
+
+
+def test_index_grows_and_handles_colliding_slots(tmp_path):
+    """Keys that share a home slot probe onwards, and growing the table keeps every entry"""
+    index = DuplicateIndex(str(tmp_path / 'index'), initial_slots=64)
+    colliding = (np.arange(1, 41, dtype=np.uint64) << np.uint64(32)) | np.uint64(3)
+    assert (index.check_and_add(colliding, 1) == 1).all()
+
+    spread = np.random.default_rng(0).integers(1, 2 ** 63, 5000, dtype=np.uint64)
+    index.check_and_add(spread, 2)
+    assert len(index) == 5040
+    assert (index.check_and_add(colliding, 3) == 1).all()
+    assert (index.check_and_add(spread, 3) == 2).all()
+
+
+def _add_range(path, start):
+    return DuplicateIndex(path, initial_slots=64).check_and_add(np.arange(start, start + 2000, dtype=np.uint64), start)
+
+
+def test_processes_share_the_index(tmp_path):
+    """Concurrent worker processes never lose each other's inserts"""
+    path = str(tmp_path / 'index')
+    with ProcessPoolExecutor(max_workers=4) as pool:
+        list(pool.map(_add_range, [path] * 4, [1, 2001, 4001, 6001]))
+    assert len(DuplicateIndex(path)) == 8000
+
+
+# =============================================================================
+# FLAGGING TESTS
+# =============================================================================
+def test_exact_and_near_repeats_within_a_file():
+    """Repeats keep their first row unflagged; near repeats differ only by rounding or time of day"""
+    frame = pd.concat([_visits(), _visits().iloc[[0]],
+                       _visits(weight=70.4, date=pd.Timestamp('2024-03-01 17:30')).iloc[[0]],
+                       _visits(case_id=99).iloc[[0]]], ignore_index=True)
+    flags = flag_duplicates(frame)
+    assert list(flags.astype(object)[4:]) == ['exact', 'near', np.nan]
+    assert flags[:4].isna().all()
+    assert list(flags.categories) == list(DUPLICATE_KINDS)
+
+
+def test_ids_match_across_types_and_missing_ids_never_match():
+    """7, 7.0 and '7' are one case; rows without a case_id or without the column are not flagged"""
+    numeric = flag_duplicates(pd.concat([_visits(case_id=[7, 2, 3, 4]), _visits(case_id=[7.0, 2, 3, 4])]))
+    text = flag_duplicates(pd.concat([_visits(case_id=['7', 'b', 'c', 'd']), _visits(case_id=[7, 'x', 'y', 'z'])]))
+    assert numeric[4] == 'exact' and text[4] == 'exact' and pd.isna(text[5])
+    assert flag_duplicates(pd.concat([_visits(case_id=None)] * 2)).isna().all()
+    assert flag_duplicates(pd.concat([_visits().drop(columns='case_id')] * 2)).isna().all()
+
+
+def test_rows_of_earlier_uploads_are_flagged(tmp_path):
+    """An upload repeating earlier rows is flagged against the index; its own re-analysis is not"""
+    index = DuplicateIndex(str(tmp_path / 'index'))
+    first, second = upload_tag('a' * 64), upload_tag('b' * 64)
+    assert flag_duplicates(_visits(), index, first).isna().all()
+    assert flag_duplicates(_visits(), index, first).isna().all()
+
+    resubmitted = pd.concat([_visits().iloc[:2], _visits(weight=[70.0, 80.3, 1.0, 2.0], case_id=[1, 2, 5, 6])])
+    flags = flag_duplicates(resubmitted, index, second)
+    assert list(flags.astype(object)) == ['exact_previous', 'exact_previous', 'near', 'near', np.nan, np.nan]
+
+
+# =============================================================================
+# PIPELINE TESTS
+# =============================================================================
+def test_analysis_flags_resubmissions_and_fits_without_repeats(monkeypatch):
+    """Duplicates are reported per upload, and Layer 2 is fit on the rows that are not repeats"""
+    client = app.test_client()
+    assert upload_and_analyze(client, upload_frame())['duplicate_counts']['exact'] == 0
+
+    fitted = []
+    fit_model = web_gui.fit_model
+    monkeypatch.setattr(web_gui, 'fit_model', lambda data, *args: fitted.append(len(data)) or fit_model(data, *args))
+    repeated = upload_frame(rows=100, seed=1)
+    frame = pd.concat([repeated, repeated.iloc[:30], upload_frame().iloc[:20]])
+    result = upload_and_analyze(client, frame)
+
+    assert result['duplicate_counts'] == {'exact': 30, 'exact_previous': 20, 'near': 0, 'near_previous': 0}
+    assert fitted == [120]
+    rows = client.get('/results?limit=200&offset=100').get_json()['rows']
+    assert [row['duplicate'] for row in rows[:2]] == ['exact', 'exact']
@@ -0,0 +1,77 @@
+import io
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from src.export import iter_csv, iter_ndjson, iter_parquet
+from src.web_gui import app, DEFAULT_COLUMN_MAPPING
+
+
+def _analysis_frame():
+    return pd.DataFrame({
+        'weight': np.array([70.5, np.nan, 90.0], dtype='float32'),
+        'date': ['2024-01-01 00:00:00', None, '2024-01-03 00:00:00'],
+        'status': ['Valid', 'Anomaly', 'Warning'],
+        'isolation_score': [0.1, np.nan, -0.05],
+    })
+
+
+# =============================================================================
+# SERIALIZER TESTS
+# =============================================================================
+class TestSerializers:
+    def test_csv_chunks_round_trip(self):
+        """Chunked CSV output parses back to the original rows"""
+        parts = list(iter_csv(_analysis_frame(), chunk_rows=1))
+        assert len(parts) == 4  # header plus one part per row
+        result = pd.read_csv(io.StringIO(''.join(parts)))
+        assert list(result['status']) == ['Valid', 'Anomaly', 'Warning']
+
+    def test_ndjson_writes_null(self):
+        """NDJSON emits one record per line with NaN as null"""
+        lines = ''.join(iter_ndjson(_analysis_frame(), chunk_rows=2)).splitlines()
+        assert len(lines) == 3
+        assert json.loads(lines[1])['isolation_score'] is None
+
+    def test_parquet_row_groups(self):
+        """Parquet output is readable, keeps a leading null date and gets colors from the statuses"""
+        pq = pytest.importorskip('pyarrow.parquet')
+        frame = _analysis_frame().iloc[[1, 0, 2]]
+        data = b''.join(iter_parquet(frame, chunk_rows=1))
+        table = pq.read_table(io.BytesIO(data))
+        assert table.num_rows == 3
+        assert pq.ParquetFile(io.BytesIO(data)).num_row_groups == 3
+        assert table.column('date').to_pylist()[0] is None
+        assert table.column_names[3] == 'color'
+        assert table.column('color').to_pylist() == ['red', 'green', 'orange']
+
+    def test_positions_subset(self):
+        """Only the requested row positions are written"""
+        text = ''.join(iter_csv(_analysis_frame(), positions=np.array([2])))
+        assert 'Warning' in text and 'Valid' not in text
+
+
+# =============================================================================
+# /export ENDPOINT TESTS
+# =============================================================================
+def test_export_streams_every_row(monkeypatch):
+    """The export contains all analyzed rows, not just the preview"""
+    monkeypatch.setitem(app.config, 'EXPORT_CHUNK_ROWS', 100)
+    rows = 350
+    df = pd.DataFrame({'age_v': [30] * rows, 'greutate': [70.0] * rows,
+                       'inaltime': [175.0] * rows, 'IMC': [22.9] * rows})
+    client = app.test_client()
+    client.post('/upload', data={'file': (io.BytesIO(df.to_csv(index=False).encode()), 'data.csv')},
+                content_type='multipart/form-data')
+    client.post('/map-columns', json=DEFAULT_COLUMN_MAPPING)
+    assert client.get('/export').status_code == 400
+    client.post('/analyze')
+
+    response = client.get('/export?format=csv')
+    assert response.is_streamed
+    assert 'attachment' in response.headers['Content-Disposition']
+    exported = pd.read_csv(io.BytesIO(response.get_data()))
+    assert len(exported) == rows
+    assert {'status', 'color', 'isolation_score', 'anomaly'} <= set(exported.columns)
+
+    assert client.get('/export?format=xml').status_code == 400
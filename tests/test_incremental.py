@@ -0,0 +1,146 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src import web_gui
+from src.web_gui import app, DEFAULT_COLUMN_MAPPING
+from tests.helpers import post_csv, upload_frame
+
+
+def _count_parses(monkeypatch):
+    calls = []
+    for parser, clean in list(web_gui.COLUMN_CLEANERS.items()):
+        monkeypatch.setitem(web_gui.COLUMN_CLEANERS, parser,
+                            lambda column, parser=parser, clean=clean: calls.append((column.name, parser)) or clean(column))
+    return calls
+
+
+# =============================================================================
+# REMAPPING TESTS
+# =============================================================================
+def test_cached_clean_matches_fresh_clean():
+    """Cleaning through the column cache gives the same frame as a fresh clean"""
+    frame = upload_frame()
+    cache = {}
+    web_gui.apply_column_mapping_and_clean(frame, DEFAULT_COLUMN_MAPPING, cache)
+    remapped = {**DEFAULT_COLUMN_MAPPING, 'date': 'data2'}
+    pd.testing.assert_frame_equal(web_gui.apply_column_mapping_and_clean(frame, remapped, cache),
+                                  web_gui.apply_column_mapping_and_clean(frame, remapped))
+
+
+def test_remapping_other_field_keeps_analysis(monkeypatch):
+    """Changing a mapping no analysis step reads parses nothing and keeps the analysis"""
+    client = app.test_client()
+    post_csv(client, '/upload', upload_frame())
+    client.post('/map-columns', json=DEFAULT_COLUMN_MAPPING)
+    before = client.post('/analyze').get_json()
+
+    calls = _count_parses(monkeypatch)
+    response = client.post('/map-columns', json={**DEFAULT_COLUMN_MAPPING, 'completed': 'finalizat_v2'}).get_json()
+
+    assert response['changed_fields'] == ['completed'] and response['analysis_kept']
+    assert calls == []
+    page = client.get('/results?limit=1').get_json()
+    assert page['rows'][0]['completed'] == 'nu'
+    assert page['total'] == before['total_rows']
+
+
+@pytest.mark.parametrize('field, column, cohorts', [('case_id', 'case_v2', False), ('date', 'data2', False),
+                                                    ('sex', 'sex_v2', True)])
+def test_remapping_duplicate_or_cohort_keys_drops_analysis(monkeypatch, field, column, cohorts):
+    """Case ids and dates feed duplicate flags, and sex feeds cohort models, so remapping them drops the analysis"""
+    monkeypatch.setitem(app.config, 'LAYER2_COHORTS', cohorts)
+    frame = pd.concat([upload_frame(rows=100)] * 2, ignore_index=True)
+    frame['case_v2'] = np.arange(200)
+    frame['sex_v'], frame['sex_v2'] = 'F', np.where(np.arange(200) % 2, 'M', 'F')
+    client = app.test_client()
+    post_csv(client, '/upload', frame)
+    client.post('/map-columns', json=DEFAULT_COLUMN_MAPPING)
+    assert client.post('/analyze').get_json()['duplicate_counts']['exact'] == 100
+
+    response = client.post('/map-columns', json={**DEFAULT_COLUMN_MAPPING, field: column}).get_json()
+    assert response['changed_fields'] == [field] and not response['analysis_kept']
+    assert client.get('/results').status_code == 400
+    if field == 'case_id':
+        assert client.post('/analyze').get_json()['duplicate_counts']['exact'] == 0
+
+
+def test_remapping_measurement_reparses_only_that_column(monkeypatch):
+    """Changing a measurement mapping drops the analysis and parses only the new column"""
+    client = app.test_client()
+    post_csv(client, '/upload', upload_frame())
+    client.post('/map-columns', json=DEFAULT_COLUMN_MAPPING)
+    client.post('/analyze')
+
+    calls = _count_parses(monkeypatch)
+    response = client.post('/map-columns', json={**DEFAULT_COLUMN_MAPPING, 'weight': 'greutate_kg'}).get_json()
+
+    assert not response['analysis_kept']
+    assert calls == [('weight', 'numeric')]
+    assert client.get('/results').status_code == 400
+    assert client.post('/analyze').get_json()['total_rows'] == 200
+
+
+# =============================================================================
+# APPEND TESTS
+# =============================================================================
+def test_append_scores_new_rows_without_refit(monkeypatch):
+    """Appended rows are validated alone and scored with the analysis' stored model"""
+    client = app.test_client()
+    post_csv(client, '/upload', upload_frame())
+    client.post('/map-columns', json=DEFAULT_COLUMN_MAPPING)
+    client.post('/analyze')
+
+    monkeypatch.setattr(web_gui, 'fit_model', lambda *args: pytest.fail('model was refit'))
+    cleaned_rows = []
+    clean = web_gui.apply_column_mapping_and_clean
+    monkeypatch.setattr(web_gui, 'apply_column_mapping_and_clean',
+                        lambda df, *args: cleaned_rows.append(len(df)) or clean(df, *args))
+    result = post_csv(client, '/append', upload_frame(rows=50, seed=1)).get_json()
+
+    assert result['appended_rows'] == 50 and result['total_rows'] == 250
+    assert cleaned_rows == [50]
+    assert sum(item['count'] for item in result['summary']) == 250
+
+    page = client.get('/results?offset=200&limit=50').get_json()
+    assert [row['case_id'] for row in page['rows']] == list(range(10_000, 10_050))
+    assert all(row['isolation_score'] is not None for row in page['rows'])
+
+
+def test_append_parses_each_new_column_once(monkeypatch):
+    """Appended rows are parsed once per mapped column, and the extended cache covers them on the next analysis"""
+    client = app.test_client()
+    post_csv(client, '/upload', upload_frame())
+    client.post('/map-columns', json=DEFAULT_COLUMN_MAPPING)
+    client.post('/analyze')
+
+    calls = _count_parses(monkeypatch)
+    post_csv(client, '/append', upload_frame(rows=50, seed=1))
+    assert sorted(calls) == [('age', 'numeric'), ('bmi', 'numeric'), ('date', 'date'),
+                             ('height', 'numeric'), ('weight', 'numeric')]
+
+    calls.clear()
+    assert client.post('/analyze').get_json()['total_rows'] == 250
+    assert calls == []
+
+
+def test_append_before_analysis_extends_data():
+    """Without an analysis, appended rows simply join the data analysed next"""
+    client = app.test_client()
+    post_csv(client, '/upload', upload_frame())
+    client.post('/map-columns', json=DEFAULT_COLUMN_MAPPING)
+    client.post('/preview')
+
+    assert post_csv(client, '/append', upload_frame(rows=20, seed=1)).get_json()['total_rows'] == 220
+    assert client.post('/analyze').get_json()['total_rows'] == 220
+
+
+def test_append_rejects_missing_columns_and_no_upload():
+    """Appending needs an upload and the same columns as it"""
+    client = app.test_client()
+    assert post_csv(client, '/append', upload_frame(rows=5)).status_code == 400
+
+    post_csv(client, '/upload', upload_frame())
+    client.post('/map-columns', json=DEFAULT_COLUMN_MAPPING)
+    response = post_csv(client, '/append', upload_frame(rows=5).drop(columns=['IMC']))
+    assert response.status_code == 400
+    assert 'IMC' in response.get_json()['error']
@@ -0,0 +1,146 @@
+import io
+import pandas as pd
+import pytest
+from src.ingestion import (iter_csv_chunks, compact_frame, concat_chunks, read_csv_columns,
+                           read_columns, read_mapped_columns, upload_format)
+from src.web_gui import app, DEFAULT_COLUMN_MAPPING
+
+
+def _sample_csv(rows=30):
+    """Build a small CSV in the default export layout plus an unmapped column."""
+    df = pd.DataFrame({
+        'id_cases': range(rows),
+        'age_v': [30 + i % 70 for i in range(rows)],
+        'sex_v': ['M' if i % 2 else 'F' for i in range(rows)],
+        'agreement': 1,
+        'greutate': [60 + i % 40 for i in range(rows)],
+        'inaltime': [150 + i % 40 for i in range(rows)],
+        'IMC': [22.5] * rows,
+        'data1': '2024-01-02 10:00:00',
+        'finalizat': 1,
+        'testing': 0,
+        'imcINdex': 1,
+        'unused_wide_column': 'x' * 50,
+    })
+    df.loc[3, 'greutate'] = None
+    df.loc[5, 'age_v'] = 150
+    return df.to_csv(index=False)
+
+
+# =============================================================================
+# CHUNK READER TESTS
+# =============================================================================
+class TestChunkReader:
+    def test_reads_only_mapped_columns(self):
+        """Unmapped source columns are never parsed"""
+        chunks = list(iter_csv_chunks(io.StringIO(_sample_csv()), DEFAULT_COLUMN_MAPPING, chunksize=7))
+        assert len(chunks) == 5
+        assert all('unused_wide_column' not in chunk.columns for chunk in chunks)
+
+    def test_header_only(self):
+        """read_csv_columns returns the header without reading rows"""
+        assert read_csv_columns(io.StringIO(_sample_csv()))[-1] == 'unused_wide_column'
+
+    def test_compact_dtypes_and_concat(self):
+        """Measurements become float32 and flags stay categorical across chunks"""
+        first = compact_frame(pd.DataFrame({'weight': [70.0], 'sex': ['M']}))
+        second = compact_frame(pd.DataFrame({'weight': [80.0], 'sex': ['F']}))
+        combined = concat_chunks([first, second])
+
+        assert combined['weight'].dtype == 'float32'
+        assert isinstance(combined['sex'].dtype, pd.CategoricalDtype)
+        assert list(combined['sex']) == ['M', 'F']
+
+
+# =============================================================================
+# COLUMNAR READER TESTS
+# =============================================================================
+def _write_sample(path):
+    df = pd.read_csv(io.StringIO(_sample_csv()))
+    fmt = upload_format(str(path))
+    if fmt == 'parquet':
+        df.to_parquet(path)
+    elif fmt == 'feather':
+        df.to_feather(path)
+    else:
+        df.to_excel(path, index=False)
+    return fmt
+
+
+@pytest.mark.parametrize('filename', ['data.parquet', 'data.feather', 'data.arrow', 'data.xlsx'])
+def test_columnar_reads_only_mapped_columns(tmp_path, filename):
+    """Schemas are read without data and only mapped columns are loaded"""
+    path = str(tmp_path / filename)
+    fmt = _write_sample(path)
+
+    assert read_columns(path, fmt)[-1] == 'unused_wide_column'
+    df = read_mapped_columns(path, fmt, DEFAULT_COLUMN_MAPPING)
+    assert sorted(df.columns) == sorted(DEFAULT_COLUMN_MAPPING.values())
+    assert len(df) == 30 and df['greutate'].isna().sum() == 1
+    assert len(read_mapped_columns(path, fmt, DEFAULT_COLUMN_MAPPING, nrows=5)) == 5
+
+
+def test_unknown_extension_is_rejected():
+    """Only the supported upload formats are accepted"""
+    assert upload_format('export.PARQUET') == 'parquet'
+    assert upload_format('export.json') is None
+    response = app.test_client().post('/upload', data={'file': (io.BytesIO(b'{}'), 'data.json')},
+                                      content_type='multipart/form-data')
+    assert response.status_code == 400
+
+
+# =============================================================================
+# CHUNKED UPLOAD INTEGRATION TESTS
+# =============================================================================
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setitem(app.config, 'INGEST_CHUNK_ROWS', 8)
+    return app.test_client()
+
+
+def _analyze(client, mode):
+    client.post('/upload', data={'mode': mode, 'file': (io.BytesIO(_sample_csv().encode()), 'data.csv')},
+                content_type='multipart/form-data')
+    client.post('/map-columns', json=DEFAULT_COLUMN_MAPPING)
+    return client.post('/analyze').get_json()
+
+
+def test_chunked_upload_matches_in_memory(client):
+    """Chunked ingestion produces the same Layer 1/Layer 2 summary as the in-memory path"""
+    in_memory = _analyze(client, '')
+    chunked = _analyze(client, 'chunked')
+
+    assert chunked['summary'] == in_memory['summary']
+    assert chunked['total_rows'] == 30
+    assert [row['status'] for row in chunked['preview']] == [row['status'] for row in in_memory['preview']]
+
+
+def test_chunked_preview_is_limited(client):
+    """Preview of a spooled upload only parses the first rows"""
+    client.post('/upload', data={'mode': 'chunked', 'file': (io.BytesIO(_sample_csv().encode()), 'data.csv')},
+                content_type='multipart/form-data')
+    client.post('/map-columns', json=DEFAULT_COLUMN_MAPPING)
+    preview = client.post('/preview').get_json()['preview']
+
+    assert len(preview) == 30
+    assert preview[0]['weight'] == 60.0
+    assert 'unused_wide_column' not in preview[0]
+
+
+@pytest.mark.parametrize('filename', ['data.parquet', 'data.feather', 'data.xlsx'])
+def test_columnar_upload_matches_csv(client, tmp_path, filename):
+    """Columnar uploads are analysed exactly like the same data uploaded as CSV"""
+    path = tmp_path / filename
+    _write_sample(str(path))
+    expected = _analyze(client, '')
+
+    upload = client.post('/upload', data={'file': (io.BytesIO(path.read_bytes()), filename)},
+                         content_type='multipart/form-data').get_json()
+    assert 'unused_wide_column' in upload['columns']
+    client.post('/map-columns', json=DEFAULT_COLUMN_MAPPING)
+    preview = client.post('/preview').get_json()['preview']
+    result = client.post('/analyze').get_json()
+
+    assert 'unused_wide_column' not in preview[0]
+    assert result['summary'] == expected['summary']
+    assert [row['status'] for row in result['preview']] == [row['status'] for row in expected['preview']]
@@ -0,0 +1,109 @@
+import io
+import threading
+import time
+import pandas as pd
+from src import web_gui
+from src.jobs import JobManager
+from src.web_gui import app, DEFAULT_COLUMN_MAPPING
+
+
+def _wait(predicate, timeout=10):
+    deadline = time.time() + timeout
+    while not predicate():
+        assert time.time() < deadline, 'timed out waiting for job'
+        time.sleep(0.02)
+
+
+# =============================================================================
+# JOB MANAGER TESTS
+# =============================================================================
+class TestJobManager:
+    def test_stage_progress_and_result(self):
+        """Stages report progress while running and the result when done"""
+        release = threading.Event()
+        manager = JobManager(max_workers=1)
+
+        def work(job):
+            job.start_stage('clean')
+            job.start_stage('layer1')
+            release.wait(5)
+            return {'ok': True}
+
+        job = manager.submit('owner', work)
+        _wait(lambda: job.to_dict()['stage'] == 'layer1')
+        status = job.to_dict()
+        assert status['state'] == 'running'
+        assert status['progress'] == 0.25
+        assert status['stages']['clean']['state'] == 'done'
+
+        release.set()
+        _wait(lambda: job.state == 'done')
+        assert job.result == {'ok': True}
+        assert manager.get(job.job_id, 'someone else') is None
+
+    def test_failure_is_reported(self, caplog):
+        """Exceptions mark the job and the running stage as failed and are logged with their traceback"""
+        manager = JobManager(max_workers=1)
+
+        def work(job):
+            job.start_stage('clean')
+            raise ValueError('bad data')
+
+        job = manager.submit('owner', work)
+        _wait(lambda: job.state == 'failed')
+        assert job.error == 'bad data'
+        assert job.to_dict()['stages']['clean']['state'] == 'failed'
+        record, = [record for record in caplog.records if record.name == 'src.jobs']
+        assert record.getMessage() == f'analysis job {job.job_id} failed' and record.exc_info[0] is ValueError
+
+
+# =============================================================================
+# /analyze/jobs ENDPOINT TESTS
+# =============================================================================
+def test_background_analysis_matches_synchronous():
+    """Polling a job ends with the same payload as /analyze"""
+    rows = 120
+    df = pd.DataFrame({'age_v': [30 + i % 60 for i in range(rows)], 'greutate': [60.0 + i % 30 for i in range(rows)],
+                       'inaltime': [165.0 + i % 20 for i in range(rows)], 'IMC': [22.9] * rows})
+    client = app.test_client()
+    client.post('/upload', data={'file': (io.BytesIO(df.to_csv(index=False).encode()), 'data.csv')},
+                content_type='multipart/form-data')
+    client.post('/map-columns', json=DEFAULT_COLUMN_MAPPING)
+
+    submitted = client.post('/analyze/jobs')
+    assert submitted.status_code == 202
+    job_id = submitted.get_json()['job_id']
+
+    _wait(lambda: client.get(f'/analyze/jobs/{job_id}').get_json()['state'] in ('done', 'failed'))
+    status = client.get(f'/analyze/jobs/{job_id}').get_json()
+    assert status['progress'] == 1.0
+    assert all(stage['seconds'] is not None for stage in status['stages'].values())
+
+    result = client.get(f'/analyze/jobs/{job_id}/result').get_json()
+    assert result['summary'] == client.post('/analyze').get_json()['summary']
+    assert app.test_client().get(f'/analyze/jobs/{job_id}').status_code == 404
+
+
+def test_job_result_is_dropped_after_a_new_upload(monkeypatch):
+    """An upload made while a job runs keeps its fresh state; the job fails instead of storing a stale analysis"""
+    started, release = threading.Event(), threading.Event()
+    layer2 = web_gui._apply_layer2_isolation_forest
+    monkeypatch.setattr(web_gui, '_apply_layer2_isolation_forest',
+                        lambda analysis_df: started.set() or release.wait(5) and layer2(analysis_df))
+    df = pd.DataFrame({'age_v': [30, 40, 50] * 20, 'greutate': [60.0, 70.0, 80.0] * 20,
+                       'inaltime': [165.0, 175.0, 185.0] * 20, 'IMC': [22.0, 22.9, 23.4] * 20})
+    client = app.test_client()
+    client.post('/upload', data={'file': (io.BytesIO(df.to_csv(index=False).encode()), 'data.csv')},
+                content_type='multipart/form-data')
+    client.post('/map-columns', json=DEFAULT_COLUMN_MAPPING)
+    job_id = client.post('/analyze/jobs').get_json()['job_id']
+    assert started.wait(5)
+
+    client.post('/upload', data={'file': (io.BytesIO(df.iloc[:10].to_csv(index=False).encode()), 'data.csv')},
+                content_type='multipart/form-data')
+    release.set()
+    _wait(lambda: client.get(f'/analyze/jobs/{job_id}').get_json()['state'] in ('done', 'failed'))
+
+    result = client.get(f'/analyze/jobs/{job_id}/result')
+    assert result.status_code == 400 and 'changed while the analysis ran' in result.get_json()['error']
+    assert client.get('/results').status_code == 400
@@ -0,0 +1,40 @@
+import numpy as np
+from benchmarks.bench_memory import legacy_layout, make_analysis, mb_per_million_rows
+from src.validation import STATUS_COLORS, STATUS_DTYPE
+from src.web_gui import app
+from tests.helpers import post_csv, upload_and_analyze, upload_frame
+
+
+# =============================================================================
+# LAYOUT TESTS
+# =============================================================================
+def test_analysis_frame_is_compact():
+    """Statuses are int8-coded categoricals without a color column, scores and measurements float32"""
+    analysis_df = make_analysis(5000)
+    assert analysis_df['status'].dtype == STATUS_DTYPE and analysis_df['status'].cat.codes.dtype == np.int8
+    assert 'color' not in analysis_df.columns
+    assert all(analysis_df[col].dtype == np.float32
+               for col in ('weight', 'bmi_calculated', 'isolation_score', 'anomaly'))
+    assert analysis_df['date'].dtype.kind == 'M'
+    assert set(analysis_df['status'].dropna()) == {'Valid', 'Anomaly', 'Warning'}
+
+
+def test_memory_is_a_third_of_the_former_layout():
+    """The analysis frame takes at most a third of the memory of the same rows in the former dtypes"""
+    analysis_df = make_analysis(20_000)
+    assert mb_per_million_rows(legacy_layout(analysis_df)) >= 3 * mb_per_million_rows(analysis_df)
+
+
+# =============================================================================
+# ENDPOINT TESTS
+# =============================================================================
+def test_rows_get_colors_when_sent_also_after_append():
+    """/results derives each row's color from its status, for analysed and appended rows alike"""
+    client = app.test_client()
+    upload_and_analyze(client, upload_frame())
+    post_csv(client, '/append', upload_frame(rows=40, seed=1))
+
+    rows = client.get('/results?limit=240').get_json()['rows']
+    assert len(rows) == 240
+    assert all(row['color'] == STATUS_COLORS[row['status']] for row in rows)
+    assert {row['status'] for row in rows} >= {'Valid', 'Anomaly'}
@@ -0,0 +1,70 @@
+import io
+import json
+import logging
+import pytest
+from src import web_gui
+from src.metrics import StageMetrics
+from src.web_gui import app, DEFAULT_COLUMN_MAPPING
+from tests.helpers import reference_frame
+
+
+# =============================================================================
+# STAGE METRICS TESTS
+# =============================================================================
+class TestStageMetrics:
+    def test_histogram_buckets_are_cumulative(self):
+        """Each observation counts in every bucket at or above its duration"""
+        metrics = StageMetrics(buckets=(0.1, 1.0))
+        metrics.observe('clean', 0.05, rows=100)
+        metrics.observe('clean', 0.5, rows=300)
+        text = metrics.render()
+
+        assert 'doctor31_stage_duration_seconds_bucket{stage="clean",le="0.1"} 1' in text
+        assert 'doctor31_stage_duration_seconds_bucket{stage="clean",le="1.0"} 2' in text
+        assert 'doctor31_stage_duration_seconds_bucket{stage="clean",le="+Inf"} 2' in text
+        assert 'doctor31_stage_duration_seconds_count{stage="clean"} 2' in text
+        assert 'doctor31_stage_rows_total{stage="clean"} 400' in text
+        assert 'doctor31_stage_rows_per_second{stage="clean"} 600.0' in text
+
+    def test_failed_stage_is_not_recorded(self):
+        """A stage that raises leaves no observation behind"""
+        metrics = StageMetrics()
+        with pytest.raises(ValueError):
+            with metrics.stage('layer1', rows=10):
+                raise ValueError('bad data')
+        assert metrics.snapshot() == {}
+
+    def test_structured_log_lines(self, caplog):
+        """With a logger every observation is logged as one JSON object"""
+        metrics = StageMetrics(logger=logging.getLogger('doctor31.test'))
+        with caplog.at_level(logging.INFO, logger='doctor31.test'):
+            with metrics.stage('upload') as timer:
+                timer.rows = 42
+        record = json.loads(caplog.records[-1].getMessage())
+        assert record['stage'] == 'upload' and record['rows'] == 42
+        assert record['seconds'] >= 0
+
+
+# =============================================================================
+# /metrics ENDPOINT TESTS
+# =============================================================================
+def test_metrics_endpoint_reports_pipeline_stages():
+    """An analysis records every hot-path stage, served in Prometheus text format"""
+    before = web_gui.stage_metrics.snapshot()
+    client = app.test_client()
+    client.post('/upload', data={'file': (io.BytesIO(reference_frame().to_csv(index=False).encode()), 'data.csv')},
+                content_type='multipart/form-data')
+    client.post('/map-columns', json=DEFAULT_COLUMN_MAPPING)
+    client.post('/analyze')
+
+    after = web_gui.stage_metrics.snapshot()
+    for stage in ('upload', 'clean', 'layer1', 'layer2_fit', 'layer2_score', 'serialize'):
+        assert after[stage]['count'] > before.get(stage, {'count': 0})['count'], stage
+    assert after['clean']['rows'] - before.get('clean', {'rows': 0})['rows'] == 200
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain; version=0.0.4')
+    text = response.get_data(as_text=True)
+    assert 'doctor31_stage_duration_seconds_count{stage="layer2_fit"}' in text
+    assert 'doctor31_process_peak_rss_bytes' in text
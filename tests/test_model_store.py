@@ -0,0 +1,172 @@
+import io
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from src import web_gui
+from src.model_store import Layer2Engine, ModelStore, data_fingerprint, fit_model, score_model, main
+from src.validation import STATUS_DTYPE, status_colors
+from src.web_gui import app, DEFAULT_COLUMN_MAPPING
+from tests.helpers import reference_frame
+
+
+def _upload(client, frame):
+    client.post('/upload', data={'file': (io.BytesIO(frame.to_csv(index=False).encode()), 'data.csv')},
+                content_type='multipart/form-data')
+    client.post('/map-columns', json=DEFAULT_COLUMN_MAPPING)
+
+
+# =============================================================================
+# ARTIFACT TESTS
+# =============================================================================
+class TestModelStore:
+    def test_versioned_save_and_list(self, tmp_path):
+        """Saving the same name twice produces consecutive versions"""
+        store = ModelStore(str(tmp_path))
+        features = pd.DataFrame({'age': [30.0, 40, 50, 60], 'weight': [60.0, 70, 80, 90]})
+        model = fit_model(features, 0.1)
+
+        assert store.save_model('adults', model) == 'adults-v1'
+        assert store.save_model('adults', model) == 'adults-v2'
+        assert [meta['model_id'] for meta in store.list_models()] == ['adults-v1', 'adults-v2']
+        assert store.list_models()[0]['features'] == ['age', 'weight']
+
+    def test_loaded_model_scores_like_original(self, tmp_path):
+        """A reloaded artifact gives the same scores as the fitted one"""
+        store = ModelStore(str(tmp_path))
+        features = pd.DataFrame({'age': np.arange(50.0), 'weight': np.arange(50.0) + 40})
+        model = fit_model(features, 0.05)
+        model_id = store.save_model('ref', model)
+
+        fresh = ModelStore(str(tmp_path))
+        np.testing.assert_allclose(score_model(fresh.load_model(model_id), features)['scores'],
+                                   score_model(model, features)['scores'])
+
+    def test_fingerprint_depends_on_values_and_contamination(self):
+        """Fingerprints change with the data and the fit parameters"""
+        features = pd.DataFrame({'age': [30.0, 40.0]})
+        assert data_fingerprint(features, 0.1) == data_fingerprint(features.copy(), 0.1)
+        assert data_fingerprint(features, 0.1) != data_fingerprint(features, 0.2)
+        assert data_fingerprint(features, 0.1) != data_fingerprint(features + 1, 0.1)
+
+
+# =============================================================================
+# ENGINE TESTS
+# =============================================================================
+class TestLayer2Engine:
+    def test_predictions_match_forest_predict(self):
+        """Predictions derived from decision_function agree with IsolationForest.predict"""
+        features = reference_frame(rows=300).astype(float)
+        model = fit_model(features, 0.1)
+        results = score_model(model, features)
+        expected = model['forest'].predict(model['scaler'].transform(features))
+        np.testing.assert_array_equal(results['predictions'], expected)
+
+    def test_threaded_scores_match_single_thread(self):
+        """Thread count does not change the fitted model or its scores"""
+        features = reference_frame(rows=300).astype(float)
+        serial = score_model(fit_model(features, 0.1, Layer2Engine(n_jobs=1)), features)
+        threaded = score_model(fit_model(features, 0.1, Layer2Engine(n_jobs=2)), features)
+        np.testing.assert_allclose(threaded['scores'], serial['scores'])
+
+    def test_large_data_fit_on_sample(self):
+        """Above the threshold the forest is fit on a sample but every row is scored"""
+        features = reference_frame(rows=400).astype(float)
+        engine = Layer2Engine(fit_sample_threshold=300, fit_sample_rows=100)
+        model = fit_model(features, 0.1, engine)
+        assert (model['n_samples'], model['fit_rows']) == (400, 100)
+        assert len(score_model(model, features, engine)['scores']) == 400
+        assert data_fingerprint(features, 0.1, engine) != data_fingerprint(features, 0.1)
+
+    def test_process_pool_scores_match_in_process(self):
+        """Chunked scoring on worker processes gives the in-process scores"""
+        features = reference_frame(rows=250).astype(float)
+        model = fit_model(features, 0.1)
+        pooled = Layer2Engine(score_workers=2, score_chunk_rows=100, score_process_threshold=200)
+        results = score_model(model, features, pooled)
+        np.testing.assert_allclose(results['scores'], score_model(model, features)['scores'])
+        assert set(results['timings']) == {'transform', 'score'}
+        assert {'sample', 'scale', 'fit'} == set(model['fit_timings'])
+
+
+# =============================================================================
+# LAYER 1 / LAYER 2 MERGE TESTS
+# =============================================================================
+def test_only_valid_anomalies_are_promoted():
+    """Layer 2 anomalies turn Valid rows into Anomaly; other statuses and unscored rows stay"""
+    analysis_df = pd.DataFrame({
+        'status': pd.Categorical(['Valid', 'Valid', 'Warning', 'Valid', 'Valid'], dtype=STATUS_DTYPE),
+        'age': [30.0, 40.0, 50.0, np.nan, 60.0]
+    }, index=[10, 11, 12, 13, 14])
+    complete_data = analysis_df[['age']].dropna()
+    analysis_df['isolation_score'] = np.nan
+    analysis_df['anomaly'] = np.nan
+
+    result = web_gui._apply_isolation_results(analysis_df, complete_data, {
+        'scores': np.array([-0.1, 0.2, -0.3, -0.2]),
+        'predictions': np.array([-1, 1, -1, -1])
+    })
+
+    assert list(result['status']) == ['Anomaly', 'Valid', 'Warning', 'Valid', 'Anomaly']
+    assert result['status'].dtype == STATUS_DTYPE
+    assert list(status_colors(result['status'])) == ['red', 'green', 'orange', 'green', 'red']
+    assert np.isnan(result.loc[13, 'anomaly'])
+
+
+def test_contamination_counts_complete_rows_only():
+    """The anomaly ratio is taken over complete rows and clipped to [0.01, 0.5]"""
+    analysis_df = pd.DataFrame({'status': ['Valid', 'Warning', 'Valid', 'Anomaly', 'Valid']},
+                               index=[5, 6, 7, 8, 9])
+    assert web_gui._estimate_contamination(analysis_df, analysis_df.loc[[5, 6, 7, 9]]) == 0.25
+    assert web_gui._estimate_contamination(analysis_df, analysis_df.loc[[5, 7]]) == 0.01
+    assert web_gui._estimate_contamination(analysis_df, analysis_df.loc[[6, 8]]) == 0.5
+
+
+# =============================================================================
+# ANALYZE INTEGRATION TESTS
+# =============================================================================
+def test_unchanged_dataset_is_not_refit(monkeypatch):
+    """A second analysis of the same data reuses the cached fit"""
+    client = app.test_client()
+    _upload(client, reference_frame())
+    calls = []
+    monkeypatch.setattr(web_gui, 'fit_model', lambda *args: calls.append(args) or fit_model(*args))
+
+    first = client.post('/analyze').get_json()
+    second = client.post('/analyze').get_json()
+
+    assert len(calls) == 1
+    assert first['summary'] == second['summary']
+
+
+def test_selected_model_scores_without_refit(monkeypatch):
+    """With a selected model, new batches are scored but never fit"""
+    client = app.test_client()
+    _upload(client, reference_frame())
+    trained = client.post('/models/train', json={'name': 'daily', 'select': True}).get_json()
+    assert trained['model']['model_id'] == 'daily-v1'
+
+    monkeypatch.setattr(web_gui, 'fit_model', lambda *args: pytest.fail('model was refit'))
+    _upload(client, reference_frame(seed=1))
+    result = client.post('/analyze').get_json()
+
+    assert result['total_rows'] == 200
+    listing = client.get('/models').get_json()
+    assert listing['active_model'] == 'daily-v1'
+    assert client.post('/models/select', json={'model_id': 'missing-v1'}).status_code == 400
+
+
+def test_cli_train_list_select(tmp_path, capsys):
+    """The command line can train, list and select models"""
+    csv_path = tmp_path / 'reference.csv'
+    reference_frame().to_csv(csv_path, index=False)
+    mapping_path = tmp_path / 'mapping.json'
+    mapping_path.write_text(json.dumps(DEFAULT_COLUMN_MAPPING))
+    model_dir = str(tmp_path / 'models')
+
+    main(['--model-dir', model_dir, 'train', str(csv_path), '--name', 'ref', '--mapping', str(mapping_path)])
+    assert capsys.readouterr().out.strip() == 'ref-v1'
+
+    main(['--model-dir', model_dir, 'select', 'ref-v1'])
+    main(['--model-dir', model_dir, 'list'])
+    assert capsys.readouterr().out.startswith('* ref-v1')
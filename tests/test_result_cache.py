@@ -0,0 +1,123 @@
+import io
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from src import result_cache as result_cache_module
+from src import web_gui
+from src.result_cache import ResultCache, cache_key, copy_with_digest, stream_digest
+from src.web_gui import app, DEFAULT_COLUMN_MAPPING
+from tests.helpers import post_csv, upload_and_analyze, upload_frame
+
+
+# =============================================================================
+# CACHE TESTS
+# =============================================================================
+def test_round_trip_keeps_frames_and_attrs(tmp_path):
+    """Stored frames come back equal, with their attrs, next to the meta"""
+    cache = ResultCache(str(tmp_path / 'cache'), 10 ** 9)
+    frame = pd.DataFrame({'a': [1.5, np.nan], 'b': ['x', None]})
+    frame.attrs['parse_failures'] = {'a': 1}
+    cache.put('k', {'frame': frame}, {'layer2_model': {'fingerprint': 'f'}})
+
+    frames, meta = cache.get('k')
+    pd.testing.assert_frame_equal(frames['frame'], frame)
+    assert frames['frame'].attrs == {'parse_failures': {'a': 1}}
+    assert meta == {'layer2_model': {'fingerprint': 'f'}}
+    assert cache.get('missing') is None
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    """Once over max_bytes, the entries used longest ago are removed first"""
+    frame = pd.DataFrame({'a': np.arange(10_000, dtype=float)})
+    probe = ResultCache(str(tmp_path / 'probe'), 10 ** 9)
+    probe.put('probe', {'frame': frame})
+    cache = ResultCache(str(tmp_path / 'cache'), int(probe.total_bytes() * 2.5))
+
+    cache.put('old', {'frame': frame})
+    cache.put('used', {'frame': frame})
+    os.utime(os.path.join(cache.root_dir, 'old', 'meta.json'), (1, 1))
+    os.utime(os.path.join(cache.root_dir, 'used', 'meta.json'), (2, 2))
+    cache.get('used')
+    cache.put('new', {'frame': frame})
+
+    assert 'old' not in cache and 'used' in cache and 'new' in cache
+
+
+def test_repeated_put_and_failed_write(tmp_path, monkeypatch):
+    """Storing a key twice keeps one entry; a failed disk write leaves no entry behind"""
+    cache = ResultCache(str(tmp_path / 'cache'), 10 ** 9)
+    frame = pd.DataFrame({'a': [1]})
+    cache.put('k', {'frame': frame})
+    cache.put('k', {'frame': frame})
+    assert os.listdir(cache.root_dir) == ['k']
+
+    def disk_full(*args):
+        raise OSError('No space left on device')
+
+    monkeypatch.setattr(result_cache_module, 'write_frame', disk_full)
+    cache.put('other', {'frame': frame})
+    assert os.listdir(cache.root_dir) == ['k']
+
+
+def test_digests_match_content(tmp_path):
+    """Streams and spooled copies of the same bytes have the same digest"""
+    stream = io.BytesIO(b'a,b\n1,2\n' * 100_000)
+    digest = stream_digest(stream)
+    assert stream.read(4) == b'a,b\n'
+    stream.seek(0)
+    assert copy_with_digest(stream, str(tmp_path / 'copy.csv')) == digest
+    assert cache_key('upload', digest) != cache_key('analysis', digest)
+
+
+# =============================================================================
+# PIPELINE TESTS
+# =============================================================================
+def test_repeat_upload_is_served_from_cache(monkeypatch):
+    """The same file and mapping are neither parsed, cleaned nor fitted again"""
+    frame = upload_frame()
+    first = upload_and_analyze(app.test_client(), frame)
+    assert first['cached'] is False
+
+    monkeypatch.setattr(web_gui.pd, 'read_csv', lambda *args, **kwargs: pytest.fail('upload was parsed'))
+    monkeypatch.setattr(web_gui, 'apply_column_mapping_and_clean', lambda *args: pytest.fail('data was cleaned'))
+    monkeypatch.setattr(web_gui, 'fit_model', lambda *args: pytest.fail('model was refit'))
+    client = app.test_client()
+    second = upload_and_analyze(client, frame)
+
+    assert second['cached'] is True
+    assert {key: value for key, value in second.items() if key != 'cached'} == \
+        {key: value for key, value in first.items() if key != 'cached'}
+    assert client.get('/results?limit=5').get_json()['total'] == 200
+
+
+def test_mapping_settings_and_content_change_the_key(monkeypatch):
+    """A different mapping, date format or file content is analysed afresh"""
+    client = app.test_client()
+    frame = upload_frame()
+    assert upload_and_analyze(client, frame)['cached'] is False
+    assert upload_and_analyze(client, frame, {**DEFAULT_COLUMN_MAPPING, 'weight': 'greutate_kg'})['cached'] is False
+
+    monkeypatch.setitem(app.config, 'DATE_FORMAT', '%Y-%m-%d %H:%M:%S')
+    assert upload_and_analyze(client, frame)['cached'] is False
+
+    changed = frame.copy()
+    changed.loc[0, 'greutate'] = 71.0
+    assert upload_and_analyze(client, changed)['cached'] is False
+    assert upload_and_analyze(client, changed)['cached'] is True
+
+
+def test_appended_rows_change_the_key():
+    """After an append the next analysis is not the cached one of the original file"""
+    client = app.test_client()
+    upload_and_analyze(client, upload_frame())
+    post_csv(client, '/append', upload_frame(rows=20, seed=1))
+    assert client.post('/analyze').get_json()['cached'] is False
+
+
+def test_spooled_uploads_are_cached():
+    """Chunked uploads are keyed by the digest taken while spooling"""
+    frame = upload_frame()
+    assert upload_and_analyze(app.test_client(), frame, mode='chunked')['cached'] is False
+    result = upload_and_analyze(app.test_client(), frame, mode='chunked')
+    assert result['cached'] is True and result['total_rows'] == 200
@@ -0,0 +1,73 @@
+import io
+import numpy as np
+import pandas as pd
+from hypothesis import given, strategies as st
+from src.results import select_page
+from src.web_gui import app, DEFAULT_COLUMN_MAPPING
+
+
+def _results_frame(scores, statuses):
+    return pd.DataFrame({'isolation_score': scores, 'status': statuses})
+
+
+# =============================================================================
+# PAGE SELECTION TESTS
+# =============================================================================
+class TestSelectPage:
+    def test_filter_and_total(self):
+        """Status filters restrict rows and report the matching total"""
+        df = _results_frame([0.1, -0.2, 0.3, -0.4], ['Valid', 'Anomaly', 'Warning', 'Anomaly'])
+        page, total = select_page(df, statuses=['Anomaly'])
+        assert total == 2
+        assert list(page.index) == [1, 3]
+
+    def test_sort_missing_last(self):
+        """Sorting puts rows without a score last in both directions"""
+        df = _results_frame([0.1, np.nan, -0.3, 0.2], ['Valid'] * 4)
+        assert list(select_page(df, sort_by='isolation_score')[0].index) == [2, 0, 3, 1]
+        assert list(select_page(df, sort_by='isolation_score', descending=True)[0].index) == [3, 0, 2, 1]
+
+    def test_offset_past_end(self):
+        """Offsets beyond the result give an empty page"""
+        df = _results_frame([0.1, 0.2], ['Valid'] * 2)
+        page, total = select_page(df, offset=5, limit=10, sort_by='isolation_score')
+        assert page.empty and total == 2
+
+
+@given(scores=st.lists(st.one_of(st.sampled_from([-0.1, 0.0, 0.1]), st.just(float('nan'))),
+                       min_size=1, max_size=60),
+       limit=st.integers(min_value=1, max_value=15),
+       descending=st.booleans())
+def test_property_pages_concatenate_to_full_sort(scores, limit, descending):
+    """Property test: consecutive pages equal one stable sort of the whole frame"""
+    df = _results_frame(scores, ['Valid'] * len(scores))
+    pages = [select_page(df, offset, limit, sort_by='isolation_score', descending=descending)[0]
+             for offset in range(0, len(scores), limit)]
+    keys = -df['isolation_score'] if descending else df['isolation_score']
+    expected = keys.sort_values(kind='stable', na_position='last').index
+    assert list(pd.concat(pages).index) == list(expected)
+
+
+# =============================================================================
+# /results ENDPOINT TESTS
+# =============================================================================
+def test_results_endpoint_pages_past_preview():
+    """Rows beyond the 200-row preview are reachable through /results"""
+    rows = 450
+    df = pd.DataFrame({'age_v': [30] * rows, 'greutate': [70.0] * rows,
+                       'inaltime': [175.0] * rows, 'IMC': [22.9] * rows})
+    df.loc[rows - 1, 'greutate'] = 500.0
+    client = app.test_client()
+    client.post('/upload', data={'file': (io.BytesIO(df.to_csv(index=False).encode()), 'data.csv')},
+                content_type='multipart/form-data')
+    client.post('/map-columns', json=DEFAULT_COLUMN_MAPPING)
+    assert client.get('/results').status_code == 400
+
+    client.post('/analyze')
+    page = client.get('/results?offset=400&limit=100').get_json()
+    assert page['total'] == rows
+    assert len(page['rows']) == 50
+
+    anomalies = client.get('/results?status=Anomaly&sort=isolation_score').get_json()
+    assert anomalies['rows'][0]['weight'] == 500.0
+    assert client.get('/results?status=Bogus').status_code == 400
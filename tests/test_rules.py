@@ -0,0 +1,121 @@
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from src import validation
+from src.validation import RULE_FIELDS, compile_rules, load_rules, rule_set_path
+from src.web_gui import app
+from tests.helpers import upload_and_analyze, upload_frame
+
+ADULT = {'name': 'adult', 'rules': [
+    {'name': 'weight_out_of_range', 'status': 'Anomaly', 'field': 'weight', 'lt': 20, 'gt': 300},
+    {'name': 'minor', 'status': 'Warning', 'field': 'age', 'lt': 18},
+    {'name': 'bmi_missing', 'status': 'Anomaly', 'field': 'bmi', 'missing': True}
+]}
+
+
+# =============================================================================
+# RULE SET TESTS
+# =============================================================================
+def test_first_firing_rule_is_recorded_anomalies_first():
+    """Each row gets the first firing rule, with Anomaly rules checked before Warning rules"""
+    rule_set = compile_rules(ADULT)
+    status, color, rule = rule_set.apply([25.0, np.nan, 25.0, 25.0], [16, 16, 40, 40], 170, [10, 70, 70, 400])
+
+    assert rule_set.rule_names == ['weight_out_of_range', 'bmi_missing', 'minor']
+    assert list(status) == ['Anomaly', 'Anomaly', 'Valid', 'Anomaly']
+    assert list(color) == ['red', 'red', 'green', 'red']
+    assert list(rule.astype(object)) == ['weight_out_of_range', 'bmi_missing', np.nan, 'weight_out_of_range']
+    assert list(rule.categories) == rule_set.rule_names
+
+
+def test_built_in_rule_sets_differ_by_clinic():
+    """A five-year-old is a minor to the adult rules but valid to the pediatric ones"""
+    child = (15.5, 5, 110, 19)
+    adult_status, _, adult_rule = load_rules('adult').apply(*child)
+    pediatric_status, _, pediatric_rule = load_rules('pediatric').apply(*child)
+    assert (adult_status[0], adult_rule[0]) == ('Anomaly', 'height_too_low')
+    assert pediatric_status[0] == 'Valid' and pd.isna(pediatric_rule[0])
+    assert load_rules('pediatric').apply(20, 1, 80, 12)[2][0] == 'infant'
+
+
+def test_rule_sets_are_compiled_once_per_config(tmp_path):
+    """Identical configs share one compiled rule set, however they are written"""
+    path = tmp_path / 'clinic.json'
+    path.write_text(json.dumps({'rules': ADULT['rules'], 'name': 'adult'}, indent=2))
+    assert load_rules(str(path)) is compile_rules(ADULT)
+    assert compile_rules({**ADULT, 'name': 'other'}) is not compile_rules(ADULT)
+    assert rule_set_path('adult').endswith('adult.json') and rule_set_path(str(path)) == str(path)
+
+
+def test_rule_files_are_read_again_only_when_changed(tmp_path, monkeypatch):
+    """Repeated loads of an unchanged file skip reading it; an edited file is loaded afresh"""
+    path = tmp_path / 'clinic.json'
+    path.write_text(json.dumps(ADULT))
+    reads = []
+    read_rule_config = validation._read_rule_config
+    monkeypatch.setattr(validation, '_read_rule_config', lambda path: reads.append(path) or read_rule_config(path))
+    assert load_rules(str(path)) is load_rules(str(path))
+    assert len(reads) == 1
+
+    path.write_text(json.dumps({**ADULT, 'name': 'edited'}, indent=2))
+    assert load_rules(str(path)).name == 'edited' and len(reads) == 2
+
+
+@pytest.mark.parametrize('rules, message', [
+    ([], 'non-empty'),
+    ([{'name': 'a', 'status': 'Error', 'field': 'bmi', 'lt': 1}], 'status'),
+    ([{'name': 'a', 'status': 'Anomaly', 'field': 'pulse', 'lt': 1}], 'field'),
+    ([{'name': 'a', 'status': 'Anomaly', 'field': 'bmi'}], 'threshold'),
+    ([{'name': 'a', 'status': 'Anomaly', 'field': 'bmi', 'lt': '1'}], 'numbers'),
+    ([{'name': 'a', 'status': 'Anomaly', 'field': 'bmi', 'below': 1}], 'unknown keys'),
+    ([{'name': 'a', 'status': 'Anomaly', 'field': 'bmi', 'lt': 1}] * 2, 'unique')
+])
+def test_malformed_rule_sets_are_rejected(rules, message):
+    """Mistakes in a rule config are reported instead of silently validating nothing"""
+    with pytest.raises(ValueError, match=message):
+        compile_rules({'rules': rules})
+
+
+def test_expressions_match_masks():
+    """Each rule's numexpr expression selects the same rows as its NumPy mask"""
+    rng = np.random.default_rng(0)
+    columns = {field: np.where(rng.random(1000) < 0.1, np.nan, rng.uniform(-10, 400, 1000))
+               for field in RULE_FIELDS}
+    for rule in load_rules('adult').rules:
+        expected = rule.mask(columns)
+        # The expression only uses operators NumPy arrays also support
+        np.testing.assert_array_equal(eval(rule.expression, {}, dict(columns)), expected)
+
+
+def test_numexpr_evaluation_matches_numpy(monkeypatch):
+    """Long columns evaluated with numexpr give the same statuses and rules"""
+    pytest.importorskip('numexpr')
+    rng = np.random.default_rng(1)
+    columns = [rng.uniform(0, 400, 5000) for _ in RULE_FIELDS]
+    rule_set = load_rules('adult')
+    expected = rule_set.rule_codes(*columns)
+    monkeypatch.setattr(validation, 'NUMEXPR_MIN_ROWS', 0)
+    np.testing.assert_array_equal(rule_set.rule_codes(*columns), expected)
+
+
+# =============================================================================
+# PIPELINE TESTS
+# =============================================================================
+def test_analysis_uses_configured_rule_set(monkeypatch):
+    """DOCTOR31_RULES selects the rule set; switching it re-validates instead of using the cache"""
+    client = app.test_client()
+    frame = upload_frame()
+    frame.loc[0, 'age_v'] = 10
+    adult = upload_and_analyze(client, frame)
+    assert adult['rule_counts']['minor'] == 1
+    assert client.get('/results?limit=1').get_json()['rows'][0]['rule'] == 'minor'
+
+    monkeypatch.setitem(app.config, 'RULES', 'pediatric')
+    pediatric = upload_and_analyze(client, frame)
+    assert pediatric['cached'] is False and 'minor' not in pediatric['rule_counts']
+    assert client.get('/rules').get_json()['name'] == 'pediatric'
+
+    monkeypatch.setitem(app.config, 'RULES', 'no-such-rules.json')
+    assert client.get('/rules').status_code == 400
+    assert client.get('/ready').get_json()['checks']['rules'] is False
@@ -1,7 +1,8 @@
 import pytest
+import numpy as np
 import pandas as pd
 from hypothesis import given, strategies as st
-from src.validation import bmi_calculated, validate_row
+from src.validation import bmi_calculated, bmi_calculated_array, validate_row, validate_rows
 
 
 # =============================================================================
@@ -39,6 +40,26 @@ class TestBMICalculated:
         assert bmi is not None
 
 
+class TestBMICalculatedArray:
+    def test_matches_scalar_rounded(self):
+        """Array BMI matches bmi_calculated rounded to 2 decimals"""
+        weights = [70, 0.1, 500, 55.5, 0]
+        heights = [175, 0.1, 250, 160.2, 170]
+        expected = [round(bmi_calculated(w, h), 2) for w, h in zip(weights, heights)]
+        assert list(bmi_calculated_array(weights, heights)) == expected
+
+    def test_invalid_inputs_are_nan(self):
+        """Null, zero-height and negative inputs yield NaN"""
+        result = bmi_calculated_array(pd.Series([None, 70, 70, -70, 70], dtype=object),
+                                      pd.Series([175, None, 0, 175, -175], dtype=object))
+        assert np.isnan(result).all()
+
+    def test_unrounded(self):
+        """decimals=None skips rounding"""
+        result = bmi_calculated_array([70], [175], decimals=None)
+        assert result[0] == bmi_calculated(70, 175)
+
+
 # =============================================================================
 # VALIDATION TESTS - ANOMALY CASES
 # =============================================================================
@@ -284,4 +305,63 @@ class TestIntegration:
 
         assert bmi is not None
         assert status == "Warning"
-        assert color == "orange"
\ No newline at end of file
+        assert color == "orange"
+
+# =============================================================================
+# VECTORIZED VALIDATION TESTS
+# =============================================================================
+boundary_rows = [
+    (12.0, 30, 170, 70), (11.99, 30, 170, 70), (60.0, 30, 170, 70), (60.01, 30, 170, 70),
+    (25, 18.0, 170, 70), (25, 17.99, 170, 70), (25, 100.0, 170, 70), (25, 120.01, 170, 70),
+    (25, 0.0, 170, 70), (25, -0.01, 170, 70), (25, 30, 150.0, 70), (25, 30, 149.99, 70),
+    (25, 30, 120.0, 70), (25, 30, 119.99, 70), (25, 30, 170, 19.99), (25, 30, 170, 300.01),
+    (None, 30, 170, 70), (float("nan"), 30, 170, 70), (25, None, 170, 70),
+    (25, 30, float("nan"), 70), (25, 30, 170, None), (None, -1, -1, None),
+]
+
+
+def _scalar_results(rows):
+    return [validate_row(*row) for row in rows]
+
+
+def _vector_results(rows):
+    bmi, age, height, weight = (list(col) for col in zip(*rows))
+    status, color = validate_rows(bmi, age, height, weight)
+    return list(zip(status, color))
+
+
+class TestValidateRows:
+    def test_boundaries_match_scalar(self):
+        """Vectorized results match validate_row on the boundary table"""
+        assert _vector_results(boundary_rows) == _scalar_results(boundary_rows)
+
+    def test_accepts_series_and_scalars(self):
+        """Series inputs broadcast against scalar inputs"""
+        status, color = validate_rows(pd.Series([25.0, 25.0]), pd.Series([30, 16]), 170, 70)
+        assert list(status) == ["Valid", "Warning"]
+        assert list(color) == ["green", "orange"]
+
+    def test_object_column_with_none(self):
+        """Object columns holding None are treated as missing"""
+        status, _ = validate_rows(pd.Series([None, 22.5], dtype=object), 30, 170, 70)
+        assert list(status) == ["Anomaly", "Valid"]
+
+    def test_empty_input(self):
+        """Empty columns produce empty results"""
+        status, color = validate_rows(np.array([]), np.array([]), np.array([]), np.array([]))
+        assert len(status) == 0 and len(color) == 0
+
+
+any_measurement = st.one_of(
+    st.none(),
+    st.just(float("nan")),
+    st.floats(min_value=-50.0, max_value=400.0, allow_nan=False, allow_infinity=False),
+    st.sampled_from([0.0, 12.0, 18.0, 20.0, 60.0, 100.0, 120.0, 150.0, 300.0]),
+)
+
+
+@given(rows=st.lists(st.tuples(any_measurement, any_measurement, any_measurement, any_measurement),
+                     min_size=1, max_size=50))
+def test_property_validate_rows_matches_validate_row(rows):
+    """Property test: validate_rows agrees with validate_row on every row"""
+    assert _vector_results(rows) == _scalar_results(rows)
@@ -0,0 +1,86 @@
+import io
+import json
+import numpy as np
+import pandas as pd
+from benchmarks.bench_serialization import legacy_dumps
+from src import serialization
+from src.serialization import dumps, encode_frame, widen_float32
+from src.web_gui import app, DEFAULT_COLUMN_MAPPING
+from tests.helpers import reference_frame
+
+
+def _frame():
+    return pd.DataFrame({
+        'case_id': [1, 2, 3],
+        'weight': np.array([70.1, np.nan, 80.25], dtype=np.float32),
+        'bmi_calculated': [24.256, np.nan, 30.0],
+        'status': ['Valid', None, 'Anomaly'],
+        'date': pd.to_datetime(['2024-01-02 10:00:00', None, '2024-03-04 08:30:00'])
+    })
+
+
+# =============================================================================
+# ENCODING TESTS
+# =============================================================================
+def test_records_match_former_output():
+    """Records decode to the same rows the to_dict('records') path produced"""
+    payload = {'rows': _frame()}
+    assert json.loads(dumps(payload)) == json.loads(legacy_dumps(payload))
+
+
+def test_missing_values_and_display_rules():
+    """NaN and NaT become null, float32 keeps its shortest form, BMI is rounded, dates are text, statuses get colors"""
+    rows = json.loads(dumps({'rows': _frame()}))['rows']
+    assert rows[0] == {'case_id': 1, 'weight': 70.1, 'bmi_calculated': 24.26,
+                       'status': 'Valid', 'color': 'green', 'date': '2024-01-02 10:00:00'}
+    assert rows[1] == {'case_id': 2, 'weight': None, 'bmi_calculated': None, 'status': None, 'color': None,
+                       'date': None}
+
+
+def test_columns_layout():
+    """The columnar layout sends each column once as an array"""
+    body = json.loads(dumps({'rows': _frame(), 'total': 3}, 'columns'))
+    assert body['total'] == 3
+    assert body['rows']['columns'] == ['case_id', 'weight', 'bmi_calculated', 'status', 'color', 'date']
+    assert body['rows']['data'][1] == [70.1, None, 80.25]
+    assert body['rows']['data'][5] == ['2024-01-02 10:00:00', None, '2024-03-04 08:30:00']
+
+
+def test_float32_widens_to_shortest_decimal():
+    """Widened float32 values print like their shortest repr, as orjson sends the columnar layout"""
+    values = np.concatenate([np.random.default_rng(0).normal(50, 30, 10_000),
+                             [0, -0.0, np.nan, np.inf, 70.1, 1e-7, 123456789]]).astype(np.float32)
+    assert [repr(value) for value in widen_float32(values).tolist()] == \
+        [repr(float(str(value))) for value in values]
+
+
+def test_standard_json_fallback(monkeypatch):
+    """Without orjson both layouts give the same JSON through the json module"""
+    expected = {layout: json.loads(dumps({'rows': _frame()}, layout)) for layout in ('records', 'columns')}
+    monkeypatch.setattr(serialization, 'orjson', None)
+    for layout, body in expected.items():
+        assert json.loads(dumps({'rows': _frame()}, layout)) == body
+
+
+def test_empty_frame():
+    """An empty page encodes to no records and empty columns"""
+    empty = _frame().iloc[:0]
+    assert encode_frame(empty) == []
+    assert json.loads(dumps({'rows': empty}, 'columns'))['rows']['data'] == [[]] * 6
+
+
+# =============================================================================
+# ENDPOINT TESTS
+# =============================================================================
+def test_results_layout_parameter():
+    """/results serves records by default, columns on request and rejects other layouts"""
+    client = app.test_client()
+    client.post('/upload', data={'file': (io.BytesIO(reference_frame().to_csv(index=False).encode()), 'data.csv')},
+                content_type='multipart/form-data')
+    client.post('/map-columns', json=DEFAULT_COLUMN_MAPPING)
+    client.post('/analyze')
+
+    records = client.get('/results?limit=5').get_json()['rows']
+    columns = client.get('/results?limit=5&layout=columns').get_json()['rows']
+    assert [dict(zip(columns['columns'], row)) for row in zip(*columns['data'])] == records
+    assert client.get('/results?layout=xml').status_code == 400
@@ -0,0 +1,123 @@
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import pytest
+from src import server
+from src.web_gui import app, find_free_port
+from tests.helpers import post_csv, upload_frame
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _get(url):
+    try:
+        with urllib.request.urlopen(url, timeout=10) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+# =============================================================================
+# HEALTH ENDPOINT TESTS
+# =============================================================================
+def test_health_and_ready(monkeypatch):
+    """/health answers while the process serves; /ready waits for Layer 2 when pre-warming"""
+    client = app.test_client()
+    assert client.get('/health').get_json() == {'status': 'ok'}
+
+    monkeypatch.setitem(app.config, 'PREWARM', True)
+    monkeypatch.delitem(sys.modules, 'sklearn.ensemble', raising=False)
+    response = client.get('/ready')
+    assert response.status_code == 503 and response.get_json()['checks']['layer2'] is False
+
+    monkeypatch.setitem(app.config, 'PREWARM', False)
+    assert client.get('/ready').get_json()['status'] == 'ready'
+
+
+def test_oversized_upload_is_rejected(monkeypatch):
+    """Uploads larger than MAX_CONTENT_LENGTH get a JSON 413"""
+    monkeypatch.setitem(app.config, 'MAX_CONTENT_LENGTH', 1024)
+    response = app.test_client().post('/upload', data={'file': (io.BytesIO(b'a,b\n' + b'1,2\n' * 1000), 'big.csv')},
+                                      content_type='multipart/form-data')
+    assert response.status_code == 413
+    assert '1024 byte limit' in response.get_json()['error']
+
+
+def test_large_upload_is_accepted_by_default(monkeypatch):
+    """Without DOCTOR31_MAX_UPLOAD_BYTES, bodies above the in-memory threshold are spooled, not rejected"""
+    assert app.config['MAX_CONTENT_LENGTH'] is None
+    monkeypatch.setitem(app.config, 'CHUNKED_UPLOAD_BYTES', 1024)
+    response = post_csv(app.test_client(), '/upload', upload_frame())
+    assert response.status_code == 200
+    assert 'greutate' in response.get_json()['columns']
+
+
+# =============================================================================
+# SERVER TESTS
+# =============================================================================
+def test_server_choice():
+    """auto picks an installed server; unknown names are refused"""
+    assert server.choose_server('waitress') == 'waitress'
+    assert server.choose_server('auto') in server.SERVERS
+    with pytest.raises(ValueError):
+        server.choose_server('uwsgi')
+
+
+def test_waitress_body_cap_follows_upload_limit(monkeypatch):
+    """waitress reads request bodies up to MAX_CONTENT_LENGTH, or without a cap when it is unset"""
+    monkeypatch.setitem(app.config, 'MAX_CONTENT_LENGTH', 1024)
+    assert server.waitress_options('127.0.0.1', 4000, 2, 30)['max_request_body_size'] == 1024
+    monkeypatch.setitem(app.config, 'MAX_CONTENT_LENGTH', None)
+    assert server.waitress_options('127.0.0.1', 4000, 2, 30)['max_request_body_size'] > 2 ** 40
+
+
+def _serve(tmp_path, port, *args):
+    """Start python -m src.server and wait until /ready answers 200."""
+    env = dict(os.environ, DOCTOR31_SPILL_DIR=str(tmp_path), DOCTOR31_MODEL_DIR=str(tmp_path / 'models'))
+    process = subprocess.Popen([sys.executable, '-m', 'src.server', '--host', '127.0.0.1', '--port', str(port), *args],
+                               cwd=ROOT_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            if _get(f'http://127.0.0.1:{port}/ready')[0] == 200:
+                return process
+        except (urllib.error.URLError, ConnectionError, socket.timeout):
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    pytest.fail('server never became ready')
+
+
+def _concurrent_health(port, requests=8):
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(_get(f'http://127.0.0.1:{port}/health')))
+               for _ in range(requests)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+@pytest.mark.parametrize('name, args', [
+    ('waitress', ['--threads', '4']),
+    ('gunicorn', ['--workers', '2', '--threads', '2'])
+])
+def test_server_becomes_ready_and_serves_concurrently(tmp_path, name, args):
+    """python -m src.server pre-warms, reports ready and answers parallel requests"""
+    if name == 'gunicorn' and server.choose_server() != 'gunicorn':
+        pytest.skip('gunicorn is not available')
+    port = find_free_port(6000, 6200)
+    process = _serve(tmp_path, port, '--server', name, *args)
+    try:
+        assert _concurrent_health(port) == [(200, {'status': 'ok'})] * 8
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
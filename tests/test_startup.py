@@ -0,0 +1,61 @@
+import socket
+import subprocess
+import sys
+import threading
+from benchmarks.bench_startup import ROOT_DIR, direct_imports, import_times
+from src import web_gui
+from src.web_gui import app, find_free_port
+
+
+def _run(code):
+    return subprocess.run([sys.executable, '-c', code], cwd=ROOT_DIR, capture_output=True,
+                          text=True, check=True).stdout.split()
+
+
+# =============================================================================
+# LAZY IMPORT TESTS
+# =============================================================================
+def test_app_import_defers_scikit_learn():
+    """Importing the app leaves scikit-learn, scipy and joblib for the first fit"""
+    loaded = _run("import sys; import src.web_gui; "
+                  "print(*[name in sys.modules for name in ('sklearn', 'scipy', 'joblib')])")
+    assert loaded == ['False', 'False', 'False']
+
+
+def test_prewarm_loads_scikit_learn():
+    """The background pre-warm imports the Layer 2 dependencies"""
+    loaded = _run("import sys; from src import web_gui; web_gui.prewarm().join(); "
+                  "print('sklearn.ensemble' in sys.modules, 'joblib' in sys.modules)")
+    assert loaded == ['True', 'True']
+
+
+def test_import_report_lists_direct_imports():
+    """The importtime report finds the module and the imports it made itself"""
+    rows = import_times('src.metrics')
+    names = [name for name, _, _, _ in direct_imports(rows, 'src.metrics')]
+    assert 'functools' in names or 'json' in names
+    assert all(cumulative >= own >= 0 for _, own, cumulative, _ in rows)
+
+
+# =============================================================================
+# SERVER STARTUP TESTS
+# =============================================================================
+def test_browser_opens_once_socket_listens(monkeypatch):
+    """The browser is opened after the port is bound, with no fixed delay"""
+    monkeypatch.setitem(app.config, 'PREWARM', False)
+    servers = []
+    make_server = web_gui.make_server
+    monkeypatch.setattr(web_gui, 'make_server', lambda *args, **kwargs: servers.append(
+        make_server(*args, **kwargs)) or servers[-1])
+    opened = []
+
+    def open_browser(url):
+        port = int(url.rsplit(':', 1)[1])
+        with socket.create_connection(('127.0.0.1', port), timeout=5):
+            opened.append(url)
+        threading.Thread(target=servers[0].shutdown).start()
+
+    monkeypatch.setattr(web_gui.webbrowser, 'open', open_browser)
+    port = find_free_port()
+    web_gui.serve(port)
+    assert opened == [f'http://127.0.0.1:{port}']
@@ -0,0 +1,110 @@
+import io
+import numpy as np
+import pandas as pd
+import pytest
+from src import web_gui
+from src.summary_stats import QUANTILES, QuantileSketch, StreamingSummary, iter_chunks, summarize
+from src.web_gui import app
+from tests.helpers import upload_and_analyze, upload_frame
+
+
+def _rank_error(sketch, values):
+    estimates = sketch.quantiles(QUANTILES)
+    return np.abs(np.searchsorted(np.sort(values), estimates) / len(values) - np.array(QUANTILES)).max()
+
+
+# =============================================================================
+# SKETCH TESTS
+# =============================================================================
+def test_sketch_is_exact_until_it_compacts():
+    """Few values give the same quantiles as numpy's inverted CDF"""
+    values = np.random.default_rng(0).normal(size=150)
+    sketch = QuantileSketch()
+    sketch.update(np.append(values, np.nan))
+    np.testing.assert_array_equal(sketch.quantiles(QUANTILES), np.quantile(values, QUANTILES, method='inverted_cdf'))
+    assert sketch.count == 150
+
+
+def test_sketch_stays_small_and_merges_within_rank_error():
+    """A million values fit in a few hundred items, and merged halves are as accurate as one pass"""
+    values = np.random.default_rng(1).lognormal(3, 0.5, 1_000_000)
+    whole = QuantileSketch()
+    for chunk in np.array_split(values, 10):
+        whole.update(chunk)
+    first, second = QuantileSketch(), QuantileSketch(seed=1)
+    first.update(values[:400_000])
+    second.update(values[400_000:])
+    first.merge(second)
+
+    assert sum(len(items) for items in whole.levels) < 1000
+    assert _rank_error(whole, values) < 0.02 and _rank_error(first, values) < 0.02
+    assert sum(len(items) * 2 ** level for level, items in enumerate(first.levels)) == 1_000_000
+
+
+# =============================================================================
+# SUMMARY TESTS
+# =============================================================================
+def test_chunked_summary_matches_whole_frame():
+    """Counts, extremes, means and histograms of merged chunk summaries equal those of the whole frame"""
+    rng = np.random.default_rng(2)
+    frame = pd.DataFrame({'age': rng.integers(0, 130, 5000).astype(float), 'weight': rng.normal(70, 15, 5000),
+                          'status': rng.choice(['Valid', 'Warning'], 5000)})
+    frame.loc[::7, 'weight'] = np.nan
+    merged = StreamingSummary()
+    for chunk in iter_chunks(frame, 1000):
+        merged.merge(StreamingSummary().update(chunk))
+    summary = merged.to_dict()
+
+    assert summary['rows'] == 5000
+    assert summary['status_counts'] == frame['status'].value_counts().to_dict()
+    age, weight = summary['columns']['age'], summary['columns']['weight']
+    assert (age['min'], age['max']) == (frame['age'].min(), frame['age'].max())
+    assert weight['missing'] == frame['weight'].isna().sum()
+    assert weight['mean'] == pytest.approx(frame['weight'].mean())
+    assert age['histogram']['above'] == (frame['age'] >= 120).sum()
+    assert sum(age['histogram']['counts']) + age['histogram']['above'] == 5000
+    assert 'height' not in summary['columns']
+    whole = summarize(iter_chunks(frame, 5000)).to_dict()
+    for field, column in whole['columns'].items():
+        # Sketches compact at different points, so only quantiles and float sums may differ slightly
+        assert {key: value for key, value in column.items() if key not in ('quantiles', 'mean')} == \
+            {key: value for key, value in summary['columns'][field].items() if key not in ('quantiles', 'mean')}
+
+
+# =============================================================================
+# ENDPOINT TESTS
+# =============================================================================
+def test_summary_of_an_analysis_reports_final_statuses():
+    """After /analyze the statistics count the statuses Layer 2 produced"""
+    client = app.test_client()
+    assert client.get('/summary').status_code == 400
+    result = upload_and_analyze(client, upload_frame())
+
+    statistics = client.get('/summary').get_json()
+    assert statistics['source'] == 'analysis' and statistics['rows'] == 200
+    assert statistics['status_counts'] == {entry['status']: entry['count'] for entry in result['summary']
+                                           if entry['count']}
+    median_height = upload_frame()['inaltime'].median()
+    assert statistics['columns']['height']['quantiles']['p50'] == pytest.approx(median_height, abs=1)
+
+
+def test_spooled_upload_is_summarized_in_chunks_and_cached(monkeypatch):
+    """Before an analysis a spooled CSV is streamed through Layer 1 once; repeats come from the cache"""
+    monkeypatch.setitem(app.config, 'SUMMARY_CHUNK_ROWS', 64)
+    frame = upload_frame(rows=500)
+    client = app.test_client()
+    client.post('/upload', data={'file': (io.BytesIO(frame.to_csv(index=False).encode()), 'data.csv'),
+                                 'mode': 'chunked'}, content_type='multipart/form-data')
+    client.post('/map-columns', json=web_gui.DEFAULT_COLUMN_MAPPING)
+
+    chunk_sizes = []
+    iter_csv_chunks = web_gui.iter_csv_chunks
+    monkeypatch.setattr(web_gui, 'iter_csv_chunks', lambda *args, **kwargs: (
+        chunk_sizes.append(len(chunk)) or chunk for chunk in iter_csv_chunks(*args, **kwargs)))
+    statistics = client.get('/summary').get_json()
+    assert statistics['source'] == 'layer1' and statistics['rows'] == 500
+    assert sum(statistics['status_counts'].values()) == 500
+    assert max(chunk_sizes) == 64
+
+    monkeypatch.setattr(web_gui, 'iter_csv_chunks', lambda *args, **kwargs: pytest.fail('upload was read again'))
+    assert client.get('/summary').get_json() == statistics